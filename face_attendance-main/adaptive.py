@@ -0,0 +1,95 @@
+import logging
+from config import (ADAPTIVE_LATENCY_BUDGET_MS, ADAPTIVE_SEARCH_SCALES, ADAPTIVE_ROI_SCALES, ADAPTIVE_ROI_PADDING,
+                    ADAPTIVE_ROI_MISSES)
+
+''' CLASS LIST '''
+# AdaptiveRegion
+
+logger = logging.getLogger('adaptive')
+
+class AdaptiveRegion:
+    '''
+    Chooses, for every frame, which part of the frame the face detector looks at and at which resolution.
+
+    Without a known face, the whole frame is searched at a low resolution. Once faces are found, only a padded
+    region of interest (ROI) around them is processed, at a higher resolution, which also gives the encoder a
+    sharper face. The region widens back to the full frame when the faces are lost for 'roi_misses' frames.
+
+    Each mode has its own scale, tuned after every frame against the per-frame latency budget: one step
+    down when the frame took longer than the budget, one step up when it took less than 70% of it.
+
+    Attributes:
+        report (dict): 'mode' ('full' or 'roi'), 'scale', 'roi' (x1, y1, x2, y2) and 'ms' of the last frame.
+    '''
+    def __init__(self, budget_ms=ADAPTIVE_LATENCY_BUDGET_MS, search_scales=ADAPTIVE_SEARCH_SCALES,
+                 roi_scales=ADAPTIVE_ROI_SCALES, padding=ADAPTIVE_ROI_PADDING, roi_misses=ADAPTIVE_ROI_MISSES):
+        '''
+        Args:
+            budget_ms (float): Target processing time of a frame in milliseconds.
+            search_scales (tuple): Allowed downscale factors of the full-frame search, in increasing order.
+            roi_scales (tuple): Allowed downscale factors of the ROI, in increasing order.
+            padding (float): Margin added around the faces, as a fraction of the face size.
+            roi_misses (int): Number of frames without a face in the ROI before searching the full frame again.
+        '''
+        self.budget_ms = budget_ms
+        self.scales = {'full': search_scales, 'roi': roi_scales}
+        self.levels = {'full': len(search_scales) // 2, 'roi': len(roi_scales) // 2}
+        self.padding = padding
+        self.roi_misses = roi_misses
+        self.roi = None
+        self.misses = 0
+        self.report = {}
+
+    def reset(self):
+        self.roi = None
+        self.misses = 0
+
+    def plan(self, frame_shape):
+        '''
+        Return the region to process and its scale.
+
+        Returns:
+            box (tuple): (x1, y1, x2, y2) in frame pixels.
+            scale (float): Downscale factor to apply to the region.
+        '''
+        mode = 'full' if self.roi is None else 'roi'
+        box = (0, 0, frame_shape[1], frame_shape[0]) if self.roi is None else self.roi
+        scale = self.scales[mode][self.levels[mode]]
+        self.report = {'mode': mode, 'scale': scale, 'roi': box}
+        return box, scale
+
+    def update(self, faces, frame_shape, elapsed_ms):
+        '''
+        Move the region to the faces found and tune the scale of the current mode.
+
+        Args:
+            faces (list): The (face_loc, name, accuracy) tuples found, in frame pixels.
+            frame_shape (tuple): Shape of the frame.
+            elapsed_ms (float): Time taken to process the frame.
+        '''
+        mode = self.report['mode']
+        if elapsed_ms > self.budget_ms and self.levels[mode] > 0:
+            self.levels[mode] -= 1
+        elif elapsed_ms < 0.7 * self.budget_ms and self.levels[mode] < len(self.scales[mode]) - 1:
+            self.levels[mode] += 1
+        self.report['ms'] = round(elapsed_ms, 1)
+
+        if len(faces) == 0:
+            self.misses += 1
+            if self.misses >= self.roi_misses:
+                self.roi = None
+        else:
+            self.misses = 0
+            height, width = frame_shape[:2]
+            top = min(loc[0] for loc, _, _ in faces)
+            right = max(loc[1] for loc, _, _ in faces)
+            bottom = max(loc[2] for loc, _, _ in faces)
+            left = min(loc[3] for loc, _, _ in faces)
+            pad_x, pad_y = int((right - left) * self.padding), int((bottom - top) * self.padding)
+            roi = (max(0, left - pad_x), max(0, top - pad_y), min(width, right + pad_x), min(height, bottom + pad_y))
+            # A region covering most of the frame is not worth cropping
+            if (roi[2] - roi[0]) * (roi[3] - roi[1]) > 0.6 * width * height:
+                roi = None
+            self.roi = roi
+        logger.debug('mode=%s scale=%.2f roi=%s ms=%.1f faces=%d', mode, self.report['scale'],
+                     self.report['roi'], elapsed_ms, len(faces))
@@ -1,24 +1,46 @@
 from tkinter import *
-from types import NoneType
 from PIL import ImageTk, Image
 import os
+import math
+import logging
 from utils import *
-from threading import Thread, Event, Lock
+from threading import Event
+from concurrent.futures import ThreadPoolExecutor
+from tracker import FaceTracker
+from detectors import MotionGate
+from preprocess import FramePreprocessor
+from pipeline import VideoPipeline, open_video_source
+from inference_pool import ProcessPoolBackend
+from auto_mark import AutoMarker
+from attendance_store import flush_attendance_stores, close_attendance_stores
+from adaptive import AdaptiveRegion
+from encode_cache import EncodingCache
+from metrics import metrics, MetricsLogger, start_metrics_server
+from startup import startup_timer, BackgroundTask
+from config import (TRACKING_ENABLED, RENDER_POLL_MS, INFERENCE_WORKERS, AUTO_MARK_ENABLED, LOG_FILE, MOTION_GATE_ENABLED,
+                    METRICS_OVERLAY, METRICS_LOG_FILE, METRICS_LOG_INTERVAL, METRICS_HTTP_PORT, ADAPTIVE_RESOLUTION,
+                    ENCODE_CACHE_ENABLED, CAMERA_SOURCES, ATTENDANCE_FLUSH_SECONDS)
 
 class App:
-    def __init__(self, root, menu_bar, img_program, img_start, img_mark, name, file_name, start_time, end_time):
+    def __init__(self, root, menu_bar, img_program, img_start, img_mark, names, file_name, start_time, end_time):
         # Initialize the application
         self.root = root
         self.menu_bar = menu_bar
         self.img_program = img_program
         self.img_start = img_start
         self.img_mark = img_mark
-        self.name = name
+        self.names = names
         self.file_name = file_name
         self.start_time = start_time
         self.end_time = end_time
-        self.lock = Lock()
         self.stop_display_video = Event()
+        self.streams = []
+        self.pipeline = None
+        self.prepared_video = None
+        self.auto_mark = BooleanVar(root, value=AUTO_MARK_ENABLED)
+        self.toast_label = None
+        self.toast_job = None
+        self.metrics_label = None
 
         # Set up the GUI elements
         self.background_label = Label(root, image=img_program)
@@ -41,10 +63,21 @@ class App:
         self.file_menu = Menu(menu_bar, tearoff=0)
         menu_bar.add_cascade(label="Edit Database", menu=self.file_menu)
         self.file_menu.add_command(label="Add Image Database", command=add_img_db)
+        self.file_menu.add_command(label="Import Roster Folder", command=lambda: self.import_roster(folder=True))
+        self.file_menu.add_command(label="Import Roster File (zip, csv)", command=self.import_roster)
         self.file_menu.add_command(label="Convert to Encode Database", command=self.convert_to_encode_db)
         self.file_menu.add_command(label="Delete from Image Database", command=delete_from_img_db)
         self.file_menu.add_command(label="Delete from Encode Database", command=delete_from_encode_db)
 
+        # Create the component "Mode" in menu bar
+        self.file_menu = Menu(menu_bar, tearoff=0)
+        menu_bar.add_cascade(label="Mode", menu=self.file_menu)
+        self.file_menu.add_checkbutton(label="Auto mark attendance", variable=self.auto_mark)
+
+        # Buffered marks are written periodically and when the window is closed
+        self.root.protocol("WM_DELETE_WINDOW", self.close_app)
+        self.root.after(ATTENDANCE_FLUSH_SECONDS * 1000, self.flush_attendance)
+
     def start_attendance(self):
         '''
         Start the attendance process
@@ -58,8 +91,11 @@ class App:
         self.btn_mark_attendance = Button(self.root, text="MARK ATTENDANCE", font=("Arial", 15, "bold"), bg='#B28DFF', borderwidth=0, fg='white', command=self.mark_attendance)
         self.btn_mark_attendance.place(x=912, y=404)
 
+        # The cameras open and the Encode Database loads while the user enters the time interval
+        self.prepared_video = BackgroundTask(self.prepare_video)
         try:
-            self.file_name, self.start_time, self.end_time = name_attendance_file()
+            with startup_timer.stage('time interval dialog'):
+                self.file_name, self.start_time, self.end_time = name_attendance_file()
         except:
             self.root.destroy()
             quit()
@@ -67,16 +103,21 @@ class App:
 
     def mark_attendance(self):
         '''
-        Mark attendance for the current session
+        Mark attendance for the persons recognized in the current frames of all video sources
         '''
-        mark_attendance(self.name, self.file_name, self.start_time, self.end_time)
+        mark_attendance(self.names, self.file_name, self.start_time, self.end_time)
 
     def new_attendance(self):
         '''
         Start a new attendance session
         '''
         self.stop_display_video.set()
-        self.process_thread.join()
+        self.pipeline.stop()
+        # The marks of the previous session are written before it is left
+        failed = close_attendance_stores()
+        if len(failed) != 0:
+            messagebox.showerror("Error", f"Please close the file {', '.join(failed)}! Its marks are saved once it is closed.")
+        self.prepared_video = BackgroundTask(self.prepare_video)
         try:
             self.file_name, self.start_time, self.end_time = name_attendance_file()
         except:
@@ -85,6 +126,65 @@ class App:
         self.stop_display_video.clear()
         self.capture_video()
 
+    def flush_attendance(self):
+        '''
+        Write the buffered marks of the open sessions, retrying the ones that could not be written
+        '''
+        failed = flush_attendance_stores()
+        if len(failed) != 0:
+            self.show_toast(f"Please close the file {', '.join(failed)}!", '#E05050')
+        self.root.after(ATTENDANCE_FLUSH_SECONDS * 1000, self.flush_attendance)
+
+    def close_app(self):
+        '''
+        Stop the video and save the attendance before closing the window
+        '''
+        self.stop_display_video.set()
+        if self.pipeline is not None:
+            self.pipeline.stop()
+        failed = close_attendance_stores()
+        while len(failed) != 0 and messagebox.askretrycancel("Error", f"Please close the file {', '.join(failed)} to save the attendance!"):
+            failed = close_attendance_stores()
+        self.root.destroy()
+
+    def auto_mark_attendance(self, stream, fresh_names):
+        '''
+        Mark the persons confirmed over the last frames of a video source without a dialog and show a toast for each of them
+        '''
+        try:
+            marked, already = stream['auto_marker'].update(stream['names'], self.file_name, self.start_time, self.end_time,
+                                                           fresh_names)
+        except OSError:
+            self.show_toast(f"Please close the file {self.file_name}!", '#E05050')
+            return
+        if len(marked) != 0:
+            self.show_toast(f"{', '.join(marked)}: marked attendance successfully!", '#3CB371')
+        elif len(already) != 0:
+            self.show_toast(f"{', '.join(already)}: you marked attendance!", '#B28DFF')
+
+    def show_toast(self, text, color, duration_ms=2000):
+        '''
+        Show a message over the video that disappears by itself
+        '''
+        if self.toast_label is None:
+            self.toast_label = Label(self.root, font=("Arial", 15, "bold"), fg='white', padx=10, pady=5)
+        self.toast_label.configure(text=text, bg=color)
+        self.toast_label.place(x=75, y=180)
+        self.toast_label.lift()
+        if self.toast_job is not None:
+            self.root.after_cancel(self.toast_job)
+        self.toast_job = self.root.after(duration_ms, self.toast_label.place_forget)
+
+    def show_metrics(self):
+        '''
+        Show the metrics summary over the top-left corner of the video
+        '''
+        if self.metrics_label is None:
+            self.metrics_label = Label(self.root, font=("Consolas", 9), fg='white', bg='black', justify=LEFT)
+            self.metrics_label.place(x=55, y=162)
+        self.metrics_label.configure(text=metrics.overlay_text())
+        self.metrics_label.lift()
+
     def is_menu_exists(self, label):
         '''
         Check if a menu item exists in the menu bar
@@ -95,55 +195,113 @@ class App:
         except:
             return False
 
+    def prepare_video(self):
+        '''
+        Open the video sources and load the Encode Database (runs in a background thread)
+        '''
+        with startup_timer.stage('open cameras'):
+            with ThreadPoolExecutor(max_workers=len(CAMERA_SOURCES)) as executor:
+                caps = list(executor.map(open_video_source, CAMERA_SOURCES))
+        with startup_timer.stage('load gallery'):
+            encode_gallery.get()
+        return caps
+
     def capture_video(self):
         '''
-        Capture video from the camera and update the video label
+        Capture video from the cameras and update the video labels
         '''
-        self.cap = cv2.VideoCapture(0)
-        self.cap.set(3, 1280)
-        self.cap.set(4, 720)
+        if self.prepared_video is not None:
+            with startup_timer.stage('wait for cameras'):
+                caps = self.prepared_video.result()
+            self.prepared_video = None
+        else:
+            caps = [open_video_source(source) for source in CAMERA_SOURCES]
 
-        self.video_label = Label(self.root)
-        self.video_label.place(x=55, y=162)
+        # Several sources share the video area in a grid
+        cols = 1 if len(caps) == 1 else 2
+        rows = math.ceil(len(caps) / cols)
+        for stream in self.streams:
+            stream['label'].destroy()
 
         if not self.is_menu_exists("New attendance"):
             self.file_menu = Menu(self.menu_bar, tearoff=0)
             self.menu_bar.add_cascade(label="New attendance", menu=self.file_menu)
             self.file_menu.add_command(label="Start", command=self.new_attendance)
 
-        self.processed_img = None 
-        self.process_thread = Thread(target=self.process_video)
-        self.process_thread.start()
+        # Every source keeps its own tracking state; they all share one recognition stage and one attendance session
+        self.streams = []
+        for i in range(len(caps)):
+            stream = {'label': Label(self.root), 'names': [], 'auto_marker': AutoMarker(),
+                      'preprocessor': FramePreprocessor(display_scale=(1 / 2 / cols, 2 / 3 / rows)),
+                      'motion_gate': MotionGate() if MOTION_GATE_ENABLED else None,
+                      'region': AdaptiveRegion() if ADAPTIVE_RESOLUTION else None,
+                      'encode_cache': EncodingCache() if ENCODE_CACHE_ENABLED else None}
+            recognize = lambda img, s=stream, i=i: recognize_faces(img, s['motion_gate'], s['preprocessor'], s['region'],
+                                                                   s['encode_cache'], i)
+            stream['face_tracker'] = FaceTracker(recognize) if TRACKING_ENABLED else None
+            stream['label'].place(x=55 + (i % cols) * 640 // cols, y=162 + (i // cols) * 480 // rows)
+            self.streams.append(stream)
+        self.reported_errors = set()
+
+        # Capture, recognition and display run as decoupled stages that always work on the newest frames
+        process = lambda i, img: cur_img_process(img, self.streams[i]['face_tracker'], self.streams[i]['motion_gate'],
+                                                 self.streams[i]['preprocessor'], self.streams[i]['region'],
+                                                 self.streams[i]['encode_cache'], i)
+        annotate = lambda i, img, result: annotate_frame(img, result[0], self.streams[i]['preprocessor'], result[1])
+        backend = ProcessPoolBackend(INFERENCE_WORKERS) if INFERENCE_WORKERS > 1 else None
+        # The per-stream tracking state only exists when recognition runs in this process
+        source_stats = (lambda i: self.stream_stats(self.streams[i])) if backend is None else None
+        self.pipeline = VideoPipeline(caps, process, backend, annotate, [str(source) for source in CAMERA_SOURCES],
+                                      source_stats)
+        self.pipeline.start()
 
         self.update_video()
 
-    def update_video(self):
+    def stream_stats(self, stream):
         '''
-        Update the video label with the processed image
+        Return the processing counters of a stream
         '''
-        if self.processed_img is not None:
-            with self.lock:
-                rgb_img = cv2.cvtColor(self.processed_img, cv2.COLOR_BGR2RGB)
-                img = ImageTk.PhotoImage(image=Image.fromarray(rgb_img))
-                self.video_label.configure(image=img)
-                self.video_label.image = img
-        if not self.stop_display_video.is_set():
-            self.video_label.after(1, self.update_video)
+        stats = {}
+        if stream['face_tracker'] is not None:
+            stats.update(stream['face_tracker'].stats())
+        gate = stream['motion_gate']
+        if gate is not None:
+            stats.update({'motion_checked': gate.checked, 'motion_skipped': gate.skipped,
+                          'motion_skip_rate': round(gate.skipped / gate.checked, 3) if gate.checked else 0.0})
+        return stats
 
-    def process_video(self):
+    def update_video(self):
         '''
-        Process the video frames, detect faces, and recognize attendees
+        Update the video labels when new processed images are available
         '''
-        while not self.stop_display_video.is_set():
-            success, img = self.cap.read()
-            if type(img) == NoneType:
-                messagebox.showerror("Error", "Not found camera in this device!")
-                self.root.destroy()
-                quit()
-            if success:
-                self.name, processed_img = cur_img_process(img)  
-                with self.lock:
-                    self.processed_img = processed_img
+        if self.pipeline.error is not None:
+            messagebox.showerror("Error", self.pipeline.error)
+            self.root.destroy()
+            quit()
+        for stream, source in zip(self.streams, self.pipeline.sources):
+            if source.error is not None and source.index not in self.reported_errors:
+                # The other sources keep running
+                self.reported_errors.add(source.index)
+                self.show_toast(source.error, '#E05050')
+            result = self.pipeline.poll_result(source.index)
+            if result is None:
+                continue
+            stream['names'], processed_img, fresh_names = result  # already RGB at display size
+            if not startup_timer.logged:
+                startup_timer.mark('first frame')
+                startup_timer.log()
+            with metrics.timer('render'):
+                img = ImageTk.PhotoImage(image=Image.fromarray(processed_img))
+                stream['label'].configure(image=img)
+                stream['label'].image = img
+            if metrics.enabled and METRICS_OVERLAY and self.pipeline.rendered % 15 == 0:
+                self.show_metrics()
+            if self.auto_mark.get():
+                self.auto_mark_attendance(stream, fresh_names)
+        # Persons recognized by any source, without duplicates
+        self.names = list(dict.fromkeys(name for stream in self.streams for name in stream['names']))
+        if not self.stop_display_video.is_set():
+            self.root.after(RENDER_POLL_MS, self.update_video)
 
     def convert_to_encode_db(self):
         '''
@@ -151,18 +309,35 @@ class App:
         '''
         self.stop_display_video.set()
         try:
-            self.process_thread.join()
+            self.pipeline.stop()
         except:
             pass
         convert_to_encode_db()
         self.stop_display_video.clear()
         try:
-            if self.process_thread is not None:
+            if self.pipeline is not None:
                 self.capture_video()
         except:
             pass
 
+    def import_roster(self, folder=False):
+        '''
+        Import a roster into the image database, then offer to encode it
+        '''
+        report = import_roster_db(folder)
+        if report is not None and report['imported'] + report['replaced'] != 0:
+            if messagebox.askyesno('Encode', 'Convert the imported images to the Encode Database now?'):
+                self.convert_to_encode_db()
+
 def app():
+    startup_timer.mark('workspace')
+    logging.basicConfig(filename=LOG_FILE, level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+    if metrics.enabled:
+        if METRICS_LOG_INTERVAL:
+            MetricsLogger(metrics, METRICS_LOG_FILE, METRICS_LOG_INTERVAL).start()
+        if METRICS_HTTP_PORT:
+            start_metrics_server(metrics, METRICS_HTTP_PORT)
+
     # Create a UI window
     root = Tk()
     root.geometry('1280x720')
@@ -174,9 +349,9 @@ def app():
     img_program = ImageTk.PhotoImage(Image.open("img_gui/program.jpg"))
     img_start = ImageTk.PhotoImage(Image.open("img_gui/start.jpg"))
     img_mark = ImageTk.PhotoImage(Image.open("img_gui/mark.jpg"))
-    name = ''
+    names = []
     file_name = ''
     start_time = ''
     end_time = ''
-    App(root, menu_bar, img_program, img_start, img_mark, name, file_name, start_time, end_time)
+    App(root, menu_bar, img_program, img_start, img_mark, names, file_name, start_time, end_time)
     root.mainloop()
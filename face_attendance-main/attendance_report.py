@@ -0,0 +1,356 @@
+import os
+import re
+import csv
+import sys
+import argparse
+from datetime import date, timedelta
+import numpy as np
+from config import REPORT_INDEX_FILE
+
+''' CLASS LIST '''
+# AttendanceIndex
+
+''' FUNCTION LIST '''
+# parse_session_file_name
+# parse_clock
+# format_clock
+# read_session_file
+# load_roster
+# write_rows
+# main
+
+# Attendance history over the session files of 'attendance_infor'. The files are indexed into a compact columnar
+# store (one row per mark: person ID, session ID, mark time, plus a table of the sessions: file, date and window)
+# saved next to them in REPORT_INDEX_FILE. Each refresh re-reads only the files that are new or were modified since they were
+# indexed, so the queries below never open the session files.
+# Usage: python attendance_report.py summary --from 2023-06-01 --to 2023-06-30 --output june.csv
+#        python attendance_report.py person "Mon"
+#        python attendance_report.py absentees --from 2023-06-05 --roster roster.txt
+#        python attendance_report.py sessions --from 2023-06-01
+
+SESSION_FILE_PATTERN = re.compile(r'^attendance_(\d{2}-\d{2}-\d{2})_to_(\d{2}-\d{2}-\d{2})_date-(\d{4}-\d{2}-\d{2})\.csv$')
+EPOCH = date(1970, 1, 1)
+FORMAT_VERSION = 1
+
+def parse_session_file_name(file_name):
+    '''
+    Read the window and the date of a session from the name of its file (see 'utils.attendance_file_name()').
+
+    Returns:
+        tuple: (date as days since 1970-01-01, start and end as seconds since midnight), or None if the file
+        is not a session file.
+    '''
+    match = SESSION_FILE_PATTERN.match(file_name)
+    if match is None:
+        return None
+    try:
+        day = date.fromisoformat(match.group(3))
+    except ValueError:
+        return None
+    return (day - EPOCH).days, parse_clock(match.group(1).replace('-', ':')), parse_clock(match.group(2).replace('-', ':'))
+
+def parse_clock(text):
+    '''
+    Convert 'HH:MM:SS' to seconds since midnight.
+    '''
+    hours, minutes, seconds = text.strip().split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + int(float(seconds))
+
+def format_clock(seconds):
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+def read_session_file(file_path):
+    '''
+    Read the marks of a session file.
+
+    Returns:
+        list: (name, mark time in seconds since midnight) pairs, one per person (the first mark wins).
+    '''
+    marks = {}
+    with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+        next(f, None)  # skip header row
+        for row in f:
+            # Names are written unquoted, so only the last comma separates the time
+            name, _, time_attendance = row.rstrip('\n').rpartition(',')
+            name = name.strip()
+            if name == '' or name in marks:
+                continue
+            try:
+                marks[name] = parse_clock(time_attendance)
+            except ValueError:
+                continue
+    return list(marks.items())
+
+class AttendanceIndex:
+    '''
+    Incremental columnar index of the attendance sessions.
+
+    Sessions (one per file): 'files', 'signatures' ((mtime_ns, size) of the indexed file), 'session_dates' (days
+    since 1970-01-01), 'session_starts' and 'session_ends' (seconds since midnight).
+    Marks (one per person and session): 'mark_persons' (index in 'persons'), 'mark_sessions' (index in 'files')
+    and 'mark_times' (seconds since midnight).
+    '''
+    def __init__(self, folder='attendance_infor', index_file=None):
+        '''
+        Args:
+            folder (str): Folder of the session files.
+            index_file (str): Path of the saved index. Defaults to REPORT_INDEX_FILE in 'folder'.
+        '''
+        self.folder = folder
+        self.index_file = index_file or os.path.join(folder, REPORT_INDEX_FILE)
+        self._reset()
+        self._load()
+
+    def _reset(self):
+        self.persons = []
+        self.person_ids = {}
+        self.files = []
+        self.signatures = np.empty((0, 2), np.int64)
+        self.session_dates = np.empty(0, np.int32)
+        self.session_starts = np.empty(0, np.int32)
+        self.session_ends = np.empty(0, np.int32)
+        self.mark_persons = np.empty(0, np.int32)
+        self.mark_sessions = np.empty(0, np.int32)
+        self.mark_times = np.empty(0, np.int32)
+
+    def _load(self):
+        if not os.path.isfile(self.index_file):
+            return
+        try:
+            with np.load(self.index_file) as data:
+                if int(data['version']) != FORMAT_VERSION:
+                    return
+                self.persons = data['persons'].tolist()
+                self.files = data['files'].tolist()
+                for column in ('signatures', 'session_dates', 'session_starts', 'session_ends',
+                               'mark_persons', 'mark_sessions', 'mark_times'):
+                    setattr(self, column, data[column])
+        except (OSError, ValueError, KeyError):
+            # Unreadable index: everything is re-indexed by the next refresh
+            self._reset()
+        self.person_ids = {name: i for i, name in enumerate(self.persons)}
+
+    def _save(self):
+        temp_file = self.index_file + ".tmp.npz"
+        np.savez(temp_file, version=FORMAT_VERSION, persons=np.array(self.persons, dtype=str),
+                 files=np.array(self.files, dtype=str), signatures=self.signatures, session_dates=self.session_dates,
+                 session_starts=self.session_starts, session_ends=self.session_ends, mark_persons=self.mark_persons,
+                 mark_sessions=self.mark_sessions, mark_times=self.mark_times)
+        os.replace(temp_file, self.index_file)
+
+    def _person_id(self, name):
+        if name not in self.person_ids:
+            self.person_ids[name] = len(self.persons)
+            self.persons.append(name)
+        return self.person_ids[name]
+
+    def refresh(self):
+        '''
+        Bring the index up to date with the session files, reading only the new and modified ones.
+
+        Returns:
+            dict: Number of files 'read', 'removed' (deleted or modified since indexed) and 'unchanged'.
+        '''
+        found = {}
+        if os.path.isdir(self.folder):
+            with os.scandir(self.folder) as entries:
+                for entry in entries:
+                    session = parse_session_file_name(entry.name)
+                    if session is not None and entry.is_file():
+                        stat = entry.stat()
+                        found[entry.name] = (stat.st_mtime_ns, stat.st_size, session)
+
+        # Drop the sessions whose file disappeared or changed
+        keep = np.array([f in found and found[f][:2] == tuple(s) for f, s in zip(self.files, self.signatures.tolist())], bool)
+        report = {'read': 0, 'removed': int((~keep).sum()), 'unchanged': int(keep.sum())}
+        if not keep.all():
+            new_ids = np.cumsum(keep, dtype=np.int32) - 1
+            kept_marks = keep[self.mark_sessions]
+            self.mark_persons = self.mark_persons[kept_marks]
+            self.mark_sessions = new_ids[self.mark_sessions[kept_marks]]
+            self.mark_times = self.mark_times[kept_marks]
+            self.files = [f for f, k in zip(self.files, keep) if k]
+            for column in ('signatures', 'session_dates', 'session_starts', 'session_ends'):
+                setattr(self, column, getattr(self, column)[keep])
+
+        # Read the new and modified files
+        indexed = set(self.files)
+        new_files = sorted(f for f in found if f not in indexed)
+        sessions, marks = [], []
+        for file_name in new_files:
+            try:
+                file_marks = read_session_file(os.path.join(self.folder, file_name))
+            except OSError:
+                continue  # e.g. being written: picked up by the next refresh
+            session_id = len(self.files)
+            sessions.append(found[file_name][2] + found[file_name][:2])
+            self.files.append(file_name)
+            marks.extend((self._person_id(name), session_id, seconds) for name, seconds in file_marks)
+        report['read'] = len(sessions)
+        if len(sessions) != 0:
+            sessions = np.array(sessions, np.int64)
+            self.session_dates = np.concatenate([self.session_dates, sessions[:, 0].astype(np.int32)])
+            self.session_starts = np.concatenate([self.session_starts, sessions[:, 1].astype(np.int32)])
+            self.session_ends = np.concatenate([self.session_ends, sessions[:, 2].astype(np.int32)])
+            self.signatures = np.concatenate([self.signatures, sessions[:, 3:5]])
+            marks = np.array(marks, np.int32).reshape(-1, 3)
+            self.mark_persons = np.concatenate([self.mark_persons, marks[:, 0]])
+            self.mark_sessions = np.concatenate([self.mark_sessions, marks[:, 1]])
+            self.mark_times = np.concatenate([self.mark_times, marks[:, 2]])
+        if report['read'] + report['removed'] != 0:
+            self._save()
+        return report
+
+    def session_mask(self, start_date=None, end_date=None):
+        '''
+        Select the sessions held between two dates (both included, None for no bound).
+        '''
+        mask = np.ones(len(self.files), bool)
+        if start_date is not None:
+            mask &= self.session_dates >= (start_date - EPOCH).days
+        if end_date is not None:
+            mask &= self.session_dates <= (end_date - EPOCH).days
+        return mask
+
+    def session_info(self, session_id):
+        return {'date': (EPOCH + timedelta(days=int(self.session_dates[session_id]))).isoformat(),
+                'start': format_clock(int(self.session_starts[session_id])),
+                'end': format_clock(int(self.session_ends[session_id])), 'file': self.files[session_id]}
+
+    def _sorted_sessions(self, mask):
+        sessions = np.flatnonzero(mask)
+        return sessions[np.lexsort((self.session_starts[sessions], self.session_dates[sessions]))]
+
+    def sessions(self, start_date=None, end_date=None):
+        '''
+        List the sessions between two dates with their number of marks, in chronological order.
+        '''
+        mask = self.session_mask(start_date, end_date)
+        counts = np.bincount(self.mark_sessions, minlength=len(self.files))
+        return [dict(self.session_info(s), present=int(counts[s])) for s in self._sorted_sessions(mask)]
+
+    def person_history(self, name, start_date=None, end_date=None):
+        '''
+        List the sessions a person attended between two dates, with the time of each mark.
+        '''
+        if name not in self.person_ids:
+            return []
+        mask = self.session_mask(start_date, end_date)
+        rows = np.flatnonzero((self.mark_persons == self.person_ids[name]) & mask[self.mark_sessions])
+        times = dict(zip(self.mark_sessions[rows].tolist(), self.mark_times[rows].tolist()))
+        attended = np.zeros(len(self.files), bool)
+        attended[list(times)] = True
+        return [dict(self.session_info(s), time=format_clock(times[s])) for s in self._sorted_sessions(attended)]
+
+    def summary(self, start_date=None, end_date=None, roster=None):
+        '''
+        Count the sessions attended by each person between two dates.
+
+        Args:
+            roster (list): Persons to report. Defaults to every person with at least one mark.
+
+        Returns:
+            list: One dict per person: name, attended, sessions (held in the range), rate, first and last (dates).
+        '''
+        mask = self.session_mask(start_date, end_date)
+        num_sessions = int(mask.sum())
+        selected = mask[self.mark_sessions]
+        persons = self.mark_persons[selected]
+        days = self.session_dates[self.mark_sessions[selected]]
+        attended = np.bincount(persons, minlength=len(self.persons))
+        # With the marks in date order, the last write of a fancy assignment keeps the latest date
+        order = np.argsort(days, kind='stable')
+        first = np.zeros(len(self.persons), np.int64)
+        last = np.zeros(len(self.persons), np.int64)
+        first[persons[order[::-1]]] = days[order[::-1]]
+        last[persons[order]] = days[order]
+        if roster is None:
+            roster = [self.persons[i] for i in np.flatnonzero(attended)]
+        rows = []
+        for name in roster:
+            i = self.person_ids.get(name)
+            count = int(attended[i]) if i is not None else 0
+            rows.append({'name': name, 'attended': count, 'sessions': num_sessions,
+                         'rate': round(count / num_sessions, 3) if num_sessions else 0.0,
+                         'first': (EPOCH + timedelta(days=int(first[i]))).isoformat() if count else '',
+                         'last': (EPOCH + timedelta(days=int(last[i]))).isoformat() if count else ''})
+        return rows
+
+    def absentees(self, roster, start_date=None, end_date=None):
+        '''
+        List, for every session between two dates, the persons of the roster who were not marked.
+
+        Returns:
+            list: One dict per session (date, start, end, file) with the 'absent' names.
+        '''
+        roster = list(dict.fromkeys(roster))
+        # Persons never marked get the spare last row of 'row', which no mark refers to
+        roster_ids = np.array([self.person_ids.get(name, -1) for name in roster], np.int64)
+        sessions = self._sorted_sessions(self.session_mask(start_date, end_date))
+        # Presence matrix of the roster over the selected sessions
+        column = np.full(len(self.files), -1, np.int64)
+        column[sessions] = np.arange(len(sessions))
+        row = np.full(len(self.persons) + 1, -1, np.int64)
+        row[roster_ids] = np.arange(len(roster_ids))
+        present = np.zeros((len(roster_ids), len(sessions)), bool)
+        selected = (column[self.mark_sessions] >= 0) & (row[self.mark_persons] >= 0)
+        present[row[self.mark_persons[selected]], column[self.mark_sessions[selected]]] = True
+        return [dict(self.session_info(s), absent=[roster[i] for i in np.flatnonzero(~present[:, j])])
+                for j, s in enumerate(sessions)]
+
+def load_roster(roster):
+    '''
+    Load the expected persons: 'encode' for the persons of the Encode Database, or a file with one name per line
+    (the first column of a CSV file).
+    '''
+    if roster == 'encode':
+        from encode_store import load_encode_store
+        return list(load_encode_store()[0])
+    with open(roster, 'r', encoding='utf-8-sig', newline='') as f:
+        return [row[0].strip() for row in csv.reader(f) if len(row) != 0 and row[0].strip() != '']
+
+def write_rows(rows, output=None):
+    '''
+    Write report rows as CSV to a file, or to the standard output.
+    '''
+    if len(rows) == 0:
+        print("No data")
+        return
+    f = open(output, 'w', encoding='utf-8', newline='') if output else sys.stdout
+    try:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    finally:
+        if output:
+            f.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Query and export the attendance history of 'attendance_infor'.")
+    parser.add_argument('query', choices=['summary', 'person', 'absentees', 'sessions'])
+    parser.add_argument('name', nargs='?', help="person name (for 'person')")
+    parser.add_argument('--from', dest='start', type=date.fromisoformat, help="first date, YYYY-MM-DD")
+    parser.add_argument('--to', dest='end', type=date.fromisoformat, help="last date, YYYY-MM-DD")
+    parser.add_argument('--roster', help="'encode' for the Encode Database, or a file with one name per line "
+                                         "(default for 'absentees': 'encode')")
+    parser.add_argument('--folder', default='attendance_infor', help="folder of the session files")
+    parser.add_argument('--output', help="CSV file to export to (default: print)")
+    args = parser.parse_args()
+
+    index = AttendanceIndex(args.folder)
+    index.refresh()
+    if args.query == 'summary':
+        rows = index.summary(args.start, args.end, load_roster(args.roster) if args.roster else None)
+    elif args.query == 'person':
+        if not args.name:
+            parser.error("the 'person' query needs a name")
+        rows = index.person_history(args.name, args.start, args.end)
+    elif args.query == 'absentees':
+        rows = index.absentees(load_roster(args.roster or 'encode'), args.start, args.end)
+        rows = [dict(row, absent='; '.join(row['absent'])) for row in rows]
+    else:
+        rows = index.sessions(args.start, args.end)
+    write_rows(rows, args.output)
+
+if __name__ == '__main__':
+    main()
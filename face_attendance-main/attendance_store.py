@@ -0,0 +1,181 @@
+import os
+import atexit
+import sqlite3
+from threading import Lock
+from config import ATTENDANCE_BACKEND, ATTENDANCE_DB, ATTENDANCE_FSYNC_EVERY
+
+''' CLASS LIST '''
+# CSVAttendanceStore
+# SQLiteAttendanceStore
+
+''' FUNCTION LIST '''
+# get_attendance_store
+# flush_attendance_stores
+# close_attendance_stores
+
+class CSVAttendanceStore:
+    '''
+    Append-only attendance file of one session with an in-memory index of the marked names.
+
+    The file is read once when the store is opened. Marks are checked against the in-memory set in O(1),
+    buffered, and appended to the file with an fsync every 'fsync_every' marks or on 'flush()'.
+    If the file cannot be written (e.g. it is open in Excel), the rows stay buffered and the error is raised;
+    they are written by the next successful flush.
+    '''
+    def __init__(self, file_path, fsync_every=ATTENDANCE_FSYNC_EVERY):
+        self.file_path = file_path
+        self.fsync_every = fsync_every
+        self.lock = Lock()
+        self.pending = []
+        self.marked = set()
+        if os.path.isfile(file_path) and os.path.getsize(file_path) > 0:
+            with open(file_path, 'r') as f:
+                next(f, None)  # skip header row
+                self.marked = {row.split(',')[0] for row in f if row.strip() != ''}
+        else:
+            self.pending.append('Name, Attendance Time\n')
+
+    def is_marked(self, name):
+        return name in self.marked
+
+    def mark(self, name, time_attendance):
+        '''
+        Mark a person once per session.
+
+        Args:
+            name (str): The name of the person.
+            time_attendance (str): The attendance time, 'HH:MM:SS'.
+
+        Returns:
+            bool: False if the person was already marked.
+        '''
+        with self.lock:
+            if name in self.marked:
+                return False
+            self.marked.add(name)
+            self.pending.append(f'{name}, {time_attendance}\n')
+            if len(self.pending) >= self.fsync_every:
+                self._flush()
+            return True
+
+    def _flush(self):
+        if len(self.pending) == 0:
+            return
+        with open(self.file_path, 'a') as f:
+            f.writelines(self.pending)
+            f.flush()
+            os.fsync(f.fileno())
+        self.pending = []
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        self.flush()
+
+class SQLiteAttendanceStore:
+    '''
+    Attendance of one session in a SQLite database that several kiosks can share.
+
+    A unique index on (session, person) makes each person be marked once per session even when
+    several kiosks mark at the same time. Names marked by this kiosk are also kept in memory.
+    '''
+    def __init__(self, db_path, session):
+        self.session = session
+        self.lock = Lock()
+        self.conn = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS attendance (session TEXT NOT NULL, person TEXT NOT NULL, time TEXT NOT NULL)')
+        self.conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS attendance_session_person ON attendance (session, person)')
+        self.conn.commit()
+        self.marked = {row[0] for row in self.conn.execute('SELECT person FROM attendance WHERE session = ?', (session,))}
+
+    def is_marked(self, name):
+        if name in self.marked:
+            return True
+        # Another kiosk may have marked the person since the session was opened
+        with self.lock:
+            row = self.conn.execute('SELECT 1 FROM attendance WHERE session = ? AND person = ?', (self.session, name)).fetchone()
+        if row is not None:
+            self.marked.add(name)
+        return row is not None
+
+    def mark(self, name, time_attendance):
+        with self.lock:
+            if name in self.marked:
+                return False
+            cursor = self.conn.execute('INSERT OR IGNORE INTO attendance (session, person, time) VALUES (?, ?, ?)',
+                                       (self.session, name, time_attendance))
+            self.conn.commit()
+            self.marked.add(name)
+            return cursor.rowcount == 1
+
+    def flush(self):
+        pass
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+_stores = {}
+_stores_lock = Lock()
+
+def get_attendance_store(file_name, backend=ATTENDANCE_BACKEND):
+    '''
+    Return the attendance store of a session, opening it (and reading the existing marks) only once.
+
+    Args:
+        file_name (str): The name of the attendance file, which identifies the session.
+        backend (str): 'csv' for the file in 'attendance_infor', 'sqlite' for the shared database ATTENDANCE_DB.
+
+    Returns:
+        CSVAttendanceStore or SQLiteAttendanceStore: The store.
+    '''
+    with _stores_lock:
+        if file_name not in _stores:
+            if backend == 'sqlite':
+                _stores[file_name] = SQLiteAttendanceStore(ATTENDANCE_DB, os.path.splitext(file_name)[0])
+            else:
+                _stores[file_name] = CSVAttendanceStore(os.path.join('attendance_infor', file_name))
+        return _stores[file_name]
+
+def flush_attendance_stores():
+    '''
+    Write the buffered marks of every open attendance store.
+
+    Returns:
+        list: The file names of the sessions whose marks could not be written (e.g. the file is open in Excel).
+            Their marks stay buffered for the next flush.
+    '''
+    with _stores_lock:
+        stores = list(_stores.items())
+    failed = []
+    for file_name, store in stores:
+        try:
+            store.flush()
+        except OSError:
+            failed.append(file_name)
+    return failed
+
+def close_attendance_stores():
+    '''
+    Flush and close every open attendance store.
+
+    Returns:
+        list: The file names of the sessions whose marks could not be written. These stores stay open,
+            with their marks buffered, so closing can be retried.
+    '''
+    failed = []
+    with _stores_lock:
+        for file_name, store in list(_stores.items()):
+            try:
+                store.close()
+            except OSError:
+                failed.append(file_name)
+            else:
+                del _stores[file_name]
+    return failed
+
+# Buffered marks are written when the interpreter exits, whatever ends the session
+atexit.register(close_attendance_stores)
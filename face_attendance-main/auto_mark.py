@@ -0,0 +1,91 @@
+import time
+import logging
+from collections import deque
+from datetime import datetime
+from attendance_store import get_attendance_store
+from config import AUTO_MARK_CONFIRM_FRAMES, AUTO_MARK_WINDOW_FRAMES, AUTO_MARK_DEBOUNCE_SECONDS
+
+''' CLASS LIST '''
+# AutoMarker
+
+logger = logging.getLogger('auto_mark')
+
+class AutoMarker:
+    '''
+    Hands-free attendance marking with temporal confirmation.
+
+    The names recognized in each frame are fed to 'update()'. A person is marked once they have been recognized
+    in at least 'confirm_frames' of the last 'window_frames' frames that observed them, and is not considered again
+    for 'debounce_seconds' afterwards. Only fresh recognitions (detection and encoding ran on the frame) count:
+    a face whose identity was carried over by the tracker, the motion gate or the encoding cache is neither
+    counted for nor against its person, so a single recognition cannot confirm itself over the following frames. Every mark is written through to the session's attendance store and logged,
+    so the throughput in people per minute can be read from the log.
+    '''
+    def __init__(self, confirm_frames=AUTO_MARK_CONFIRM_FRAMES, window_frames=AUTO_MARK_WINDOW_FRAMES,
+                 debounce_seconds=AUTO_MARK_DEBOUNCE_SECONDS):
+        self.confirm_frames = confirm_frames
+        self.window_frames = window_frames
+        self.windows = {}                            # name -> 1 (recognized) or 0 (absent) for its last frames
+        self.debounce_seconds = debounce_seconds
+        self.last_seen_marked = {}                   # name -> time the name was last confirmed
+        self.mark_times = deque()                    # times of the marks of the last minute
+
+    def reset(self):
+        self.windows.clear()
+        self.last_seen_marked.clear()
+
+    def update(self, names, file_name, start_time, end_time, fresh_names=None):
+        '''
+        Feed the names of a new frame and mark the persons that are confirmed.
+
+        Args:
+            names (list): The names recognized in the frame.
+            file_name (str): The name of the attendance file of the session.
+            start_time (datetime.time): The start time of the attendance.
+            end_time (datetime.time): The end time of the attendance.
+            fresh_names (list): The names of 'names' recognized by a detection and encoding on this frame.
+                Defaults to all of them.
+
+        Returns:
+            marked (list): The names marked on this frame.
+            already (list): The confirmed names that had already been marked in this session.
+        '''
+        frame_names = set(names if fresh_names is None else fresh_names)
+        for name in list(self.windows):
+            if name not in names:
+                # Absent from the frame; names carried over from an earlier recognition are left out
+                window = self.windows[name]
+                window.append(0)
+                if not any(window):
+                    del self.windows[name]
+        for name in frame_names:
+            self.windows.setdefault(name, deque(maxlen=self.window_frames)).append(1)
+
+        marked, already = [], []
+        now = datetime.now()
+        if not start_time <= now.time() <= end_time:
+            return marked, already
+        clock = time.monotonic()
+        store = get_attendance_store(file_name)
+        for name in frame_names:
+            if sum(self.windows[name]) < self.confirm_frames:
+                continue
+            if clock - self.last_seen_marked.get(name, -self.debounce_seconds) < self.debounce_seconds:
+                continue
+            self.last_seen_marked[name] = clock
+            if store.mark(name, now.strftime('%H:%M:%S')):
+                marked.append(name)
+                self.mark_times.append(clock)
+                logger.info('marked %s session=%s rate=%.1f/min', name, file_name, self.people_per_minute())
+            else:
+                already.append(name)
+        return marked, already
+
+    def people_per_minute(self):
+        '''
+        Return the number of persons marked during the last minute.
+        '''
+        clock = time.monotonic()
+        while self.mark_times and clock - self.mark_times[0] > 60:
+            self.mark_times.popleft()
+        return len(self.mark_times)
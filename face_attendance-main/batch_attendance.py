@@ -0,0 +1,133 @@
+import os
+import time
+import argparse
+from datetime import datetime, timedelta
+import cv2
+from utils import recognize_faces, attendance_file_name
+from preprocess import FramePreprocessor
+from attendance_store import CSVAttendanceStore
+
+''' FUNCTION LIST '''
+# iter_video_frames
+# iter_image_frames
+# batch_attendance
+# main
+
+# Headless attendance over recorded footage or photo folders.
+# Usage: python batch_attendance.py lecture.mp4 --stride 5 --start "2023-06-05 09:20:00"
+#        python batch_attendance.py photos/ --stride 1
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+def iter_video_frames(video_path, stride=1):
+    '''
+    Stream every 'stride'-th frame of a video file.
+
+    Skipped frames are only grabbed, not decoded into images.
+
+    Args:
+        video_path (str): Path of the video file.
+        stride (int): Keep one frame out of 'stride'.
+
+    Yields:
+        tuple: (seconds since the start of the video, frame in BGR format).
+    '''
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open the video {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25
+    try:
+        index = 0
+        while cap.grab():
+            if index % stride == 0:
+                success, img = cap.retrieve()
+                if success:
+                    msec = cap.get(cv2.CAP_PROP_POS_MSEC)
+                    yield (msec / 1000 if msec > 0 else index / fps), img
+            index += 1
+    finally:
+        cap.release()
+
+def iter_image_frames(folder, stride=1):
+    '''
+    Stream every 'stride'-th image of a folder, in file name order.
+
+    Yields:
+        tuple: (modification time of the file as a POSIX timestamp, image in BGR format).
+    '''
+    files = sorted(f for f in os.listdir(folder) if f.lower().endswith(IMAGE_EXTENSIONS))
+    for filename in files[::stride]:
+        file_path = os.path.join(folder, filename)
+        img = cv2.imread(file_path)
+        if img is not None:
+            yield os.path.getmtime(file_path), img
+
+def batch_attendance(source, stride=1, start=None, output_dir='attendance_infor'):
+    '''
+    Take attendance over a video file or an image folder and write it as an attendance file.
+
+    If the session file already exists (same time window), the persons it already lists keep their mark
+    and only the others are added.
+
+    Args:
+        source (str): Path of a video file or of a folder of images.
+        stride (int): Process one frame (or image) out of 'stride'.
+        start (datetime.datetime): Wall-clock time of the first video frame. Defaults to the video's modification time.
+        output_dir (str): Folder of the attendance files.
+
+    Returns:
+        file_path (str): The written attendance file.
+        first_seen (dict): {name: datetime of the first frame the person was recognized in}.
+        fps (float): Number of processed frames per second.
+        num_marked (int): Number of persons added to the file (the others were already marked).
+    '''
+    if os.path.isdir(source):
+        frames = ((datetime.fromtimestamp(t), img) for t, img in iter_image_frames(source, stride))
+    else:
+        if start is None:
+            start = datetime.fromtimestamp(os.path.getmtime(source))
+        frames = ((start + timedelta(seconds=t), img) for t, img in iter_video_frames(source, stride))
+
+    first_seen = {}
+    first_time = last_time = None
+    num_frames = 0
+    preprocessor = FramePreprocessor()
+    begin = time.perf_counter()
+    for frame_time, img in frames:
+        first_time = frame_time if first_time is None else min(first_time, frame_time)
+        last_time = frame_time if last_time is None else max(last_time, frame_time)
+        faces, _ = recognize_faces(img, preprocessor=preprocessor)
+        for _, name, _ in faces:
+            if name != '' and (name not in first_seen or frame_time < first_seen[name]):
+                first_seen[name] = frame_time
+        num_frames += 1
+    elapsed = time.perf_counter() - begin
+    fps = num_frames / elapsed if elapsed > 0 else 0
+    if num_frames == 0:
+        raise ValueError(f"No frames could be read from {source}")
+
+    # Same file name and layout as the attendance files of the app
+    start_time, end_time = first_time.time().replace(microsecond=0), last_time.time().replace(microsecond=0)
+    file_name = attendance_file_name(start_time, end_time, first_time)
+    file_path = os.path.join(output_dir, file_name)
+    store = CSVAttendanceStore(file_path, fsync_every=len(first_seen) + 1)
+    num_marked = sum(store.mark(name, seen.strftime('%H:%M:%S'))
+                     for name, seen in sorted(first_seen.items(), key=lambda item: item[1]))
+    store.close()
+    return file_path, first_seen, fps, num_marked
+
+def main():
+    parser = argparse.ArgumentParser(description="Take attendance over a recorded video or a folder of images.")
+    parser.add_argument('source', help="video file or folder of images")
+    parser.add_argument('--stride', type=int, default=1, help="process one frame out of STRIDE")
+    parser.add_argument('--start', type=lambda s: datetime.strptime(s, '%Y-%m-%d %H:%M:%S'),
+                        help='wall-clock time of the first video frame, "YYYY-MM-DD HH:MM:SS" (default: file modification time)')
+    parser.add_argument('--output-dir', default='attendance_infor')
+    args = parser.parse_args()
+
+    file_path, first_seen, fps, num_marked = batch_attendance(args.source, args.stride, args.start, args.output_dir)
+    print(f"{len(first_seen)} persons recognized, {fps:.1f} frames/s processed")
+    print(f"{num_marked} marks written to {file_path} ({len(first_seen) - num_marked} already marked)")
+
+if __name__ == '__main__':
+    main()
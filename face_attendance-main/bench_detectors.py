@@ -0,0 +1,61 @@
+import os
+import time
+import argparse
+import cv2
+from detectors import create_detector
+
+''' FUNCTION LIST '''
+# load_samples
+# main
+
+# Latency and recall of the face detector backends on the images of the Image Database
+# (each image shows exactly one person). Images are prepared like the live video: downscaled by 0.25,
+# converted to RGB and blurred.
+# Usage: python bench_detectors.py --backends hog haar lbp dnn --repeat 5
+
+def load_samples(image_path='img_db'):
+    '''
+    Load and preprocess the Image Database samples.
+
+    Returns:
+        list: (file name, RGB image) pairs.
+    '''
+    samples = []
+    for filename in sorted(os.listdir(image_path)):
+        img = cv2.imread(os.path.join(image_path, filename))
+        if img is None:
+            continue
+        imgS = cv2.resize(img, (0,0), None, 0.25, 0.25)
+        imgS = cv2.cvtColor(imgS, cv2.COLOR_BGR2RGB)
+        imgS = cv2.GaussianBlur(imgS, (15, 15), 1)
+        samples.append((filename, imgS))
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the face detector backends on the Image Database.")
+    parser.add_argument('--backends', nargs='+', default=['hog', 'haar', 'lbp', 'dnn'])
+    parser.add_argument('--image-path', default='img_db')
+    parser.add_argument('--repeat', type=int, default=5, help="detections per image, to average the latency")
+    args = parser.parse_args()
+
+    samples = load_samples(args.image_path)
+    print(f"{len(samples)} images")
+    print(f"{'backend':>8} {'recall':>7} {'mean ms':>8} {'max ms':>8}")
+    for backend in args.backends:
+        try:
+            detector = create_detector(backend, fallback=False)
+        except (FileNotFoundError, cv2.error) as e:
+            print(f"{backend:>8} unavailable: {e}")
+            continue
+        found = 0
+        latency = []
+        for filename, img in samples:
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                face_locations = detector.detect(img)
+                latency.append((time.perf_counter() - start) * 1000)
+            found += len(face_locations) >= 1
+        print(f"{backend:>8} {found / max(len(samples), 1):>7.2f} {sum(latency) / max(len(latency), 1):>8.2f} {max(latency, default=0):>8.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+import argparse
+import time
+import numpy as np
+from matcher import squared_norms
+from face_index import BruteForceIndex, IVFIndex, QuantizedIndex
+
+''' FUNCTION LIST '''
+# synthetic_gallery
+# time_search
+# accepted
+# report
+# main
+
+# Benchmark of the face indexes on synthetic 128-d galleries.
+# Usage: python bench_index.py --persons 10000 50000 --nprobe 1 4 8 16 --prune 0 0.06 0.1
+
+BRIGHT_FACTORS = [0.25, 0.5, 0.75, 1, 1.25, 1.5, 1.75, 2]  # as in augment_data
+
+def synthetic_gallery(num_persons, num_queries, num_variants=8, seed=0, drift=0.0):
+    '''
+    Generate a gallery that mimics face encodings: one center per person, brightness variants
+    scattered around it, and query faces drawn near randomly chosen persons.
+
+    With 'drift', the variants of a person also move along a person-specific direction by
+    drift * |log2(brightness factor)|, so neighbouring brightness levels give almost the same encoding
+    (as the 0.75/1/1.25 levels of real faces do) and only the extreme levels stand apart.
+
+    Returns:
+        flat_encodes (numpy.ndarray): Gallery of shape (num_persons * num_variants, 128).
+        queries (numpy.ndarray): Query faces of shape (num_queries, 128).
+        truth (numpy.ndarray): Person index each query was drawn from.
+    '''
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0, 0.09, (num_persons, 128)).astype(np.float32)
+    truth = rng.integers(0, num_persons, num_queries)
+    if drift > 0:
+        directions = rng.normal(0, 1, (num_persons, 128)).astype(np.float32)
+        directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+        steps = drift * np.log2(BRIGHT_FACTORS[:num_variants]).astype(np.float32)
+        gallery = (centers[:, None, :] + steps[None, :, None] * directions[:, None, :]
+                   + rng.normal(0, 0.002, (num_persons, num_variants, 128)).astype(np.float32))
+        # Query faces are taken under a random lighting between the extreme levels
+        query_steps = drift * rng.uniform(-2, 1, num_queries).astype(np.float32)
+        queries = (centers[truth] + query_steps[:, None] * directions[truth]
+                   + rng.normal(0, 0.035, (num_queries, 128)).astype(np.float32))
+    else:
+        gallery = centers[:, None, :] + rng.normal(0, 0.03, (num_persons, num_variants, 128)).astype(np.float32)
+        queries = centers[truth] + rng.normal(0, 0.035, (num_queries, 128)).astype(np.float32)
+    return gallery.reshape(-1, 128), queries, truth
+
+def time_search(index, queries):
+    '''
+    Search the queries one face at a time, as 'cur_img_process' does.
+
+    Returns:
+        top_index (numpy.ndarray): Nearest person of every query.
+        top_dis (numpy.ndarray): Its face distance.
+        latency (numpy.ndarray): Per-query latency in milliseconds.
+    '''
+    top_index = np.empty(len(queries), np.intp)
+    top_dis = np.empty(len(queries), np.float32)
+    latency = np.empty(len(queries))
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        found, dis = index.search(query)
+        latency[i] = (time.perf_counter() - start) * 1000
+        top_index[i], top_dis[i] = found[0, 0], dis[0, 0]
+    return top_index, top_dis, latency
+
+def accepted(top_index, top_dis):
+    '''
+    Apply the accept rule of 'identify_faces' (accuracy above 50): the person found, or -1 for an unknown face.
+    '''
+    acc = np.round(100 * (1 - top_dis))
+    return np.where((top_index >= 0) & (acc > 50), top_index, -1)
+
+def report(num_persons, backend, param, result, exact, latency, held_bytes, read_bytes):
+    '''
+    Print one row of the comparison with the brute-force answers 'exact' = (top_index, top_dis).
+    '''
+    top_index, top_dis = result
+    recall = np.mean(top_index == exact[0])
+    accept = np.mean(accepted(top_index, top_dis) == accepted(*exact))
+    distance = np.mean(np.abs(top_dis - exact[1]) < 1e-4)
+    print(f"{num_persons:>8} {backend:>12} {param:>6} {recall:>9.3f} {accept:>7.3f} {distance:>7.3f} "
+          f"{np.percentile(latency, 50):>7.2f} {np.percentile(latency, 95):>7.2f} "
+          f"{held_bytes / num_persons:>7.0f} {read_bytes / 1024:>8.0f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare recall@1 and latency of the approximate face index against brute force.")
+    parser.add_argument('--persons', type=int, nargs='+', default=[10000, 50000])
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 8, 16])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--drift', type=float, default=0.12, help="brightness drift of the synthetic variants (0 disables)")
+    parser.add_argument('--prune', type=float, nargs='+', default=[0, 0.06, 0.1], help="prune distances of the quantized index")
+    parser.add_argument('--rerank', type=int, default=16, help="candidates re-ranked by the quantized index")
+    args = parser.parse_args()
+
+    # 'param' is the nprobe of the IVF index and the prototypes kept per person by the quantized index.
+    # 'recall@1', 'accept' and 'dist' are the share of queries where the nearest person, the accept decision of
+    # 'identify_faces' and the reported distance (within 1e-4) are those of the brute-force scan.
+    # 'held B/p' is the memory held per person besides the float32 encodings, which stay memory-mapped from
+    # the Encode Database; 'read KiB' is how much of them a search reads.
+    print(f"{'persons':>8} {'backend':>12} {'param':>6} {'recall@1':>9} {'accept':>7} {'dist':>7} "
+          f"{'p50 ms':>7} {'p95 ms':>7} {'held B/p':>8} {'read KiB':>8}")
+    for num_persons in args.persons:
+        flat_encodes, queries, truth = synthetic_gallery(num_persons, args.queries, drift=args.drift)
+        flat_norms = squared_norms(flat_encodes)
+        person_bytes = flat_encodes.nbytes // num_persons
+
+        brute = BruteForceIndex(flat_encodes, flat_norms)
+        top_index, top_dis, latency = time_search(brute, queries)
+        exact = (top_index, top_dis)
+        report(num_persons, 'brute', '-', exact, exact, latency, flat_norms.nbytes, flat_encodes.nbytes)
+        print(f"{'':>8} {'':>12} {'':>6} {np.mean(top_index == truth):>9.3f}  (recall@1 of brute force against the drawn persons)")
+
+        for dtype in ('float16', 'int8'):
+            for prune_distance in args.prune:
+                quantized = QuantizedIndex.build(flat_encodes, dtype=dtype, prune_distance=prune_distance,
+                                                 rerank=args.rerank)
+                top_index, top_dis, latency = time_search(quantized, queries)
+                kept = len(quantized.codes) / num_persons
+                report(num_persons, f"{dtype}/{prune_distance}", f"{kept:.1f}", (top_index, top_dis), exact, latency,
+                       quantized.nbytes(), min(args.rerank, num_persons) * person_bytes)
+
+        start = time.perf_counter()
+        ivf = IVFIndex.train(flat_encodes)
+        print(f"{'':>8} ivf trained with {len(ivf.centroids)} partitions in {time.perf_counter() - start:.1f} s")
+        ivf.attach(flat_encodes, flat_norms)
+        for nprobe in args.nprobe:
+            ivf.nprobe = nprobe
+            top_index, top_dis, latency = time_search(ivf, queries)
+            report(num_persons, 'ivf', nprobe, (top_index, top_dis), exact, latency, flat_norms.nbytes + ivf.nbytes(),
+                   flat_encodes.nbytes * min(nprobe, len(ivf.centroids)) / len(ivf.centroids))
+
+if __name__ == '__main__':
+    main()
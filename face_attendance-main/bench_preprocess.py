@@ -0,0 +1,103 @@
+import time
+import argparse
+import tracemalloc
+from collections import defaultdict
+import cv2
+import numpy as np
+from preprocess import FramePreprocessor
+
+''' CLASS LIST '''
+# StageTimer
+
+''' FUNCTION LIST '''
+# legacy_frame
+# buffered_frame
+# measure
+# main
+
+# Micro-benchmark of the per-frame preprocessing: the previous hot path (a new array per step, drawing on the
+# full frame, a second colour conversion in the UI thread) against FramePreprocessor's reused buffers.
+# Usage: python bench_preprocess.py --frames 200
+
+FACES = [((200, 700, 500, 400), 'Mon', 87), ((180, 1100, 420, 860), '', 42)]
+
+def legacy_frame(img, timer):
+    with timer('crop'):
+        imgS = img[:, 280:1000]  # crop_center_image, discarded right away
+    with timer('resize'):
+        imgS = cv2.resize(img, (0,0), None, 0.25, 0.25)
+    with timer('cvtColor'):
+        imgS = cv2.cvtColor(imgS, cv2.COLOR_BGR2RGB)
+    with timer('blur'):
+        imgS = cv2.GaussianBlur(imgS, (15, 15), 1)
+    with timer('draw'):
+        # Drawn in place on the camera frame, as the previous hot path did
+        for (y1, x2, y2, x1), name, acc in FACES:
+            cv2.rectangle(img, (x1, y1), (x2, y2), (0, 255, 0), 2)
+            cv2.putText(img, f"{name} {acc}%", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 0, 0), 3, cv2.LINE_AA)
+    with timer('display resize'):
+        img = cv2.resize(img, (0,0), None, 1/2, 2/3)
+    with timer('display cvtColor'):
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    return imgS, img
+
+def buffered_frame(img, timer, preprocessor):
+    with timer('detect input'):
+        imgS = preprocessor.detect_input(img)
+    with timer('display frame'):
+        img = preprocessor.display_frame(img, FACES)
+    return imgS, img
+
+class StageTimer:
+    '''
+    Context-manager factory that accumulates the time and the allocated bytes of each named stage.
+    '''
+    def __init__(self):
+        self.ms = defaultdict(float)
+        self.bytes = defaultdict(int)
+
+    def __call__(self, stage):
+        timer = self
+
+        class Stage:
+            def __enter__(self):
+                self.before = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                self.start = time.perf_counter()
+
+            def __exit__(self, *exc):
+                timer.ms[stage] += (time.perf_counter() - self.start) * 1000
+                timer.bytes[stage] += tracemalloc.get_traced_memory()[1] - self.before
+        return Stage()
+
+def measure(process, num_frames):
+    '''
+    Run a preprocessing function over synthetic 1280x720 frames and return its per-stage averages.
+    '''
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 256, (720, 1280, 3), np.uint8) for _ in range(4)]
+    timer = StageTimer()
+    for i in range(num_frames):
+        process(frames[i % len(frames)], timer)
+    return {stage: (timer.ms[stage] / num_frames, timer.bytes[stage] / num_frames) for stage in timer.ms}
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the per-frame preprocessing before and after buffer reuse.")
+    parser.add_argument('--frames', type=int, default=200)
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    preprocessor = FramePreprocessor()
+    results = {'before': measure(legacy_frame, args.frames),
+               'after': measure(lambda img, timer: buffered_frame(img, timer, preprocessor), args.frames)}
+    tracemalloc.stop()
+
+    for label, stages in results.items():
+        print(f"{label}:")
+        for stage, (ms, allocated) in stages.items():
+            print(f"  {stage:<18} {ms:>7.3f} ms {allocated / 1024:>10.1f} KiB allocated")
+        print(f"  {'total':<18} {sum(ms for ms, _ in stages.values()):>7.3f} ms "
+              f"{sum(a for _, a in stages.values()) / 1024:>10.1f} KiB allocated")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+import utils
+from utils import augment_data, cur_img_process
+from gallery import EncodeGallery, NUM_VARIANTS
+from face_index import IVFIndex, QuantizedIndex
+from enrolment import encode_person_image, _encode_job
+from preprocess import FramePreprocessor
+from metrics import metrics
+from bench_index import synthetic_gallery
+from config import DETECTOR_BACKEND, ENROL_WORKERS, GALLERY_QUANTIZATION, GALLERY_PRUNE_DISTANCE, GALLERY_RERANK
+
+''' FUNCTION LIST '''
+# replay_frames
+# train_ivf_index
+# build_quantized_index
+# build_gallery
+# bench_matching
+# bench_replay
+# bench_enrolment
+# flatten
+# check_regression
+# main
+
+# Offline benchmark suite: no camera and no GUI. For every gallery size it builds a synthetic gallery (plus the
+# persons of the Image Database), replays a fixed set of frames made from the Image Database samples and their
+# augmented variants through 'cur_img_process', and measures the matching, the enrolment and the memory footprint.
+# Results are written to a JSON file; with '--baseline' they are compared to a previous run and the exit code
+# is 1 if a metric regressed by more than '--threshold'.
+# Usage: python bench_suite.py --persons 10000 50000 --output bench.json [--baseline old.json --threshold 0.1]
+
+FRAME_SIZE = (1280, 720)  # camera resolution of the live video
+
+# Direction of each summary metric, used by the regression check
+HIGHER_IS_BETTER = ('fps', 'images_per_s', 'recall_at_1', 'accuracy')
+
+def replay_frames(image_path='img_db'):
+    '''
+    Build the replay set: every Image Database sample and its brightness variants, also mirrored,
+    each centered on a black camera-sized frame.
+
+    Returns:
+        list: (expected name, BGR frame) pairs, always in the same order.
+    '''
+    frames = []
+    for img in sorted(os.listdir(image_path)):
+        image = cv2.imread(os.path.join(image_path, img))
+        if image is None:
+            continue
+        name = os.path.splitext(img)[0]
+        scale = min(FRAME_SIZE[0] / image.shape[1], FRAME_SIZE[1] / image.shape[0])
+        image = cv2.resize(image, (int(image.shape[1] * scale), int(image.shape[0] * scale)))
+        for variant in augment_data(image)[1:-1] + [cv2.flip(image, 1)]:  # drop the darkest and brightest levels
+            frame = np.zeros((FRAME_SIZE[1], FRAME_SIZE[0], 3), np.uint8)
+            y, x = (FRAME_SIZE[1] - variant.shape[0]) // 2, (FRAME_SIZE[0] - variant.shape[1]) // 2
+            frame[y:y + variant.shape[0], x:x + variant.shape[1]] = variant
+            frames.append((name, frame))
+    return frames
+
+def train_ivf_index(flat_encodes, flat_norms):
+    # Trained in memory only: the saved 'ivf_index.npz' of the Encode Database is left untouched
+    index = IVFIndex.train(flat_encodes, NUM_VARIANTS)
+    index.attach(flat_encodes, flat_norms)
+    return index
+
+def build_quantized_index(flat_encodes, flat_norms):
+    return QuantizedIndex.build(flat_encodes, NUM_VARIANTS, GALLERY_QUANTIZATION, GALLERY_PRUNE_DISTANCE, GALLERY_RERANK)
+
+def build_gallery(num_persons, real_names, real_encodes, index):
+    '''
+    Build an in-memory gallery of synthetic persons followed by the real persons, without touching the Encode Database.
+
+    Returns:
+        gallery (EncodeGallery): The loaded gallery.
+        queries (numpy.ndarray), truth (numpy.ndarray): Synthetic query faces and the person each was drawn from.
+        bytes_per_1k (float): Memory held by the loaded gallery and its index ('EncodeGallery.stats()'), per 1000 persons.
+    '''
+    flat_encodes, queries, truth = synthetic_gallery(num_persons, 500, NUM_VARIANTS)
+    names = [f"synthetic_{i:05d}" for i in range(num_persons)] + list(real_names)
+    real_encodes = np.asarray(real_encodes, np.float32).reshape(-1, NUM_VARIANTS, flat_encodes.shape[1])
+
+    def _load():
+        # Like 'read_encode_db': a new copy of the database on every (re)load
+        encodes = np.concatenate([flat_encodes.reshape(num_persons, NUM_VARIANTS, -1), real_encodes])
+        return names, encodes, encodes[:, 3]
+
+    index_builder = None
+    if index == 'ivf':
+        index_builder = train_ivf_index
+    elif index == 'quantized':
+        index_builder = build_quantized_index
+    gallery = EncodeGallery('<benchmark>', _load, index_builder, compact=index == 'quantized')
+    gallery.get()
+    return gallery, queries, truth, gallery.stats()['nbytes'] / len(names) * 1000
+
+def bench_matching(gallery, queries, truth):
+    '''
+    Search the synthetic queries one face at a time, as 'identify_faces' does.
+
+    Returns:
+        dict: recall@1 (nearest person is the one the query was drawn from) and the p50/p95 search latency in milliseconds.
+    '''
+    index = gallery.get().index
+    latency = np.empty(len(queries))
+    hits = 0
+    for i, (query, person) in enumerate(zip(queries, truth)):
+        start = time.perf_counter()
+        top_index, _ = index.search(query[None])
+        latency[i] = (time.perf_counter() - start) * 1000
+        hits += top_index[0, 0] == person
+    return {'recall_at_1': int(hits) / len(queries), 'p50_ms': float(np.percentile(latency, 50)),
+            'p95_ms': float(np.percentile(latency, 95))}
+
+def bench_replay(gallery, frames, rounds):
+    '''
+    Run the replay set through 'cur_img_process' with the stage metrics enabled.
+
+    Returns:
+        dict: fps, recognition accuracy on the replayed frames, the per-stage latency percentiles and the gauges
+            (gallery size, detect scale).
+    '''
+    utils.encode_gallery = gallery
+    preprocessor = FramePreprocessor()
+    metrics.enabled = True
+    metrics.histograms.clear()
+    correct = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for name, frame in frames:
+            names, _, _ = cur_img_process(frame, preprocessor=preprocessor)
+            correct += name in names
+    elapsed = time.perf_counter() - start
+    snapshot = metrics.snapshot()
+    metrics.enabled = False
+    num_frames = rounds * len(frames)
+    return {'fps': num_frames / elapsed, 'accuracy': correct / num_frames, 'frames': num_frames,
+            'stages': snapshot['stages'], 'gauges': snapshot['gauges']}
+
+def bench_enrolment(image_path, workers, repeat):
+    '''
+    Encode the Image Database 'repeat' times with the enrolment code path.
+
+    Returns:
+        dict: Encoded images per second and the number of images encoded.
+    '''
+    img_paths = [os.path.join(image_path, img) for img in sorted(os.listdir(image_path))] * repeat
+    start = time.perf_counter()
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_encode_job, img_paths, chunksize=4))
+    else:
+        results = [_encode_job(img_path) for img_path in img_paths]
+    elapsed = time.perf_counter() - start
+    encoded = sum(error is None for _, _, error in results)
+    return {'images_per_s': encoded / elapsed, 'images': encoded, 'failed': len(results) - encoded, 'workers': workers}
+
+def flatten(results):
+    '''
+    Collect the comparable metrics of a result file into a flat {name: value} dict.
+    '''
+    summary = {'enrolment.images_per_s': results['enrolment']['images_per_s']}
+    for size, run in results['galleries'].items():
+        summary[f'{size}.bytes_per_1k'] = run['bytes_per_1k']
+        for key in ('recall_at_1', 'p50_ms', 'p95_ms'):
+            summary[f'{size}.match.{key}'] = run['match'][key]
+        if 'replay' in run:
+            summary[f'{size}.replay.fps'] = run['replay']['fps']
+            summary[f'{size}.replay.accuracy'] = run['replay']['accuracy']
+            for stage, values in run['replay']['stages'].items():
+                summary[f'{size}.stage.{stage}.p95_ms'] = values['p95_ms']
+    return summary
+
+def check_regression(current, baseline, threshold):
+    '''
+    Compare two summaries and list the metrics that got worse by more than 'threshold' (relative).
+
+    Returns:
+        list: (metric, baseline value, current value) for each regression.
+    '''
+    regressions = []
+    for key, old in baseline.items():
+        new = current.get(key)
+        if new is None or old == 0:
+            continue
+        change = (new - old) / abs(old)
+        if key.endswith(HIGHER_IS_BETTER):
+            change = -change
+        if change > threshold:
+            regressions.append((key, old, new))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of recognition throughput, accuracy, enrolment and memory.")
+    parser.add_argument('--persons', type=int, nargs='+', default=[10000, 50000])
+    parser.add_argument('--index', choices=['brute', 'ivf', 'quantized'], default='brute')
+    parser.add_argument('--images', default='img_db', help="Image Database samples to replay and enrol")
+    parser.add_argument('--rounds', type=int, default=3, help="Number of times the replay set is run")
+    parser.add_argument('--enrol-repeat', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=ENROL_WORKERS)
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--baseline', help="Previous result file to compare with")
+    parser.add_argument('--threshold', type=float, default=0.10, help="Relative change counted as a regression")
+    args = parser.parse_args()
+
+    # Encodings of the real persons, added to every gallery so the replayed faces can be recognized
+    real_names, real_encodes = [], []
+    for img in sorted(os.listdir(args.images)):
+        try:
+            real_encodes.append(encode_person_image(os.path.join(args.images, img)))
+            real_names.append(os.path.splitext(img)[0])
+        except ValueError as e:
+            print(f"skipping {img}: {e}")
+    frames = replay_frames(args.images)
+
+    results = {'environment': {'python': platform.python_version(), 'numpy': np.__version__, 'opencv': cv2.__version__,
+                               'platform': platform.platform(), 'cpus': os.cpu_count(), 'detector': DETECTOR_BACKEND,
+                               'index': args.index},
+               'enrolment': bench_enrolment(args.images, args.workers, args.enrol_repeat),
+               'galleries': {}}
+    print(f"enrolment: {results['enrolment']['images_per_s']:.2f} images/s with {args.workers} worker(s)")
+    for num_persons in args.persons:
+        gallery, queries, truth, bytes_per_1k = build_gallery(num_persons, real_names, real_encodes, args.index)
+        run = {'bytes_per_1k': bytes_per_1k, 'match': bench_matching(gallery, queries, truth)}
+        if len(frames) != 0:
+            run['replay'] = bench_replay(gallery, frames, args.rounds)
+        results['galleries'][str(num_persons)] = run
+        print(f"{num_persons} persons: {bytes_per_1k / 2**20:.2f} MiB per 1k persons, "
+              f"recall@1 {run['match']['recall_at_1']:.3f}, match p95 {run['match']['p95_ms']:.2f} ms")
+        if 'replay' in run:
+            print(f"  replay: {run['replay']['fps']:.2f} fps, accuracy {run['replay']['accuracy']:.3f}")
+            for stage, values in run['replay']['stages'].items():
+                print(f"    {stage:<12} p50 {values['p50_ms']:>8.2f} ms  p95 {values['p95_ms']:>8.2f} ms")
+    results['summary'] = flatten(results)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=1)
+    print(f"results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['summary']
+        regressions = check_regression(results['summary'], baseline, args.threshold)
+        for key, old, new in regressions:
+            print(f"REGRESSION {key}: {old:.4g} -> {new:.4g}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regression above {args.threshold:.0%}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+import os
+
+''' APPLICATION SETTINGS '''
+
+# Face index used by the matcher:
+#   'brute' -> exact linear scan over every stored encoding
+#   'ivf'   -> approximate inverted-file index (k-means partitions), persisted in the 'encode_store' folder
+#   'quantized' -> compact in-memory copy: redundant brightness variants pruned, int8/float16 storage and an
+#                  exact float32 re-rank of the best candidates, read from the memory-mapped Encode Database
+#   'auto'  -> 'ivf' once the Encode Database holds at least IVF_MIN_PERSONS persons, 'brute' otherwise
+INDEX_BACKEND = 'auto'
+IVF_MIN_PERSONS = 5000
+IVF_NPROBE = 8          # partitions searched per face: higher is more accurate, lower is faster
+IVF_RETRAIN_GROWTH = 2  # retrain the partitions once the database has grown by this factor since training
+GALLERY_QUANTIZATION = 'int8'  # storage of the 'quantized' index: 'int8' (per-vector scale) or 'float16' (smaller
+                               # gain, and slower since NumPy converts it to float32 before every product)
+GALLERY_PRUNE_DISTANCE = 0.06  # variants closer than this to a kept prototype are dropped (0 keeps all 8)
+GALLERY_RERANK = 16            # candidates re-ranked with the exact float32 encodings
+
+# Video sources of the live attendance: camera indices, video files or stream URLs (e.g. 'rtsp://...' or the
+# 'http://127.0.0.1:8090/stream' MJPEG stream of stream_server.py). All of them feed the same attendance session
+CAMERA_SOURCES = [0]
+CAMERA_RESOLUTION = (1280, 720)  # requested resolution of the cameras
+
+# Live video tracking: run detection and recognition every TRACK_DETECT_INTERVAL frames (or when a track is lost)
+# and move the boxes with a cheap tracker in between
+TRACKING_ENABLED = True
+TRACK_DETECT_INTERVAL = 10
+TRACKER_TYPE = 'flow'   # 'flow' (optical flow), 'kcf', 'csrt' or 'mosse' (the last three need opencv-contrib-python)
+TRACK_SCALE = 0.5       # frames are downscaled by this factor before tracking
+
+# Number of recognition processes for the live video. With 1, recognition runs in a thread of the app
+# (with tracking); with more, frames are shared with worker processes and tracking is not used
+INFERENCE_WORKERS = 1
+INFERENCE_MAX_ERRORS = 10  # consecutive frames a worker failed to recognize before the live video stops
+
+# Number of processes encoding images in 'Convert to Encode Database'
+ENROL_WORKERS = os.cpu_count() or 1
+
+# Roster import ("Import Roster" in the "Edit Database" menu and roster_import.py): every photo must show exactly one face
+# and is stored as a JPEG whose longest side is at most IMPORT_MAX_SIDE, which also keeps the encoding fast
+IMPORT_WORKERS = os.cpu_count() or 1
+IMPORT_MAX_SIDE = 1024
+IMPORT_JPEG_QUALITY = 95
+IMPORT_DETECT_SIDE = 640  # the faces are counted on a copy downscaled to this size
+
+# Attendance storage: 'csv' appends to the session file in 'attendance_infor',
+# 'sqlite' writes to a database that several kiosks on the same machine can share
+ATTENDANCE_BACKEND = 'csv'
+ATTENDANCE_DB = os.path.join('attendance_infor', 'attendance.db')
+ATTENDANCE_FSYNC_EVERY = 1  # number of marks buffered before they are written and synced to disk
+ATTENDANCE_FLUSH_SECONDS = 5  # buffered marks, and marks whose write failed, are written at least this often
+
+# Index of the attendance history used by attendance_report.py, kept in 'attendance_infor' and refreshed from its
+# session files
+REPORT_INDEX_FILE = 'attendance_index.npz'
+
+# Hands-free marking: a person is marked once recognized in AUTO_MARK_CONFIRM_FRAMES of the last
+# AUTO_MARK_WINDOW_FRAMES frames, then ignored for AUTO_MARK_DEBOUNCE_SECONDS. Can be switched in the "Mode" menu
+AUTO_MARK_ENABLED = False
+AUTO_MARK_CONFIRM_FRAMES = 5
+AUTO_MARK_WINDOW_FRAMES = 8
+AUTO_MARK_DEBOUNCE_SECONDS = 10
+
+# Log file of the app (auto marks, startup timings, ...)
+LOG_FILE = 'face_attendance.log'
+
+# Face detector: 'hog' (dlib, default), 'haar' or 'lbp' (OpenCV cascades) or 'dnn' (OpenCV ResNet-10 SSD on the CPU).
+# The Haar cascade ships with opencv-python; the LBP cascade and the DNN model files have to be placed in 'models'
+# (see README.md). If they are missing, the 'hog' detector is used and a warning is logged
+DETECTOR_BACKEND = 'hog'
+HAAR_CASCADE_FILE = None  # None: the cascade shipped with opencv-python
+LBP_CASCADE_FILE = os.path.join('models', 'lbpcascade_frontalface_improved.xml')
+DNN_PROTOTXT_FILE = os.path.join('models', 'deploy.prototxt')
+DNN_MODEL_FILE = os.path.join('models', 'res10_300x300_ssd_iter_140000.caffemodel')
+DNN_CONFIDENCE = 0.6
+
+# Motion gate: skip face detection on the live video while the scene is static
+# (mean gray-level difference below MOTION_THRESHOLD), but detect at least every MOTION_MAX_SKIP frames
+MOTION_GATE_ENABLED = True
+MOTION_THRESHOLD = 4.0
+MOTION_MAX_SKIP = 30
+
+# Adaptive resolution: search the whole frame at a low resolution, then only a padded region around the faces
+# at a higher one. The scales are tuned to keep a frame under ADAPTIVE_LATENCY_BUDGET_MS
+ADAPTIVE_RESOLUTION = False
+ADAPTIVE_LATENCY_BUDGET_MS = 80
+ADAPTIVE_SEARCH_SCALES = (0.15, 0.2, 0.25, 0.33, 0.5)  # full-frame search
+ADAPTIVE_ROI_SCALES = (0.25, 0.33, 0.5, 0.75, 1.0)     # region of interest
+ADAPTIVE_ROI_PADDING = 0.5  # margin around the faces, as a fraction of the face size
+ADAPTIVE_ROI_MISSES = 3     # frames without a face before searching the whole frame again
+
+# Encoding cache: a face found in about the same place with a similar crop (perceptual hash) reuses the
+# match result of the last ENCODE_CACHE_TTL_SECONDS instead of being encoded again
+ENCODE_CACHE_ENABLED = True
+ENCODE_CACHE_SIZE = 32               # maximum number of cached faces
+ENCODE_CACHE_TTL_SECONDS = 2.0       # identity is re-verified at least this often
+ENCODE_CACHE_MAX_HASH_DISTANCE = 6   # differing bits of the 64-bit crop hashes
+ENCODE_CACHE_MAX_SHIFT = 0.15        # movement of the box center, as a fraction of the face width
+
+# Recognition service for thin-client kiosks (service.py). Bound to the loopback interface by default
+SERVICE_HOST = '127.0.0.1'
+SERVICE_PORT = 8080
+SERVICE_WORKERS = os.cpu_count() or 1  # threads decoding, detecting and encoding frames
+SERVICE_BATCH_WINDOW_MS = 5            # concurrent requests arriving within this window are matched together
+SERVICE_MAX_BATCH = 32                 # maximum number of requests matched together
+SERVICE_MAX_BODY = 8 * 1024 * 1024     # maximum size of a frame in bytes
+
+# Per-stage metrics of the recognition loop (latency histograms, FPS, queue depths, gallery size).
+# Disabled by default: the instrumentation then costs almost nothing
+METRICS_ENABLED = False
+METRICS_OVERLAY = False          # show a summary over the live video
+METRICS_LOG_FILE = 'metrics.jsonl'
+METRICS_LOG_INTERVAL = 10        # seconds between two snapshots appended to METRICS_LOG_FILE, None: no log
+METRICS_HTTP_PORT = None         # e.g. 9108: serve http://127.0.0.1:<port>/metrics (Prometheus text format)
+
+# Milliseconds between two checks for a new processed frame in the Tk window
+RENDER_POLL_MS = 10
@@ -0,0 +1,143 @@
+import os
+import logging
+import cv2
+import numpy as np
+import face_recognition
+from config import (DETECTOR_BACKEND, HAAR_CASCADE_FILE, LBP_CASCADE_FILE, DNN_PROTOTXT_FILE, DNN_MODEL_FILE,
+                    DNN_CONFIDENCE, MOTION_THRESHOLD, MOTION_MAX_SKIP)
+
+''' CLASS LIST '''
+# HOGDetector
+# CascadeDetector
+# DNNDetector
+# MotionGate
+
+''' FUNCTION LIST '''
+# create_detector
+
+logger = logging.getLogger('detectors')
+
+# Every detector takes an RGB image and returns face locations as (top, right, bottom, left) tuples,
+# like face_recognition.face_locations, so they can be passed straight to face_recognition.face_encodings.
+
+class HOGDetector:
+    '''
+    dlib's HOG face detector (the default of face_recognition).
+    '''
+    name = 'hog'
+
+    def detect(self, img):
+        return face_recognition.face_locations(img, model="hog")
+
+class CascadeDetector:
+    '''
+    OpenCV Haar or LBP cascade face detector.
+    '''
+    def __init__(self, cascade_file, name, scale_factor=1.1, min_neighbors=5):
+        if not os.path.isfile(cascade_file):
+            raise FileNotFoundError(f"Cascade file not found: {cascade_file}")
+        self.cascade = cv2.CascadeClassifier(cascade_file)
+        self.name = name
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+
+    def detect(self, img):
+        gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+        boxes = self.cascade.detectMultiScale(gray, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors, minSize=(20, 20))
+        return [(int(y), int(x + w), int(y + h), int(x)) for x, y, w, h in boxes]
+
+class DNNDetector:
+    '''
+    OpenCV DNN face detector (ResNet-10 SSD, Caffe model) running on the CPU.
+    '''
+    name = 'dnn'
+
+    def __init__(self, prototxt_file=DNN_PROTOTXT_FILE, model_file=DNN_MODEL_FILE, confidence=DNN_CONFIDENCE):
+        for path in (prototxt_file, model_file):
+            if not os.path.isfile(path):
+                raise FileNotFoundError(f"DNN face detector file not found: {path}")
+        self.net = cv2.dnn.readNetFromCaffe(prototxt_file, model_file)
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self.confidence = confidence
+
+    def detect(self, img):
+        height, width = img.shape[:2]
+        blob = cv2.dnn.blobFromImage(img, 1.0, (300, 300), (104.0, 177.0, 123.0), swapRB=True)
+        self.net.setInput(blob)
+        detections = self.net.forward()[0, 0]
+        detections = detections[detections[:, 2] >= self.confidence]
+        boxes = np.clip(detections[:, 3:7], 0, 1) * [width, height, width, height]
+        return [(int(y1), int(x2), int(y2), int(x1)) for x1, y1, x2, y2 in boxes if x2 > x1 and y2 > y1]
+
+def create_detector(backend=DETECTOR_BACKEND, fallback=True):
+    '''
+    Create a face detector.
+
+    Args:
+        backend (str): 'hog', 'haar', 'lbp' or 'dnn'.
+        fallback (bool): If the model files of the backend are missing or cannot be loaded, log a warning and
+            return the HOG detector instead of raising, so the app still starts.
+
+    Returns:
+        object: A detector with a 'detect(rgb_img)' method.
+
+    Raises:
+        FileNotFoundError, cv2.error: If the model files are missing or invalid and 'fallback' is False.
+    '''
+    try:
+        if backend == 'haar':
+            cascade_file = HAAR_CASCADE_FILE or os.path.join(cv2.data.haarcascades, 'haarcascade_frontalface_default.xml')
+            return CascadeDetector(cascade_file, 'haar')
+        if backend == 'lbp':
+            return CascadeDetector(LBP_CASCADE_FILE, 'lbp')
+        if backend == 'dnn':
+            return DNNDetector()
+    except (FileNotFoundError, cv2.error) as e:
+        if not fallback:
+            raise
+        logger.warning("'%s' face detector unavailable, using 'hog' instead: %s", backend, e)
+    return HOGDetector()
+
+class MotionGate:
+    '''
+    Cheap gate in front of the face detector, based on frame differencing.
+
+    Each frame is reduced to a tiny grayscale thumbnail and compared with the thumbnail of the last frame that
+    ran detection. Detection is skipped while the scene is static, but forced at least every 'max_skip' frames.
+    The faces of the last detection are kept in 'last_faces' so callers can reuse them on skipped frames.
+
+    Attributes:
+        checked (int): Number of frames checked.
+        skipped (int): Number of frames that did not need detection.
+    '''
+    def __init__(self, threshold=MOTION_THRESHOLD, max_skip=MOTION_MAX_SKIP, size=(64, 36)):
+        '''
+        Args:
+            threshold (float): Mean absolute gray-level difference above which the scene is considered moving.
+            max_skip (int): Maximum number of frames skipped in a row.
+            size (tuple): Size of the thumbnails.
+        '''
+        self.threshold = threshold
+        self.max_skip = max_skip
+        self.size = size
+        self.reference = None
+        self.skipped_in_row = 0
+        self.last_faces = []
+        self.checked = 0
+        self.skipped = 0
+
+    def check(self, img):
+        '''
+        Tell whether a BGR or RGB frame needs detection.
+        '''
+        self.checked += 1
+        thumb = cv2.resize(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), self.size, interpolation=cv2.INTER_AREA)
+        if self.reference is not None and self.skipped_in_row < self.max_skip:
+            if cv2.absdiff(thumb, self.reference).mean() < self.threshold:
+                self.skipped_in_row += 1
+                self.skipped += 1
+                return False
+        self.reference = thumb
+        self.skipped_in_row = 0
+        return True
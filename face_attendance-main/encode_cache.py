@@ -0,0 +1,113 @@
+import time
+from collections import OrderedDict
+import cv2
+import numpy as np
+from config import ENCODE_CACHE_SIZE, ENCODE_CACHE_TTL_SECONDS, ENCODE_CACHE_MAX_HASH_DISTANCE, ENCODE_CACHE_MAX_SHIFT
+
+''' CLASS LIST '''
+# EncodingCache
+
+''' FUNCTION LIST '''
+# crop_hash
+
+def crop_hash(img, face_loc):
+    '''
+    Compute the 64-bit difference hash (dHash) of a face crop: the crop is reduced to a 9x8 grayscale
+    thumbnail and each bit tells whether a pixel is brighter than its right neighbour.
+
+    Args:
+        img (numpy.ndarray): The RGB image the face was detected in.
+        face_loc (tuple): (top, right, bottom, left) of the face in 'img'.
+
+    Returns:
+        int: The hash.
+    '''
+    top, right, bottom, left = face_loc
+    crop = img[max(0, top):bottom, max(0, left):right]
+    if crop.size == 0:
+        return 0
+    thumb = cv2.resize(cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY), (9, 8), interpolation=cv2.INTER_AREA)
+    return int.from_bytes(np.packbits(thumb[:, 1:] > thumb[:, :-1]).tobytes(), 'big')
+
+class EncodingCache:
+    '''
+    Small LRU cache of face encodings and match results, so a person standing still in front of the camera
+    is not re-encoded on every frame.
+
+    A face is looked up by its position in the frame and the perceptual hash of its crop: it hits an entry
+    whose box center moved by at most 'max_shift' face widths, whose size changed by at most 20% and whose
+    hash differs by at most 'max_hash_distance' bits. Entries expire after 'ttl_seconds', so the identity
+    is re-verified periodically, and at most 'max_entries' are kept.
+    Results matched against an older copy of the Encode Database are never reused.
+
+    Attributes:
+        hits (int): Number of lookups served from the cache.
+        misses (int): Number of lookups that needed a new encoding.
+    '''
+    def __init__(self, max_entries=ENCODE_CACHE_SIZE, ttl_seconds=ENCODE_CACHE_TTL_SECONDS,
+                 max_hash_distance=ENCODE_CACHE_MAX_HASH_DISTANCE, max_shift=ENCODE_CACHE_MAX_SHIFT):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_hash_distance = max_hash_distance
+        self.max_shift = max_shift
+        self.entries = OrderedDict()  # id -> (key, time, encoding, result, gallery), least recently used first
+        self.next_id = 0
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, img, face_loc, frame_loc, gallery):
+        '''
+        Look a face up.
+
+        Args:
+            img (numpy.ndarray): The RGB image the face was detected in.
+            face_loc (tuple): (top, right, bottom, left) of the face in 'img'.
+            frame_loc (tuple): (top, right, bottom, left) of the face in frame pixels.
+            gallery (GalleryData): The gallery the result has to come from.
+
+        Returns:
+            key (tuple): Key to give to 'put()' on a miss.
+            result (tuple): The cached (name, accuracy), or None on a miss.
+        '''
+        top, right, bottom, left = frame_loc
+        key = ((left + right) / 2, (top + bottom) / 2, right - left, crop_hash(img, face_loc))
+        clock = time.monotonic()
+        for entry_id, (entry_key, entry_time, _, result, entry_gallery) in list(self.entries.items()):
+            if clock - entry_time > self.ttl_seconds or entry_gallery is not gallery:
+                del self.entries[entry_id]
+                continue
+            if self._similar(key, entry_key):
+                self.entries.move_to_end(entry_id)
+                self.hits += 1
+                return key, result
+        self.misses += 1
+        return key, None
+
+    def _similar(self, key, entry_key):
+        x, y, width, hash_value = key
+        entry_x, entry_y, entry_width, entry_hash = entry_key
+        if abs(width - entry_width) > 0.2 * entry_width:
+            return False
+        if max(abs(x - entry_x), abs(y - entry_y)) > self.max_shift * entry_width:
+            return False
+        return bin(hash_value ^ entry_hash).count('1') <= self.max_hash_distance
+
+    def put(self, key, encoding, result, gallery):
+        '''
+        Store the encoding and the (name, accuracy) match result of a face that missed the cache.
+        '''
+        self.entries[self.next_id] = (key, time.monotonic(), encoding, result, gallery)
+        self.next_id += 1
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        '''
+        Return the hit and miss counters, the hit rate and the number of entries.
+        '''
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / lookups if lookups else 0.0,
+                'size': len(self.entries)}
@@ -0,0 +1,308 @@
+import os
+import csv
+import json
+import numpy as np
+from face_index import BruteForceIndex, IVFIndex, QuantizedIndex
+from config import INDEX_BACKEND, IVF_MIN_PERSONS, IVF_NPROBE, IVF_RETRAIN_GROWTH
+from config import GALLERY_QUANTIZATION, GALLERY_PRUNE_DISTANCE, GALLERY_RERANK
+
+''' FUNCTION LIST '''
+# str_to_list_arr
+# load_encode_store
+# save_encode_store
+# append_to_encode_store
+# remove_from_encode_store
+# update_encode_store
+# migrate_csv_to_store
+# export_csv
+# load_face_index
+
+# The Encode Database is kept in the 'encode_store' folder:
+#   index.json           -> format version, generation, data file name and the person name/ID index
+#   encodes-<gen>.npy    -> float32 matrix of shape (N, 8, 128), memory-mapped on load
+#   ivf_index.npz        -> optional approximate face index, tagged with the generation it belongs to
+# A write creates a new data file and then atomically replaces 'index.json', so readers always see
+# a consistent pair and a data file that is still mapped by a reader is never overwritten.
+FORMAT_VERSION = 1
+STORE_DIR = "encode_store"
+INDEX_FILE = os.path.join(STORE_DIR, "index.json")
+IVF_FILE = os.path.join(STORE_DIR, "ivf_index.npz")
+LEGACY_CSV_FILE = "encode_db.csv"
+NUM_VARIANTS = 8
+ENCODE_DIM = 128
+
+def str_to_list_arr(row):
+    '''
+    Convert a row in a legacy CSV file that contains encodes for a person
+    to a list that contains encoded arrays for each different brightness level.
+
+    Args:
+        row (str): The row in the CSV file.
+
+    Returns:
+        list: A list of encoded arrays.
+    '''
+    row = row[1:-2].replace('array', '').replace('(', '')
+    list_arr = [np.fromstring(arr[1:-1], sep=', ') for arr in list(row.split('), '))]
+    return list_arr
+
+def _empty_index():
+    return {'format_version': FORMAT_VERSION, 'generation': 0, 'data_file': None, 'next_id': 1, 'persons': []}
+
+def _read_index():
+    with open(INDEX_FILE, 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    if index.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported Encode Database format version: {index.get('format_version')}")
+    return index
+
+def load_encode_store(mmap=True):
+    '''
+    Load the Encode Database from the binary store.
+
+    If the store does not exist yet but a legacy 'encode_db.csv' does, the CSV is migrated once.
+    The encodings are memory-mapped so no parsing or copying happens at startup.
+
+    Args:
+        mmap (bool): Map the data file read-only instead of reading it into memory.
+
+    Returns:
+        names (list): Person names in the database.
+        ids (list): Stable person IDs, in the same order as the names.
+        encodes (numpy.ndarray): float32 array of shape (N, 8, 128).
+    '''
+    if not os.path.isfile(INDEX_FILE):
+        if os.path.isfile(LEGACY_CSV_FILE):
+            migrate_csv_to_store(LEGACY_CSV_FILE)
+        else:
+            return [], [], np.empty((0, NUM_VARIANTS, ENCODE_DIM), np.float32)
+    index = _read_index()
+    names = [person['name'] for person in index['persons']]
+    ids = [person['id'] for person in index['persons']]
+    if index['data_file'] is None or len(names) == 0:
+        return names, ids, np.empty((0, NUM_VARIANTS, ENCODE_DIM), np.float32)
+    encodes = np.load(os.path.join(STORE_DIR, index['data_file']), mmap_mode='r' if mmap else None)
+    if encodes.shape != (len(names), NUM_VARIANTS, ENCODE_DIM) or encodes.dtype != np.float32:
+        raise ValueError(f"Encode Database data file does not match its index: {encodes.shape}")
+    return names, ids, encodes
+
+def save_encode_store(names, ids, encodes, next_id=None):
+    '''
+    Write a new generation of the Encode Database.
+
+    Args:
+        names (list): Person names.
+        ids (list): Person IDs, in the same order as the names.
+        encodes (numpy.ndarray): Encodings of shape (N, 8, 128).
+        next_id (int): Next free person ID. Defaults to max(ids) + 1.
+
+    Returns:
+        int: The generation number of the written database.
+    '''
+    os.makedirs(STORE_DIR, exist_ok=True)
+    old_index = _read_index() if os.path.isfile(INDEX_FILE) else _empty_index()
+    generation = old_index['generation'] + 1
+    data_file = f"encodes-{generation:06d}.npy"
+    encodes = np.ascontiguousarray(encodes, dtype=np.float32).reshape(-1, NUM_VARIANTS, ENCODE_DIM)
+    with open(os.path.join(STORE_DIR, data_file), 'wb') as f:
+        np.save(f, encodes)
+        f.flush()
+        os.fsync(f.fileno())
+
+    if next_id is None:
+        next_id = max(ids, default=0) + 1
+    index = {'format_version': FORMAT_VERSION, 'generation': generation, 'data_file': data_file,
+             'dim': ENCODE_DIM, 'variants': NUM_VARIANTS, 'next_id': max(next_id, old_index['next_id']),
+             'persons': [{'id': int(person_id), 'name': name} for person_id, name in zip(ids, names)]}
+    temp_file = INDEX_FILE + ".tmp"
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file, INDEX_FILE)
+
+    # Remove older data files; one that is still mapped (e.g. on Windows) is removed on a later write
+    for filename in os.listdir(STORE_DIR):
+        if filename.startswith('encodes-') and filename.endswith('.npy') and filename != data_file:
+            try:
+                os.remove(os.path.join(STORE_DIR, filename))
+            except OSError:
+                pass
+    return generation
+
+def _update_ivf_index(update, old_generation, new_generation):
+    '''
+    Apply an incremental update to the persisted face index, if there is one for the previous generation.
+    '''
+    if not os.path.isfile(IVF_FILE):
+        return
+    index, generation = IVFIndex.load(IVF_FILE)
+    if generation != old_generation:
+        return  # stale index, rebuilt by 'load_face_index()'
+    update(index)
+    index.save(IVF_FILE, new_generation)
+
+def append_to_encode_store(new_names, new_encodes):
+    '''
+    Add persons to the Encode Database.
+
+    Args:
+        new_names (list): Names of the new persons.
+        new_encodes (list): For each new person, a list of 8 encodings of length 128.
+
+    Returns:
+        list: The IDs assigned to the new persons.
+    '''
+    names, ids, encodes = load_encode_store(mmap=False)
+    old_index = _read_index() if os.path.isfile(INDEX_FILE) else _empty_index()
+    next_id = old_index['next_id']
+    new_ids = list(range(next_id, next_id + len(new_names)))
+    new_encodes = np.asarray(new_encodes, dtype=np.float32).reshape(-1, NUM_VARIANTS, ENCODE_DIM)
+    generation = save_encode_store(names + list(new_names), ids + new_ids, np.concatenate([encodes, new_encodes]),
+                                   next_id=next_id + len(new_names))
+    _update_ivf_index(lambda index: index.add(new_encodes.reshape(-1, ENCODE_DIM)), old_index['generation'], generation)
+    return new_ids
+
+def remove_from_encode_store(target_name):
+    '''
+    Remove every person with the given name from the Encode Database.
+
+    Args:
+        target_name (str): The name to remove.
+
+    Returns:
+        bool: True if the name was found and removed.
+    '''
+    names, ids, encodes = load_encode_store(mmap=False)
+    keep = [i for i, name in enumerate(names) if name != target_name]
+    if len(keep) == len(names):
+        return False
+    old_index = _read_index()
+    generation = save_encode_store([names[i] for i in keep], [ids[i] for i in keep], encodes[keep],
+                                   next_id=old_index['next_id'])
+    _update_ivf_index(lambda index: index.remove(keep), old_index['generation'], generation)
+    return True
+
+def update_encode_store(new_names, new_encodes, remove_names=()):
+    '''
+    Remove persons and add persons in a single new generation of the Encode Database.
+
+    A person who is removed and added again (re-enrolled) keeps their ID.
+
+    Args:
+        new_names (list): Names of the persons to add.
+        new_encodes (list): For each person to add, a list of 8 encodings of length 128.
+        remove_names (iterable): Names of the persons to remove first.
+
+    Returns:
+        list: The IDs of the added persons.
+    '''
+    names, ids, encodes = load_encode_store(mmap=False)
+    old_index = _read_index() if os.path.isfile(INDEX_FILE) else _empty_index()
+    remove_names = set(remove_names)
+    keep = [i for i, name in enumerate(names) if name not in remove_names]
+    removed_ids = {name: person_id for name, person_id in zip(names, ids) if name in remove_names}
+    next_id = old_index['next_id']
+    new_ids = []
+    for name in new_names:
+        if name in removed_ids:
+            new_ids.append(removed_ids.pop(name))
+        else:
+            new_ids.append(next_id)
+            next_id += 1
+    new_encodes = np.asarray(new_encodes, dtype=np.float32).reshape(-1, NUM_VARIANTS, ENCODE_DIM)
+    generation = save_encode_store([names[i] for i in keep] + list(new_names), [ids[i] for i in keep] + new_ids,
+                                   np.concatenate([encodes[keep], new_encodes]), next_id=next_id)
+
+    def update(index):
+        index.remove(keep)
+        index.add(new_encodes.reshape(-1, ENCODE_DIM))
+    _update_ivf_index(update, old_index['generation'], generation)
+    return new_ids
+
+def migrate_csv_to_store(csv_file=LEGACY_CSV_FILE):
+    '''
+    Convert a CSV Encode Database into the binary store (one-shot migration).
+
+    Both the legacy "Name,Encode" layout and the layout written by 'export_csv()' are accepted.
+    The legacy file is kept as '<name>_legacy.csv' and replaced by a fresh export.
+
+    Args:
+        csv_file (str): The CSV file to migrate.
+    '''
+    names = []
+    ids = []
+    encodes = []
+    with open(csv_file, mode='r', newline='') as file:
+        csv_reader = csv.reader(file)
+        header = next(csv_reader, ['Name', 'Encode'])
+        if header[:2] == ['Name', 'Encode']:
+            for row in csv_reader:
+                names.append(row[0])
+                ids.append(len(ids) + 1)
+                encodes.append(str_to_list_arr(row[1]))
+        else:
+            for row in csv_reader:
+                if not names or names[-1] != row[0] or len(encodes[-1]) == NUM_VARIANTS:
+                    names.append(row[0])
+                    ids.append(int(row[1]))
+                    encodes.append([])
+                encodes[-1].append(np.array(row[3:], dtype=np.float32))
+    encodes = np.asarray(encodes, dtype=np.float32).reshape(-1, NUM_VARIANTS, ENCODE_DIM)
+    save_encode_store(names, ids, encodes)
+    root, ext = os.path.splitext(csv_file)
+    os.replace(csv_file, f"{root}_legacy{ext}")
+    export_csv(csv_file)
+
+def export_csv(csv_file=LEGACY_CSV_FILE):
+    '''
+    Export the Encode Database to a readable CSV file (one row per person and brightness level).
+
+    Args:
+        csv_file (str): The CSV file to write.
+    '''
+    names, ids, encodes = load_encode_store()
+    with open(csv_file, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Name', 'ID', 'Variant'] + [f'e{i}' for i in range(ENCODE_DIM)])
+        for name, person_id, encode in zip(names, ids, encodes):
+            for variant, arr in enumerate(encode):
+                writer.writerow([name, person_id, variant] + [repr(float(x)) for x in arr])
+
+def load_face_index(flat_encodes, flat_norms):
+    '''
+    Create the face index used by the matcher, according to the settings in 'config.py'.
+
+    The approximate index is loaded from 'ivf_index.npz' when it matches the current generation of the
+    Encode Database, and (re)trained and saved otherwise. The quantized index is rebuilt in memory; the store
+    keeps the 8 full-precision encodings of every person, which it reads for the exact re-rank.
+
+    Args:
+        flat_encodes (numpy.ndarray): Gallery encodings of shape (N*8, 128).
+        flat_norms (numpy.ndarray): Squared norms of 'flat_encodes' (None for the quantized index).
+
+    Returns:
+        BruteForceIndex, IVFIndex or QuantizedIndex: The index.
+    '''
+    num_persons = len(flat_encodes) // NUM_VARIANTS
+    backend = INDEX_BACKEND
+    if backend == 'auto':
+        backend = 'ivf' if num_persons >= IVF_MIN_PERSONS else 'brute'
+    if backend == 'quantized':
+        return QuantizedIndex.build(flat_encodes, NUM_VARIANTS, GALLERY_QUANTIZATION, GALLERY_PRUNE_DISTANCE,
+                                    GALLERY_RERANK)
+    if backend == 'brute' or num_persons == 0:
+        return BruteForceIndex(flat_encodes, flat_norms, NUM_VARIANTS)
+
+    generation = _read_index()['generation']
+    index = None
+    if os.path.isfile(IVF_FILE):
+        index, ivf_generation = IVFIndex.load(IVF_FILE, IVF_NPROBE)
+        if (ivf_generation != generation or len(index.assign) != len(flat_encodes)
+                or len(flat_encodes) > IVF_RETRAIN_GROWTH * index.trained_size):
+            index = None
+    if index is None:
+        index = IVFIndex.train(flat_encodes, NUM_VARIANTS, IVF_NPROBE)
+        index.save(IVF_FILE, generation)
+    index.attach(flat_encodes, flat_norms)
+    return index
@@ -0,0 +1,143 @@
+import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import face_recognition
+from utils import crop_center_image, augment_data
+from encode_store import load_encode_store, update_encode_store
+from config import ENROL_WORKERS
+
+''' FUNCTION LIST '''
+# file_hash
+# load_manifest
+# save_manifest
+# encode_person_image
+# enrol_img_db
+
+# The manifest records the content hash of every image that was encoded, so unchanged images are skipped
+# and changed ones are re-encoded on the next run
+MANIFEST_FILE = "img_db_manifest.json"
+
+def file_hash(path):
+    '''
+    Compute the SHA-256 hash of a file's content.
+    '''
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def load_manifest(manifest_file=MANIFEST_FILE):
+    '''
+    Read the enrolment manifest: {file name: {'name': person name, 'sha256': content hash}}.
+    '''
+    if not os.path.isfile(manifest_file):
+        return {}
+    with open(manifest_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_manifest(manifest, manifest_file=MANIFEST_FILE):
+    temp_file = manifest_file + ".tmp"
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(temp_file, manifest_file)
+
+def encode_person_image(img_path):
+    '''
+    Compute the 8 brightness-level encodings of the person in an image.
+
+    The face is detected once on the original image and its location is reused for every augmented image,
+    so the encoder never has to re-detect the face on a darkened or over-exposed copy.
+
+    Args:
+        img_path (str): Path of the image.
+
+    Returns:
+        list: 8 face encodings of length 128.
+
+    Raises:
+        ValueError: If the image cannot be read or contains no face.
+    '''
+    image = cv2.imread(img_path)
+    if image is None:
+        raise ValueError("cannot read the image")
+    image = crop_center_image(image)
+    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)  # convert BGR to RGB
+    image = cv2.GaussianBlur(image, (15, 15), 1)   # apply GaussianBlur filter to denoise the image
+    face_locations = face_recognition.face_locations(image, model="hog")
+    if len(face_locations) == 0:
+        raise ValueError("no face found")
+    # Keep the largest face if there are several
+    face_loc = max(face_locations, key=lambda loc: (loc[2] - loc[0]) * (loc[1] - loc[3]))
+    augmented_images = augment_data(image)
+    return [face_recognition.face_encodings(aug_img, [face_loc], model="hog")[0] for aug_img in augmented_images]
+
+def _encode_job(img_path):
+    # Runs in a worker process: failures are returned instead of raised so one bad image never aborts the batch
+    try:
+        return img_path, encode_person_image(img_path), None
+    except Exception as e:
+        return img_path, None, str(e) or type(e).__name__
+
+def enrol_img_db(image_path='img_db', workers=ENROL_WORKERS):
+    '''
+    Incrementally encode the Image Database into the Encode Database.
+
+    New images are encoded, images whose content changed since they were encoded replace the person's encodings,
+    and unchanged images are skipped. Images are encoded in parallel by a process pool.
+
+    Args:
+        image_path (str): The Image Database folder.
+        workers (int): Number of worker processes. With 1, images are encoded in this process.
+
+    Returns:
+        dict: Report with the lists 'added', 'updated', 'skipped' (person names) and 'failed' ((file name, reason) pairs).
+    '''
+    existing_person_names = set(load_encode_store()[0])
+    manifest = load_manifest()
+    report = {'added': [], 'updated': [], 'skipped': [], 'failed': []}
+
+    # Decide which images need encoding
+    jobs = {}
+    image_files = sorted(os.listdir(image_path))
+    manifest = {img: entry for img, entry in manifest.items() if img in image_files}
+    for img in image_files:
+        name, ext = os.path.splitext(img)
+        img_path = os.path.join(image_path, img)
+        sha = file_hash(img_path)
+        if name in existing_person_names and manifest.get(img, {}).get('sha256', sha) == sha:
+            # Unchanged, or encoded before the manifest existed
+            manifest[img] = {'name': name, 'sha256': sha}
+            report['skipped'].append(name)
+            continue
+        jobs[img_path] = (img, name, sha)
+
+    # Encode them in parallel
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+            results = list(executor.map(_encode_job, jobs, chunksize=4))
+    else:
+        results = [_encode_job(img_path) for img_path in jobs]
+
+    new_person_names = []
+    new_encodes = []
+    for img_path, encode, error in results:
+        img, name, sha = jobs[img_path]
+        if error is not None:
+            report['failed'].append((img, error))
+            continue
+        if name in existing_person_names:
+            report['updated'].append(name)
+        else:
+            report['added'].append(name)
+        new_person_names.append(name)
+        new_encodes.append(encode)
+        manifest[img] = {'name': name, 'sha256': sha}
+
+    # Replace the updated persons and add the new ones in a single rewrite of the Encode Database
+    if len(new_person_names) != 0:
+        update_encode_store(new_person_names, new_encodes, report['updated'])
+    save_manifest(manifest)
+    return report
@@ -0,0 +1,409 @@
+import os
+import numpy as np
+from matcher import squared_norms, match_faces
+
+''' CLASS LIST '''
+# BruteForceIndex
+# IVFIndex
+# QuantizedIndex
+
+''' FUNCTION LIST '''
+# kmeans
+# nearest_centroids
+# prune_variants
+# quantize_rows
+
+def nearest_centroids(encodes, centroids, chunk_size=16384):
+    '''
+    Assign every encoding to its nearest centroid.
+
+    Args:
+        encodes (numpy.ndarray): Encodings of shape (M, 128).
+        centroids (numpy.ndarray): Centroids of shape (C, 128).
+        chunk_size (int): Number of encodings processed at once, to bound memory.
+
+    Returns:
+        numpy.ndarray: int32 array of shape (M,) with the centroid index of each encoding.
+    '''
+    centroid_norms = squared_norms(centroids)
+    assign = np.empty(len(encodes), np.int32)
+    for start in range(0, len(encodes), chunk_size):
+        chunk = np.asarray(encodes[start:start + chunk_size], dtype=np.float32)
+        dis = centroid_norms[None, :] - 2 * (chunk @ centroids.T)
+        assign[start:start + chunk_size] = np.argmin(dis, axis=1)
+    return assign
+
+def kmeans(encodes, num_clusters, num_iters=10, sample_size=None, seed=0):
+    '''
+    Partition encodings with Lloyd's k-means, trained on a random sample.
+
+    Args:
+        encodes (numpy.ndarray): Encodings of shape (M, 128).
+        num_clusters (int): Number of centroids.
+        num_iters (int): Number of Lloyd iterations.
+        sample_size (int): Number of encodings used for training. Defaults to 256 per centroid.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        numpy.ndarray: float32 centroids of shape (num_clusters, 128).
+    '''
+    rng = np.random.default_rng(seed)
+    if sample_size is None:
+        sample_size = 256 * num_clusters
+    if sample_size < len(encodes):
+        sample = np.asarray(encodes[np.sort(rng.choice(len(encodes), sample_size, replace=False))], dtype=np.float32)
+    else:
+        sample = np.asarray(encodes, dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), num_clusters, replace=False)].copy()
+    for _ in range(num_iters):
+        assign = nearest_centroids(sample, centroids)
+        counts = np.bincount(assign, minlength=num_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        non_empty = counts > 0
+        centroids[non_empty] = sums[non_empty] / counts[non_empty, None]
+        # Restart empty clusters from random samples
+        empty = np.flatnonzero(~non_empty)
+        centroids[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+    return centroids
+
+class BruteForceIndex:
+    '''
+    Exact index: scans every stored encoding with 'match_faces()'.
+    '''
+    def __init__(self, flat_encodes, flat_norms, num_variants=8):
+        self.flat_encodes = flat_encodes
+        self.flat_norms = flat_norms
+        self.num_variants = num_variants
+
+    def nbytes(self):
+        '''
+        Return the memory held by the index besides the gallery arrays it searches, in bytes.
+        '''
+        return 0
+
+    def search(self, query_encodes, k=1):
+        '''
+        Find the k nearest persons of each face.
+
+        Args:
+            query_encodes (numpy.ndarray): Encodings of shape (Q, 128) or (128,).
+            k (int): Number of persons to return per face.
+
+        Returns:
+            top_index (numpy.ndarray): Person indices of shape (Q, k), nearest first.
+            top_dis (numpy.ndarray): Face distances of shape (Q, k).
+        '''
+        return match_faces(query_encodes, self.flat_encodes, self.flat_norms, self.num_variants, k)
+
+class IVFIndex:
+    '''
+    Approximate inverted-file index.
+
+    The stored encodings are partitioned with k-means. A search only scans the 'nprobe' partitions
+    whose centroids are nearest to the face, so 'nprobe' trades recall for latency.
+    Encodings are referenced by their row in the flattened (N*8, 128) gallery, so the index
+    only keeps the centroids and one partition number per row.
+    '''
+    def __init__(self, centroids, assign, num_variants=8, nprobe=8, trained_size=None):
+        '''
+        Args:
+            centroids (numpy.ndarray): Centroids of shape (C, 128).
+            assign (numpy.ndarray): Partition number of every gallery row, shape (N*8,).
+            num_variants (int): Number of encodings stored per person.
+            nprobe (int): Number of partitions searched per face.
+            trained_size (int): Number of rows the centroids were trained on.
+        '''
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.centroid_norms = squared_norms(self.centroids)
+        self.num_variants = num_variants
+        self.nprobe = nprobe
+        self.trained_size = len(assign) if trained_size is None else trained_size
+        self.flat_encodes = None
+        self.flat_norms = None
+        self._set_assign(np.asarray(assign, dtype=np.int32))
+
+    def _set_assign(self, assign):
+        self.assign = assign
+        self.order = np.argsort(assign, kind='stable').astype(np.int32)
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=len(self.centroids)))])
+
+    @classmethod
+    def train(cls, flat_encodes, num_variants=8, nprobe=8, num_lists=None):
+        '''
+        Build an index by running k-means over the gallery.
+
+        Args:
+            flat_encodes (numpy.ndarray): Gallery encodings of shape (N*8, 128).
+            num_variants (int): Number of encodings stored per person.
+            nprobe (int): Number of partitions searched per face.
+            num_lists (int): Number of partitions. Defaults to 4 * sqrt(N*8).
+
+        Returns:
+            IVFIndex: The trained index.
+        '''
+        if num_lists is None:
+            num_lists = int(4 * np.sqrt(len(flat_encodes)))
+        num_lists = max(1, min(num_lists, len(flat_encodes)))
+        centroids = kmeans(flat_encodes, num_lists)
+        return cls(centroids, nearest_centroids(flat_encodes, centroids), num_variants, nprobe)
+
+    def attach(self, flat_encodes, flat_norms):
+        '''
+        Attach the gallery rows the index refers to.
+        '''
+        if len(flat_encodes) != len(self.assign):
+            raise ValueError(f"Index covers {len(self.assign)} encodings but the gallery has {len(flat_encodes)}")
+        self.flat_encodes = flat_encodes
+        self.flat_norms = flat_norms
+
+    def nbytes(self):
+        '''
+        Return the memory held by the index besides the gallery arrays it searches, in bytes.
+        '''
+        return (self.centroids.nbytes + self.centroid_norms.nbytes + self.assign.nbytes + self.order.nbytes
+                + self.offsets.nbytes)
+
+    def add(self, new_flat_encodes):
+        '''
+        Append the encodings of newly enrolled persons (rows added at the end of the gallery).
+        '''
+        if len(new_flat_encodes) != 0:
+            self._set_assign(np.concatenate([self.assign, nearest_centroids(new_flat_encodes, self.centroids)]))
+
+    def remove(self, keep_persons):
+        '''
+        Drop deleted persons.
+
+        Args:
+            keep_persons (list): Indices of the persons that remain, in gallery order.
+        '''
+        self._set_assign(np.ascontiguousarray(self.assign.reshape(-1, self.num_variants)[keep_persons].ravel()))
+
+    def search(self, query_encodes, k=1):
+        '''
+        Find the approximate k nearest persons of each face.
+
+        Args:
+            query_encodes (numpy.ndarray): Encodings of shape (Q, 128) or (128,).
+            k (int): Number of persons to return per face.
+
+        Returns:
+            top_index (numpy.ndarray): Person indices of shape (Q, k), nearest first. Missing results are -1.
+            top_dis (numpy.ndarray): Face distances of shape (Q, k). Missing results are inf.
+        '''
+        query_encodes = np.asarray(query_encodes, dtype=np.float32).reshape(-1, self.centroids.shape[1])
+        top_index = np.full((len(query_encodes), k), -1, np.intp)
+        top_dis = np.full((len(query_encodes), k), np.inf, np.float32)
+        nprobe = min(self.nprobe, len(self.centroids))
+        centroid_dis = self.centroid_norms[None, :] - 2 * (query_encodes @ self.centroids.T)
+        probes = np.argpartition(centroid_dis, nprobe - 1, axis=1)[:, :nprobe]
+        for q, query in enumerate(query_encodes):
+            rows = np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in probes[q]])
+            if len(rows) == 0:
+                continue
+            dis = self.flat_norms[rows] - 2 * (self.flat_encodes[rows] @ query) + query @ query
+            # Keep the nearest brightness variant of each candidate person
+            persons, inverse = np.unique(rows // self.num_variants, return_inverse=True)
+            person_dis = np.full(len(persons), np.inf, np.float32)
+            np.minimum.at(person_dis, inverse, dis)
+            n = min(k, len(persons))
+            best = np.argsort(person_dis)[:n]
+            top_index[q, :n] = persons[best]
+            top_dis[q, :n] = np.sqrt(np.maximum(person_dis[best], 0))
+        return top_index, top_dis
+
+    def save(self, index_file, generation):
+        '''
+        Persist the index for the given Encode Database generation.
+        '''
+        temp_file = index_file + ".tmp.npz"
+        np.savez(temp_file, centroids=self.centroids, assign=self.assign, generation=generation,
+                 num_variants=self.num_variants, trained_size=self.trained_size)
+        os.replace(temp_file, index_file)
+
+    @classmethod
+    def load(cls, index_file, nprobe=8):
+        '''
+        Load a persisted index.
+
+        Returns:
+            index (IVFIndex): The index.
+            generation (int): The Encode Database generation the index was saved for.
+        '''
+        with np.load(index_file) as data:
+            index = cls(data['centroids'], data['assign'], int(data['num_variants']), nprobe, int(data['trained_size']))
+            return index, int(data['generation'])
+
+def prune_variants(person_encodes, max_distance, main_variant=3):
+    '''
+    Choose the distinct prototypes among the brightness variants of a person.
+
+    Starting from the main encoding, a variant is kept only if it is farther than 'max_distance' from
+    every prototype kept so far. Variants are visited from the farthest to the nearest to the main
+    encoding, so the extreme brightness levels are the ones that survive.
+
+    Args:
+        person_encodes (numpy.ndarray): Encodings of one person, shape (8, 128).
+        max_distance (float): Face distance under which two variants are considered redundant.
+            0 keeps every variant.
+        main_variant (int): Index of the main encoding (brightness factor 1).
+
+    Returns:
+        list: Sorted indices of the kept variants.
+    '''
+    person_encodes = np.asarray(person_encodes, dtype=np.float32)
+    if max_distance <= 0:
+        return list(range(len(person_encodes)))
+    kept = [main_variant]
+    order = np.argsort(-np.linalg.norm(person_encodes - person_encodes[main_variant], axis=1), kind='stable')
+    for v in order:
+        if v != main_variant and np.linalg.norm(person_encodes[kept] - person_encodes[v], axis=1).min() > max_distance:
+            kept.append(int(v))
+    return sorted(kept)
+
+def quantize_rows(rows, dtype='int8'):
+    '''
+    Quantize encodings for compact storage.
+
+    Args:
+        rows (numpy.ndarray): float32 encodings of shape (M, 128).
+        dtype (str): 'int8' (symmetric, one float32 scale per row) or 'float16'.
+
+    Returns:
+        codes (numpy.ndarray): Quantized rows, int8 or float16.
+        scales (numpy.ndarray): float32 scale of each int8 row, or None for float16.
+    '''
+    rows = np.asarray(rows, dtype=np.float32)
+    if dtype == 'float16':
+        return rows.astype(np.float16), None
+    if dtype != 'int8':
+        raise ValueError(f"Unknown quantization '{dtype}'")
+    scales = np.abs(rows).max(axis=1) / 127
+    scales[scales == 0] = 1
+    codes = np.clip(np.rint(rows / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+class QuantizedIndex:
+    '''
+    Compact index over pruned and quantized gallery encodings.
+
+    Only the distinct prototypes of each person (see 'prune_variants()') are kept in memory, as int8 with a
+    per-row scale or as float16. A search ranks every person with the approximate distances and re-ranks
+    the 'rerank' best candidates with their exact float32 encodings, read from the (memory-mapped) gallery,
+    so the reported distances are the same as those of the brute-force index whenever the nearest person
+    is among the candidates.
+    '''
+    def __init__(self, codes, scales, offsets, flat_encodes, num_variants=8, rerank=16, chunk_size=256):
+        '''
+        Args:
+            codes (numpy.ndarray): Quantized prototypes of all persons, shape (P, 128), grouped by person.
+            scales (numpy.ndarray): Scale of each int8 prototype (P,), or None for float16.
+            offsets (numpy.ndarray): Start of each person's prototypes in 'codes', shape (N+1,).
+            flat_encodes (numpy.ndarray): Full-precision gallery encodings of shape (N*8, 128).
+            num_variants (int): Number of encodings stored per person.
+            rerank (int): Number of candidate persons re-ranked with the exact encodings.
+            chunk_size (int): Number of persons scanned at once. Their prototypes are converted to float32 in
+                a buffer that stays in the CPU cache for the product that follows.
+        '''
+        self.codes = codes
+        self.scales = scales
+        self.offsets = np.asarray(offsets, dtype=np.int32)
+        self.flat_encodes = flat_encodes
+        self.num_variants = num_variants
+        self.rerank = rerank
+        self.chunk_size = chunk_size
+        self.code_norms = squared_norms(self._dequantize(0, len(codes)))
+
+    @classmethod
+    def build(cls, flat_encodes, num_variants=8, dtype='int8', prune_distance=0.0, rerank=16, main_variant=3):
+        '''
+        Prune and quantize the gallery.
+
+        Args:
+            flat_encodes (numpy.ndarray): Gallery encodings of shape (N*8, 128).
+            num_variants (int): Number of encodings stored per person.
+            dtype (str): 'int8' or 'float16'.
+            prune_distance (float): See 'prune_variants()'. 0 keeps every variant.
+            rerank (int): Number of candidate persons re-ranked with the exact encodings.
+            main_variant (int): Index of the main encoding.
+
+        Returns:
+            QuantizedIndex: The index.
+        '''
+        encodes = flat_encodes.reshape(-1, num_variants, flat_encodes.shape[1])
+        kept = [prune_variants(person, prune_distance, main_variant) for person in encodes]
+        offsets = np.concatenate([[0], np.cumsum([len(k) for k in kept])])
+        rows = [p * num_variants + v for p, k in enumerate(kept) for v in k]
+        rows = np.asarray(flat_encodes[rows], dtype=np.float32).reshape(-1, flat_encodes.shape[1])
+        codes, scales = quantize_rows(rows, dtype)
+        return cls(codes, scales, offsets, flat_encodes, num_variants, rerank)
+
+    def _dequantize(self, start, end):
+        chunk = self.codes[start:end].astype(np.float32)
+        if self.scales is not None:
+            chunk *= self.scales[start:end, None]
+        return chunk
+
+    def nbytes(self):
+        '''
+        Return the memory held by the index besides the gallery arrays it searches, in bytes
+        (the exact encodings are read from the gallery on demand).
+        '''
+        return (self.codes.nbytes + self.offsets.nbytes + self.code_norms.nbytes
+                + (0 if self.scales is None else self.scales.nbytes))
+
+    def approximate_distances(self, query_encodes):
+        '''
+        Compute the approximate squared distance of each face to each person (nearest prototype).
+
+        Returns:
+            numpy.ndarray: float32 array of shape (Q, N).
+        '''
+        num_persons = len(self.offsets) - 1
+        person_dis = np.empty((len(query_encodes), num_persons), np.float32)
+        buffer = np.empty((min(len(self.codes), self.chunk_size * self.num_variants), self.codes.shape[1]), np.float32)
+        for first in range(0, num_persons, self.chunk_size):
+            last = min(first + self.chunk_size, num_persons)
+            start, end = self.offsets[first], self.offsets[last]
+            rows = buffer[:end - start]
+            np.copyto(rows, self.codes[start:end], casting='unsafe')
+            dis = query_encodes @ rows.T
+            # Scaling the dot products is cheaper than dequantizing the rows
+            dis *= -2 if self.scales is None else -2 * self.scales[None, start:end]
+            dis += self.code_norms[None, start:end]
+            # Persons own contiguous runs of prototypes: take the minimum of each run
+            person_dis[:, first:last] = np.minimum.reduceat(dis, self.offsets[first:last] - start, axis=1)
+        return person_dis + squared_norms(query_encodes)[:, None]
+
+    def search(self, query_encodes, k=1):
+        '''
+        Find the k nearest persons of each face.
+
+        Args:
+            query_encodes (numpy.ndarray): Encodings of shape (Q, 128) or (128,).
+            k (int): Number of persons to return per face.
+
+        Returns:
+            top_index (numpy.ndarray): Person indices of shape (Q, k), nearest first. Missing results are -1.
+            top_dis (numpy.ndarray): Exact face distances of shape (Q, k). Missing results are inf.
+        '''
+        query_encodes = np.asarray(query_encodes, dtype=np.float32).reshape(-1, self.codes.shape[1])
+        num_persons = len(self.offsets) - 1
+        top_index = np.full((len(query_encodes), k), -1, np.intp)
+        top_dis = np.full((len(query_encodes), k), np.inf, np.float32)
+        if num_persons == 0 or len(query_encodes) == 0:
+            return top_index, top_dis
+        person_dis = self.approximate_distances(query_encodes)
+        num_candidates = min(max(self.rerank, k), num_persons)
+        candidates = np.argpartition(person_dis, num_candidates - 1, axis=1)[:, :num_candidates]
+        # Exact float32 re-rank over every stored variant of the candidates
+        encodes = self.flat_encodes.reshape(num_persons, self.num_variants, -1)
+        n = min(k, num_candidates)
+        for q, query in enumerate(query_encodes):
+            persons = np.sort(candidates[q])
+            exact = ((np.asarray(encodes[persons], dtype=np.float32) - query) ** 2).sum(axis=2).min(axis=1)
+            best = np.argsort(exact)[:n]
+            top_index[q, :n] = persons[best]
+            top_dis[q, :n] = np.sqrt(exact[best])
+        return top_index, top_dis
@@ -0,0 +1,131 @@
+import os
+from collections import namedtuple
+from threading import Lock
+import numpy as np
+from matcher import squared_norms
+from face_index import BruteForceIndex
+
+''' CLASS LIST '''
+# GalleryData
+# EncodeGallery
+
+NUM_VARIANTS = 8   # brightness levels produced by augment_data
+MAIN_VARIANT = 3   # index of the main encoding (brightness factor 1)
+ENCODE_DIM = 128   # length of a face encoding
+
+GalleryData = namedtuple('GalleryData', ['names', 'encodes', 'main_encodes', 'flat_encodes', 'flat_norms', 'index'])
+
+class EncodeGallery:
+    '''
+    Process-wide in-memory copy of the Encode Database.
+
+    The gallery loads the Encode Database once into contiguous float32 NumPy arrays and serves
+    the cached arrays on every call to 'get()'. It reloads only when the database file changes
+    on disk (different mtime or size) or when 'invalidate()' has been called.
+
+    A compact gallery serves an index that scans its own compact copy of the encodings (the quantized index):
+    the encodings are kept as the loader returns them (memory-mapped) for the exact re-rank, and the main
+    encodings and the squared norms are not built.
+
+    Attributes:
+        hits (int): Number of calls served from memory.
+        reloads (int): Number of times the database was (re)loaded from disk.
+    '''
+    def __init__(self, db_file, loader, index_builder=None, compact=False):
+        '''
+        Args:
+            db_file (str): Path of the Encode Database file to watch for changes.
+            loader (callable): Function returning (person_names_known, encodes_known, main_encodes_known).
+            index_builder (callable): Function building a face index from (flat_encodes, flat_norms).
+                Defaults to an exact BruteForceIndex.
+            compact (bool): Keep the encodings as loaded and build no other array. 'flat_norms' is then None
+                for the index builder, and 'main_encodes' and 'flat_norms' are None in the served gallery.
+        '''
+        self.db_file = db_file
+        self.loader = loader
+        self.index_builder = index_builder
+        self.compact = compact
+        self.lock = Lock()
+        self.hits = 0
+        self.reloads = 0
+        self._stale = True
+        self._signature = None
+        self._data = GalleryData([], np.empty((0, NUM_VARIANTS, ENCODE_DIM), np.float32),
+                                 np.empty((0, ENCODE_DIM), np.float32), np.empty((0, ENCODE_DIM), np.float32),
+                                 np.empty((0,), np.float32), None)
+
+    def _file_signature(self):
+        '''
+        Take the (mtime, size) pair of the database file, or None if the file does not exist.
+        '''
+        try:
+            stat = os.stat(self.db_file)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self, signature):
+        '''
+        Load the database with the loader and pack the encodings into float32 arrays.
+        '''
+        person_names_known, encodes_known, _ = self.loader()
+        if self.compact:
+            encodes = np.asarray(encodes_known, dtype=np.float32).reshape(-1, NUM_VARIANTS, ENCODE_DIM)
+            flat_encodes = encodes.reshape(-1, ENCODE_DIM)
+            self._data = GalleryData(list(person_names_known), encodes, None, flat_encodes, None,
+                                     self.index_builder(flat_encodes, None))
+        else:
+            encodes = np.asarray(encodes_known, dtype=np.float32).reshape(-1, NUM_VARIANTS, ENCODE_DIM)
+            encodes = np.ascontiguousarray(encodes)
+            main_encodes = np.ascontiguousarray(encodes[:, MAIN_VARIANT])
+            flat_encodes = encodes.reshape(-1, ENCODE_DIM)
+            flat_norms = squared_norms(flat_encodes)
+            if self.index_builder is None:
+                index = BruteForceIndex(flat_encodes, flat_norms, NUM_VARIANTS)
+            else:
+                index = self.index_builder(flat_encodes, flat_norms)
+            self._data = GalleryData(list(person_names_known), encodes, main_encodes, flat_encodes, flat_norms, index)
+        self._signature = signature
+        self._stale = False
+        self.reloads += 1
+
+    def invalidate(self):
+        '''
+        Force the next call to 'get()' to reload the database from disk.
+        '''
+        with self.lock:
+            self._stale = True
+
+    def get(self):
+        '''
+        Return the cached gallery, reloading it first if the database file has changed.
+
+        Returns:
+            GalleryData: names (list), encodes (N, 8, 128), main_encodes (N, 128), flat_encodes (N*8, 128)
+            and their squared norms flat_norms (N*8,) as float32 arrays (main_encodes and flat_norms are None
+            for a compact gallery), and the face index searching them.
+        '''
+        with self.lock:
+            signature = self._file_signature()
+            if self._stale or signature != self._signature:
+                try:
+                    self._load(signature)
+                except (OSError, ValueError):
+                    # The database is being rewritten: serve the previous copy and retry on the next call
+                    if self.reloads == 0:
+                        raise
+            else:
+                self.hits += 1
+            return self._data
+
+    def stats(self):
+        '''
+        Return the cache counters, the number of enrolled persons and the bytes held by the gallery arrays
+        (memory-mapped ones included) and its index.
+        '''
+        with self.lock:
+            data = self._data
+            # 'flat_encodes' is a view of 'encodes'
+            arrays = [array for array in (data.encodes, data.main_encodes, data.flat_norms) if array is not None]
+            nbytes = sum(array.nbytes for array in arrays) + (data.index.nbytes() if data.index is not None else 0)
+            return {'hits': self.hits, 'reloads': self.reloads, 'size': len(data.names), 'nbytes': nbytes}
@@ -0,0 +1,208 @@
+import logging
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from queue import Empty
+import numpy as np
+from metrics import metrics
+from config import INFERENCE_MAX_ERRORS
+
+''' CLASS LIST '''
+# ProcessPoolBackend
+
+''' FUNCTION LIST '''
+# _worker_main
+
+logger = logging.getLogger('inference_pool')
+
+def _worker_main(task_queue, result_queue):
+    '''
+    Recognition worker: loads the Encode Database once, then recognizes the frames it is given until it
+    receives None. The result of each frame is the (faces, fresh) pair of 'recognize_faces()'.
+    Each task names the shared buffer holding the frame (attached on first use) and the video source of the frame:
+    every source gets its own preprocessor and encoding cache, so a face is never matched against a cached face
+    seen at the same place by another camera.
+    '''
+    from utils import encode_gallery, recognize_faces
+    from preprocess import FramePreprocessor
+    from encode_cache import EncodingCache
+    from config import ENCODE_CACHE_ENABLED
+    preprocessors, caches = {}, {}  # source index -> its FramePreprocessor, EncodingCache
+    blocks, frames = {}, {}         # shared buffer name -> attached block, frame view
+    encode_gallery.get()
+    try:
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+            seq, slot, shm_name, frame_shape, source = task
+            if source not in preprocessors:
+                preprocessors[source] = FramePreprocessor()
+                caches[source] = EncodingCache() if ENCODE_CACHE_ENABLED else None
+            try:
+                if shm_name not in blocks:
+                    blocks[shm_name] = shared_memory.SharedMemory(name=shm_name)
+                    frames[shm_name] = np.ndarray(frame_shape, np.uint8, buffer=blocks[shm_name].buf)
+                result = recognize_faces(frames[shm_name], preprocessor=preprocessors[source], cache=caches[source],
+                                         source=source)
+                # The gauges set while recognizing it (detect scale, cache hit rate, ...), published by the app
+                result_queue.put((seq, slot, result, dict(metrics.gauges), None))
+            except Exception as e:
+                # Reported to the app by 'collect()' instead of silently killing the worker
+                result_queue.put((seq, slot, None, {}, f"{type(e).__name__}: {e}"))
+    finally:
+        frames.clear()
+        for block in blocks.values():
+            block.close()
+
+class ProcessPoolBackend:
+    '''
+    Multiprocessing backend for face recognition.
+
+    Frames are copied into shared-memory buffers and only (sequence number, buffer) references are sent
+    to the worker processes, so frames are never pickled. Buffers are allocated per frame shape, so sources of
+    different resolutions share the pool; at most 'num_slots' frames are in flight in total. Each worker returns
+    the faces it found; the annotated frames are produced in the calling process and handed out in submission order.
+    The metric gauges a worker sets while recognizing a frame are sent with the result and set in the calling process.
+    A frame a worker failed to recognize is logged and dropped; the pool only stops after 'max_errors' failed frames
+    in a row or when a worker exits.
+    '''
+    def __init__(self, num_workers, slots_per_worker=2, max_errors=INFERENCE_MAX_ERRORS):
+        '''
+        Args:
+            num_workers (int): Number of worker processes.
+            slots_per_worker (int): Number of frames in flight per worker.
+            max_errors (int): Number of consecutive failed frames after which 'collect()' raises.
+        '''
+        self.num_workers = num_workers
+        self.num_slots = num_workers * slots_per_worker
+        self.max_errors = max_errors
+        self.errors = 0     # consecutive failed frames
+        self.dropped = 0    # frames dropped because recognition failed
+        self.ctx = mp.get_context('spawn')
+        self.blocks = []
+        self.frames = []
+        self.workers = []
+        self.free_slots = {}    # frame shape -> free buffer slots of that shape
+        self.in_flight = 0
+        self.tags = {}      # seq -> tag given to 'submit()'
+        self.pending = {}   # seq -> (slot, faces) received but not handed out yet, faces None if recognition failed
+        self.next_seq = 0   # sequence number of the next submitted frame
+        self.next_out = 0   # sequence number of the next frame to hand out
+
+    def _start(self):
+        self.task_queue = self.ctx.Queue()
+        self.result_queue = self.ctx.Queue()
+        self.workers = [self.ctx.Process(target=_worker_main, daemon=True, args=(self.task_queue, self.result_queue))
+                        for _ in range(self.num_workers)]
+        for worker in self.workers:
+            worker.start()
+
+    def _take_slot(self, frame_shape):
+        '''
+        Return a free buffer slot for a frame shape, allocating a new buffer if none is free.
+        '''
+        free = self.free_slots.setdefault(frame_shape, [])
+        if len(free) != 0:
+            return free.pop()
+        block = shared_memory.SharedMemory(create=True, size=int(np.prod(frame_shape)))
+        self.blocks.append(block)
+        self.frames.append(np.ndarray(frame_shape, np.uint8, buffer=block.buf))
+        return len(self.blocks) - 1
+
+    def has_free_slot(self):
+        return self.in_flight < self.num_slots
+
+    def submit(self, img, tag=None, source=0):
+        '''
+        Copy a frame into a free shared buffer and queue it for recognition.
+
+        Args:
+            img (numpy.ndarray): The frame in BGR format.
+            tag (object): Value handed back with the result (e.g. the capture time).
+            source (int): Index of the video source of the frame; the workers keep a preprocessor and an
+                encoding cache per source.
+
+        Returns:
+            bool: False if all buffers are in flight and the frame was not submitted.
+        '''
+        if len(self.workers) == 0:
+            self._start()
+        if self.in_flight >= self.num_slots:
+            return False
+        slot = self._take_slot(img.shape)
+        np.copyto(self.frames[slot], img)
+        self.in_flight += 1
+        self.tags[self.next_seq] = tag
+        self.task_queue.put((self.next_seq, slot, self.blocks[slot].name, img.shape, source))
+        self.next_seq += 1
+        return True
+
+    def collect(self, process_result, timeout=0.01):
+        '''
+        Receive finished frames and hand them out in submission order.
+
+        Args:
+            process_result (callable): Function taking (frame, recognition result, tag) and returning the output for that frame,
+                called while the frame is still in its shared buffer.
+            timeout (float): Seconds to wait for the first result.
+
+        Returns:
+            list: (tag, output) pairs in sequence order. Frames whose recognition failed are left out.
+
+        Raises:
+            RuntimeError: If 'max_errors' frames in a row failed or a worker exited.
+        '''
+        if len(self.workers) == 0:
+            # No frame submitted yet: the workers are not started
+            return []
+        try:
+            seq, slot, faces, gauges, error = self.result_queue.get(timeout=timeout)
+            while True:
+                if error is not None:
+                    # Drop this frame only: a bad frame must not stop the live video
+                    self.errors += 1
+                    self.dropped += 1
+                    logger.warning('frame %d dropped: %s', seq, error)
+                    if self.errors >= self.max_errors:
+                        raise RuntimeError(f"{self.errors} frames in a row failed, last: {error}")
+                else:
+                    self.errors = 0
+                self.pending[seq] = (slot, faces)
+                for name, value in gauges.items():
+                    metrics.set_gauge(name, value)
+                seq, slot, faces, gauges, error = self.result_queue.get_nowait()
+        except Empty:
+            pass
+        if not all(worker.is_alive() for worker in self.workers):
+            raise RuntimeError("a recognition worker exited")
+        outputs = []
+        while self.next_out in self.pending:
+            slot, faces = self.pending.pop(self.next_out)
+            tag = self.tags.pop(self.next_out)
+            frame = self.frames[slot]
+            if faces is not None:
+                outputs.append((tag, process_result(frame, faces, tag)))
+            self.free_slots[frame.shape].append(slot)
+            self.in_flight -= 1
+            self.next_out += 1
+        return outputs
+
+    def close(self):
+        '''
+        Stop the workers and free the shared buffers.
+        '''
+        for _ in self.workers:
+            self.task_queue.put(None)
+        for worker in self.workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        self.frames = []
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+        self.workers = []
+        self.free_slots = {}
+        self.in_flight = 0
+        self.errors = 0
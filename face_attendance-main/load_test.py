@@ -0,0 +1,120 @@
+import os
+import json
+import time
+import base64
+import asyncio
+import argparse
+from urllib.parse import urlparse
+import cv2
+import numpy as np
+from ws_protocol import read_ws_message, ws_frame
+
+''' FUNCTION LIST '''
+# load_frames
+# http_client
+# ws_client
+# run
+# main
+
+# Load-test client of the recognition service: several concurrent clients send JPEG frames over keep-alive
+# HTTP connections (or WebSockets) and the throughput and latency percentiles are reported.
+# Usage: python load_test.py --url http://127.0.0.1:8080 --clients 8 --requests 50 [--ws]
+
+def load_frames(image_path, size=(1280, 720), quality=85):
+    '''
+    Encode the Image Database samples as camera-sized JPEG frames.
+    '''
+    frames = []
+    for img in sorted(os.listdir(image_path)):
+        image = cv2.imread(os.path.join(image_path, img))
+        if image is not None:
+            frames.append(cv2.imencode('.jpg', cv2.resize(image, size), [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes())
+    if len(frames) == 0:
+        raise ValueError(f"No image in {image_path}")
+    return frames
+
+async def http_client(host, port, frames, num_requests, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for i in range(num_requests):
+            body = frames[i % len(frames)]
+            start = time.perf_counter()
+            writer.write(f"POST /recognize HTTP/1.1\r\nHost: {host}\r\nContent-Type: image/jpeg\r\n"
+                         f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                key, value = line.decode('latin-1').split(':', 1)
+                if key.lower() == 'content-length':
+                    length = int(value)
+            await reader.readexactly(length)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+async def ws_client(host, port, frames, num_requests, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    key = base64.b64encode(os.urandom(16)).decode()
+    writer.write((f"GET /ws HTTP/1.1\r\nHost: {host}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                  f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n").encode())
+    await writer.drain()
+    if b'101' not in await reader.readline():
+        raise ConnectionError("WebSocket upgrade refused")
+    while (await reader.readline()) not in (b'\r\n', b''):
+        pass
+    try:
+        for i in range(num_requests):
+            start = time.perf_counter()
+            writer.write(ws_frame(2, frames[i % len(frames)], mask=True))
+            await writer.drain()
+            _, payload = await read_ws_message(reader)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if 'error' in json.loads(payload):
+                errors.append(payload)
+        writer.write(ws_frame(8, b'', mask=True))
+        await writer.drain()
+    finally:
+        writer.close()
+
+async def run(url, frames, clients, num_requests, use_ws):
+    '''
+    Run the clients concurrently.
+
+    Returns:
+        dict: Requests per second, latency percentiles in milliseconds and the number of errors.
+    '''
+    target = urlparse(url)
+    client = ws_client if use_ws else http_client
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(target.hostname, target.port or 80, frames, num_requests, latencies, errors)
+                           for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    latencies = np.array(latencies)
+    return {'requests': len(latencies), 'errors': len(errors), 'requests_per_s': len(latencies) / elapsed,
+            'p50_ms': float(np.percentile(latencies, 50)), 'p95_ms': float(np.percentile(latencies, 95)),
+            'p99_ms': float(np.percentile(latencies, 99))}
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the recognition service.")
+    parser.add_argument('--url', default='http://127.0.0.1:8080')
+    parser.add_argument('--images', default='img_db', help="folder of the frames to send")
+    parser.add_argument('--clients', type=int, default=8, help="concurrent connections")
+    parser.add_argument('--requests', type=int, default=50, help="requests per connection")
+    parser.add_argument('--ws', action='store_true', help="send the frames over WebSockets instead of HTTP")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.url, load_frames(args.images), args.clients, args.requests, args.ws))
+    print(f"{result['requests']} requests ({result['errors']} errors) over {args.clients} "
+          f"{'WebSocket' if args.ws else 'HTTP'} connections")
+    print(f"{result['requests_per_s']:.1f} req/s, latency p50 {result['p50_ms']:.1f} ms, "
+          f"p95 {result['p95_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -1,23 +1,57 @@
+from startup import startup_timer, BackgroundTask
+import logging
 from tkinter import *
 from PIL import ImageTk, Image
-from app import app
+from multiprocessing import freeze_support
+from config import LOG_FILE
+
+def warm_up():
+    '''
+    Load the heavy modules (OpenCV, NumPy, dlib and its models), the Encode Database and the face detector
+    while the intro window is shown
+    '''
+    with startup_timer.stage('import app'):
+        import app
+    from utils import encode_gallery, face_detector
+    import numpy as np
+    try:
+        with startup_timer.stage('load gallery'):
+            encode_gallery.get()
+        with startup_timer.stage('warm up detector'):
+            face_detector.detect(np.zeros((180, 320, 3), np.uint8))
+    except Exception:
+        # Not fatal here: the same error is handled where the app uses them
+        logging.getLogger('startup').exception('warm-up failed')
 
 def change_window():
     '''
-    Go to the application's workspace
+    Go to the application's workspace once the warm-up has finished
     '''
+    if not warm_up_task.done():
+        btn_change_window.configure(text="...", state=DISABLED)
+        root.after(50, change_window)
+        return
+    warm_up_task.result()
     root.destroy()
+    from app import app
     app()
 
-root = Tk()
-root.geometry('1280x640')
-root.title("Final Term Project")
+if __name__ == '__main__':
+    # Needed by the recognition worker processes when the app is frozen into an executable
+    freeze_support()
+    logging.basicConfig(filename=LOG_FILE, level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+    warm_up_task = BackgroundTask(warm_up)
+
+    root = Tk()
+    root.geometry('1280x640')
+    root.title("Final Term Project")
 
-img = ImageTk.PhotoImage(Image.open("img_gui/introduce.jpg"))
-background = Label(root, image=img)
-background.grid(column=0, row=0)
+    img = ImageTk.PhotoImage(Image.open("img_gui/introduce.jpg"))
+    background = Label(root, image=img)
+    background.grid(column=0, row=0)
 
-btn_change_window = Button(root, text="START", borderwidth=10, font=("Arial", 20), bg='green', fg='white', command=change_window)
-btn_change_window.place(width=120, height=50, x=975, y=560)
+    btn_change_window = Button(root, text="START", borderwidth=10, font=("Arial", 20), bg='green', fg='white', command=change_window)
+    btn_change_window.place(width=120, height=50, x=975, y=560)
 
-root.mainloop()
+    root.after_idle(startup_timer.mark, 'intro window')
+    root.mainloop()
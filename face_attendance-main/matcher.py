@@ -0,0 +1,63 @@
+import numpy as np
+
+''' FUNCTION LIST '''
+# squared_norms
+# match_faces
+
+def squared_norms(encodes):
+    '''
+    Compute the squared L2 norm of every row of an encoding matrix.
+
+    Args:
+        encodes (numpy.ndarray): Encodings of shape (M, 128).
+
+    Returns:
+        numpy.ndarray: float32 array of shape (M,).
+    '''
+    encodes = np.asarray(encodes, dtype=np.float32)
+    return np.einsum('ij,ij->i', encodes, encodes)
+
+def match_faces(query_encodes, flat_encodes, flat_norms, num_variants=8, k=1):
+    '''
+    Match face encodings against every brightness variant of every person in one batched pass.
+
+    Squared distances are computed as ||a||^2 + ||b||^2 - 2 a.b over the flattened (N*8, 128)
+    gallery, reduced to the minimum over each person's variants and then ranked.
+
+    Args:
+        query_encodes (numpy.ndarray): Encodings of the faces to identify, shape (Q, 128) or (128,).
+        flat_encodes (numpy.ndarray): Gallery encodings of shape (N*8, 128), grouped by person.
+        flat_norms (numpy.ndarray): Squared norms of 'flat_encodes', shape (N*8,).
+        num_variants (int): Number of encodings stored per person.
+        k (int): Number of identities to return per face.
+
+    Returns:
+        top_index (numpy.ndarray): Person indices of shape (Q, k), nearest first.
+        top_dis (numpy.ndarray): Per-person minimum face distances of shape (Q, k).
+    '''
+    query_encodes = np.asarray(query_encodes, dtype=np.float32).reshape(-1, flat_encodes.shape[1])
+    num_persons = flat_encodes.shape[0] // num_variants
+    k = min(k, num_persons)
+    if k == 0:
+        return np.empty((len(query_encodes), 0), np.intp), np.empty((len(query_encodes), 0), np.float32)
+
+    # Squared distances between every face and every stored encoding
+    dis = query_encodes @ flat_encodes.T
+    dis *= -2
+    dis += squared_norms(query_encodes)[:, None]
+    dis += flat_norms[None, :]
+
+    # Keep the nearest brightness variant of each person
+    dis = dis.reshape(len(query_encodes), num_persons, num_variants).min(axis=2)
+    np.maximum(dis, 0, out=dis)
+
+    # Rank the k nearest persons
+    if k < num_persons:
+        top_index = np.argpartition(dis, k - 1, axis=1)[:, :k]
+    else:
+        top_index = np.broadcast_to(np.arange(num_persons), dis.shape).copy()
+    top_dis = np.take_along_axis(dis, top_index, axis=1)
+    order = np.argsort(top_dis, axis=1)
+    top_index = np.take_along_axis(top_index, order, axis=1)
+    top_dis = np.sqrt(np.take_along_axis(top_dis, order, axis=1))
+    return top_index, top_dis
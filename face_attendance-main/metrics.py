@@ -0,0 +1,198 @@
+import json
+import time
+import bisect
+from collections import deque
+from contextlib import nullcontext
+from threading import Lock, Thread, Event
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import METRICS_ENABLED
+
+''' CLASS LIST '''
+# Histogram
+# Metrics
+# MetricsLogger
+
+''' FUNCTION LIST '''
+# start_metrics_server
+
+# Upper bounds of the latency buckets, in milliseconds
+BUCKETS_MS = (0.5, 1, 2, 3, 5, 7.5, 10, 15, 20, 30, 50, 75, 100, 150, 200, 300, 500, 1000, 2000, float('inf'))
+
+class Histogram:
+    '''
+    Fixed-bucket latency histogram: O(1) to record, percentiles interpolated inside the buckets.
+    '''
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.sum += ms
+
+    def percentile(self, q):
+        '''
+        Estimate the q-th percentile (0-100) in milliseconds.
+        '''
+        if self.count == 0:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count != 0 and seen + count >= rank:
+                lower = BUCKETS_MS[i - 1] if i > 0 else 0.0
+                upper = BUCKETS_MS[i] if BUCKETS_MS[i] != float('inf') else lower * 2
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return BUCKETS_MS[-2]
+
+class Metrics:
+    '''
+    Per-stage timing histograms, frame rate and gauges of the recognition loop.
+
+    When disabled, 'timer()' returns a shared no-op context manager and the other methods return at once,
+    so the instrumentation costs almost nothing.
+    '''
+    def __init__(self, enabled=METRICS_ENABLED):
+        self.enabled = enabled
+        self.lock = Lock()
+        self.histograms = {}
+        self.gauges = {}
+        self.frame_times = deque(maxlen=120)
+        self._null_timer = nullcontext()
+
+    def observe(self, stage, ms):
+        if not self.enabled:
+            return
+        with self.lock:
+            if stage not in self.histograms:
+                self.histograms[stage] = Histogram()
+            self.histograms[stage].observe(ms)
+
+    def timer(self, stage):
+        '''
+        Context manager recording the duration of a stage.
+        '''
+        if not self.enabled:
+            return self._null_timer
+        return _StageTimer(self, stage)
+
+    def count_frame(self):
+        if self.enabled:
+            self.frame_times.append(time.perf_counter())
+
+    def set_gauge(self, name, value):
+        if self.enabled:
+            self.gauges[name] = value
+
+    def fps(self):
+        frame_times = list(self.frame_times)
+        if len(frame_times) < 2 or frame_times[-1] == frame_times[0]:
+            return 0.0
+        return (len(frame_times) - 1) / (frame_times[-1] - frame_times[0])
+
+    def snapshot(self):
+        '''
+        Return the current metrics as a JSON-serializable dict.
+        '''
+        with self.lock:
+            stages = {stage: {'count': h.count, 'mean_ms': round(h.sum / h.count, 3) if h.count else 0,
+                              'p50_ms': round(h.percentile(50), 3), 'p95_ms': round(h.percentile(95), 3),
+                              'p99_ms': round(h.percentile(99), 3)}
+                      for stage, h in self.histograms.items()}
+        return {'time': time.time(), 'fps': round(self.fps(), 2), 'gauges': dict(self.gauges), 'stages': stages}
+
+    def overlay_text(self):
+        '''
+        Return a short multi-line summary for the on-screen overlay.
+        '''
+        snapshot = self.snapshot()
+        lines = [f"FPS {snapshot['fps']:.1f}"]
+        lines += [f"{name} {value}" for name, value in snapshot['gauges'].items()]
+        lines += [f"{stage} p50 {s['p50_ms']:.1f} / p95 {s['p95_ms']:.1f} ms" for stage, s in snapshot['stages'].items()]
+        return '\n'.join(lines)
+
+    def prometheus_text(self):
+        '''
+        Return the metrics in the Prometheus text exposition format.
+        '''
+        lines = ['# TYPE face_attendance_fps gauge', f'face_attendance_fps {self.fps():.3f}']
+        for name, value in dict(self.gauges).items():
+            lines += [f'# TYPE face_attendance_{name} gauge', f'face_attendance_{name} {value}']
+        lines.append('# TYPE face_attendance_stage_seconds histogram')
+        with self.lock:
+            for stage, h in self.histograms.items():
+                cumulative = 0
+                for bound, count in zip(BUCKETS_MS, h.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else f'{bound / 1000:g}'
+                    lines.append(f'face_attendance_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'face_attendance_stage_seconds_sum{{stage="{stage}"}} {h.sum / 1000:.6f}')
+                lines.append(f'face_attendance_stage_seconds_count{{stage="{stage}"}} {h.count}')
+        return '\n'.join(lines) + '\n'
+
+class _StageTimer:
+    __slots__ = ('metrics', 'stage', 'start')
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, (time.perf_counter() - self.start) * 1000)
+
+class MetricsLogger:
+    '''
+    Background thread appending a metrics snapshot to a JSON-lines file every 'interval' seconds.
+    '''
+    def __init__(self, metrics, log_file, interval):
+        self.metrics = metrics
+        self.log_file = log_file
+        self.interval = interval
+        self.stop_event = Event()
+        self.thread = Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            with open(self.log_file, 'a') as f:
+                f.write(json.dumps(self.metrics.snapshot()) + '\n')
+
+def start_metrics_server(metrics, port):
+    '''
+    Serve '/metrics' in Prometheus text format on 127.0.0.1 (local access only) from a background thread.
+
+    Returns:
+        ThreadingHTTPServer: The server; call 'shutdown()' to stop it.
+    '''
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != '/metrics':
+                self.send_error(404)
+                return
+            body = metrics.prometheus_text().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), MetricsHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# Process-wide metrics of the recognition loop
+metrics = Metrics()
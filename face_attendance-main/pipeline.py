@@ -0,0 +1,288 @@
+import time
+from collections import deque
+from threading import Thread, Event, Condition
+import cv2
+from metrics import metrics
+from config import CAMERA_RESOLUTION
+
+''' CLASS LIST '''
+# FrameSlot
+# VideoSource
+# VideoPipeline
+
+''' FUNCTION LIST '''
+# parse_source
+# open_video_source
+
+class FrameSlot:
+    '''
+    Bounded hand-off buffer between two pipeline stages that only keeps the newest item.
+
+    Putting an item replaces the previous one; if the previous one was never taken it is counted as dropped.
+    '''
+    def __init__(self):
+        self.cond = Condition()
+        self.item = None
+        self.seq = 0        # sequence number of the newest item
+        self.taken_seq = 0  # sequence number of the last item taken
+        self.dropped = 0
+
+    def put(self, item):
+        with self.cond:
+            if self.seq > self.taken_seq:
+                self.dropped += 1
+            self.item = item
+            self.seq += 1
+            self.cond.notify_all()
+
+    def get(self, last_seq, timeout=None):
+        '''
+        Take the newest item if it is newer than 'last_seq', waiting up to 'timeout' seconds for one.
+
+        Returns:
+            tuple: (sequence number, item), or (last_seq, None) if no newer item arrived.
+        '''
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.seq > last_seq, timeout):
+                return last_seq, None
+            self.taken_seq = self.seq
+            return self.seq, self.item
+
+    def depth(self):
+        '''
+        Return the number of items waiting to be taken (0 or 1).
+        '''
+        with self.cond:
+            return int(self.seq > self.taken_seq)
+
+def parse_source(source):
+    '''
+    Turn a source given as text (command line, settings) into what cv2.VideoCapture expects:
+    a device index for digits, otherwise the video file path or stream URL unchanged.
+    '''
+    if isinstance(source, str) and source.isdigit():
+        return int(source)
+    return source
+
+def open_video_source(source):
+    '''
+    Open a capture source: a camera index, a video file or a stream URL (e.g. rtsp:// or an http:// MJPEG stream).
+
+    Returns:
+        cv2.VideoCapture: The capture. It may not be opened; reading it then fails and the source reports an error.
+    '''
+    source = parse_source(source)
+    cap = cv2.VideoCapture(source)
+    if isinstance(source, int):
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, CAMERA_RESOLUTION[0])
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CAMERA_RESOLUTION[1])
+    return cap
+
+class VideoSource:
+    '''
+    One capture source of the pipeline with its hand-off buffers and counters.
+
+    Video files are read at their own frame rate, as a camera would deliver them, rather than as fast as they decode.
+    '''
+    def __init__(self, index, cap, name=None):
+        self.index = index
+        self.cap = cap
+        self.name = name if name is not None else f"camera {index}"
+        self.frames = FrameSlot()   # capture -> inference
+        self.results = FrameSlot()  # inference -> render
+        self.error = None
+        self.captured = 0
+        self.processed = 0
+        self.rendered = 0
+        self.processed_seq = 0      # sequence number of the last frame taken by the inference stage
+        self.rendered_seq = 0       # sequence number of the last result taken by the render
+        self.latency_ms = deque(maxlen=100)   # capture-to-render latency of the last rendered frames
+        self.render_times = deque(maxlen=60)  # times of the last rendered frames, for the FPS
+        is_file = cap.get(cv2.CAP_PROP_FRAME_COUNT) > 0
+        fps = cap.get(cv2.CAP_PROP_FPS) if is_file else 0
+        self.frame_interval = 1 / fps if fps > 0 else 0
+
+    def fps(self):
+        render_times = list(self.render_times)
+        if len(render_times) < 2 or render_times[-1] == render_times[0]:
+            return 0.0
+        return (len(render_times) - 1) / (render_times[-1] - render_times[0])
+
+    def stats(self):
+        '''
+        Return the per-stage counters, queue depths, dropped frames, FPS and the mean end-to-end latency.
+        '''
+        latency = sum(self.latency_ms) / len(self.latency_ms) if self.latency_ms else 0
+        return {'name': self.name, 'fps': round(self.fps(), 1), 'error': self.error,
+                'capture': {'frames': self.captured, 'queue_depth': self.frames.depth(), 'dropped': self.frames.dropped},
+                'inference': {'frames': self.processed, 'queue_depth': self.results.depth(), 'dropped': self.results.dropped},
+                'render': {'frames': self.rendered, 'latency_ms': round(latency, 1)}}
+
+class VideoPipeline:
+    '''
+    Decoupled capture / inference / render pipeline for one or several video sources.
+
+    Every source has a capture thread that keeps reading it so frames never back up in the driver buffer.
+    A single inference stage, shared by all sources, always processes the newest captured frame of a source
+    (stale ones are dropped) and serves the sources in turn, so a busy source cannot starve the others.
+    The Tk render only converts a frame when 'poll_result()' returns a new annotated one.
+    '''
+    def __init__(self, caps, process, backend=None, annotate=None, names=None, source_stats=None):
+        '''
+        Args:
+            caps (list): The opened captures (cv2.VideoCapture). A single capture is also accepted.
+            process (callable): Function taking (source index, BGR frame) and returning the output of the frame,
+                e.g. (names, annotated frame, fresh names) as 'cur_img_process()' does.
+            backend (ProcessPoolBackend): Optional process pool that recognizes frames instead of 'process'.
+            annotate (callable): With a backend, function taking (source index, frame, recognition result of the
+                worker) and returning the output of the frame, like 'process'.
+            names (list): Optional display names of the sources.
+            source_stats (callable): Optional function taking a source index and returning a dict of counters
+                of its processing (e.g. tracked frames), published with the other per-source gauges.
+        '''
+        if not isinstance(caps, (list, tuple)):
+            caps = [caps]
+        self.sources = [VideoSource(i, cap, names[i] if names else None) for i, cap in enumerate(caps)]
+        self.process = process
+        self.backend = backend
+        self.annotate = annotate
+        self.source_stats = source_stats
+        self.stop_event = Event()
+        self.new_frame = Event()  # set by the capture threads to wake the inference stage up
+        self.next_source = 0      # source served first in the next scheduling round
+        self.error = None
+        self.threads = [Thread(target=self._capture_loop, args=(source,), daemon=True) for source in self.sources]
+        self.threads.append(Thread(target=self._inference_loop, daemon=True))
+
+    def start(self):
+        for source in self.sources:
+            source.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        '''
+        Stop all threads and release the captures.
+        '''
+        self.stop_event.set()
+        for thread in self.threads:
+            if thread.is_alive():
+                thread.join()
+        for source in self.sources:
+            source.cap.release()
+
+    def _capture_loop(self, source):
+        next_time = time.perf_counter()
+        while not self.stop_event.is_set():
+            with metrics.timer('capture'):
+                success, img = source.cap.read()
+            if img is None:
+                source.error = f"Not found {source.name}!" if source.captured == 0 else f"{source.name} stopped."
+                if all(s.error is not None for s in self.sources):
+                    self.error = "Not found camera in this device!" if len(self.sources) == 1 else "No video source is available!"
+                break
+            if success:
+                source.frames.put((time.perf_counter(), img))
+                source.captured += 1
+                self.new_frame.set()
+            if source.frame_interval:
+                # Video file: wait for the time of the next frame
+                next_time += source.frame_interval
+                self.stop_event.wait(max(0, next_time - time.perf_counter()))
+
+    def _next_frame(self, timeout):
+        '''
+        Take the newest frame of the next source that has one, in round-robin order.
+
+        Returns:
+            tuple: (source, capture time, frame), or None if no source had a new frame within 'timeout' seconds.
+        '''
+        for attempt in range(2):
+            for offset in range(len(self.sources)):
+                source = self.sources[(self.next_source + offset) % len(self.sources)]
+                seq, item = source.frames.get(source.processed_seq, timeout=0)
+                if item is not None:
+                    source.processed_seq = seq
+                    self.next_source = (source.index + 1) % len(self.sources)
+                    return (source,) + item
+            if attempt == 0:
+                self.new_frame.wait(timeout)
+                self.new_frame.clear()
+        return None
+
+    def _inference_loop(self):
+        if self.backend is not None:
+            self._pool_loop()
+            return
+        try:
+            while not self.stop_event.is_set():
+                item = self._next_frame(timeout=0.1)
+                if item is None:
+                    continue
+                source, capture_time, img = item
+                source.results.put((capture_time, self.process(source.index, img)))
+                source.processed += 1
+        except Exception as e:
+            # Shown by the app instead of freezing the video, as with the process pool
+            self.error = f"Recognition stopped: {e}"
+
+    def _pool_loop(self):
+        # Keep every worker busy with the newest frames of the sources in turn and publish the results in frame order
+        annotate = lambda img, faces, tag: self.annotate(tag[0], img, faces)
+        try:
+            while not self.stop_event.is_set():
+                if self.backend.has_free_slot():
+                    item = self._next_frame(timeout=0.005)
+                    if item is not None:
+                        source, capture_time, img = item
+                        self.backend.submit(img, (source.index, capture_time), source.index)
+                for (index, capture_time), output in self.backend.collect(annotate, timeout=0.005):
+                    source = self.sources[index]
+                    source.results.put((capture_time, output))
+                    source.processed += 1
+        except Exception as e:
+            # Shown by the app instead of freezing the video
+            self.error = f"Recognition stopped: {e}"
+        finally:
+            self.backend.close()
+
+    def poll_result(self, index=0):
+        '''
+        Return the output of the newest processed frame of a source if it has not been rendered yet. Never blocks.
+
+        Returns:
+            tuple: The output of 'process' or 'annotate' for the frame, or None if there is no new frame.
+        '''
+        source = self.sources[index]
+        source.rendered_seq, item = source.results.get(source.rendered_seq, timeout=0)
+        if item is None:
+            return None
+        capture_time, output = item
+        now = time.perf_counter()
+        latency_ms = (now - capture_time) * 1000
+        source.latency_ms.append(latency_ms)
+        source.render_times.append(now)
+        source.rendered += 1
+        if metrics.enabled:
+            metrics.observe('end_to_end', latency_ms)
+            metrics.count_frame()
+            metrics.set_gauge(f'source{index}_fps', round(source.fps(), 2))
+            metrics.set_gauge(f'source{index}_capture_queue_depth', source.frames.depth())
+            metrics.set_gauge(f'source{index}_render_queue_depth', source.results.depth())
+            metrics.set_gauge(f'source{index}_dropped_frames', source.frames.dropped + source.results.dropped)
+            if self.source_stats is not None:
+                for key, value in self.source_stats(index).items():
+                    metrics.set_gauge(f'source{index}_{key}', value)
+        return output
+
+    @property
+    def rendered(self):
+        return sum(source.rendered for source in self.sources)
+
+    def stats(self):
+        '''
+        Return the stats of every source (see 'VideoSource.stats()'), with the counters of 'source_stats'.
+        '''
+        if self.source_stats is None:
+            return [source.stats() for source in self.sources]
+        return [dict(source.stats(), processing=self.source_stats(source.index)) for source in self.sources]
@@ -0,0 +1,95 @@
+import cv2
+import numpy as np
+
+''' CLASS LIST '''
+# FramePreprocessor
+
+class FramePreprocessor:
+    '''
+    Per-stream preprocessing of the live video that reuses its buffers from frame to frame.
+
+    'detect_input()' produces the small, RGB, denoised image given to the face detector, and 'display_frame()'
+    produces the RGB frame shown in the UI with the faces drawn on it. Both write into preallocated arrays
+    ('dst=' of the OpenCV calls) that are only reallocated when the camera resolution changes.
+    The display frame handed to the UI is the one exception: it gets a new array every time, so the UI
+    owns it and it can never be overwritten while it is being rendered.
+    '''
+    def __init__(self, detect_scale=0.25, display_scale=(1/2, 2/3)):
+        '''
+        Args:
+            detect_scale (float): Downscale factor of the image given to the detector.
+            display_scale (tuple): (x, y) scale factors of the displayed frame.
+        '''
+        self.detect_scale = detect_scale
+        self.display_scale = display_scale
+        self.frame_shape = None
+
+    def _allocate(self, frame_shape):
+        height, width = frame_shape[:2]
+        self.frame_shape = frame_shape
+        self.detect_size = (int(width * self.detect_scale), int(height * self.detect_scale))
+        self.display_size = (int(width * self.display_scale[0]), int(height * self.display_scale[1]))
+        self.small = np.empty((self.detect_size[1], self.detect_size[0], 3), np.uint8)
+        self.small_rgb = np.empty_like(self.small)
+        self.detect_img = np.empty_like(self.small)
+        self.display = np.empty((self.display_size[1], self.display_size[0], 3), np.uint8)
+
+    def detect_input(self, img):
+        '''
+        Downscale, convert to RGB and denoise a BGR frame for the face detector.
+
+        Returns:
+            numpy.ndarray: The prepared image. It is overwritten by the next call.
+        '''
+        if img.shape != self.frame_shape:
+            self._allocate(img.shape)
+        cv2.resize(img, self.detect_size, dst=self.small)                # resize the image for faster processing
+        cv2.cvtColor(self.small, cv2.COLOR_BGR2RGB, dst=self.small_rgb)  # convert BGR to RGB
+        cv2.GaussianBlur(self.small_rgb, (15, 15), 1, dst=self.detect_img)  # apply GaussianBlur filter to denoise the image
+        return self.detect_img
+
+    def detect_region(self, img, box, scale):
+        '''
+        Crop a region of a BGR frame, scale it, convert it to RGB and denoise it for the face detector.
+
+        Unlike 'detect_input()', the output size changes with the region, so the result is a new array.
+
+        Args:
+            img (numpy.ndarray): The frame in BGR format.
+            box (tuple): (x1, y1, x2, y2) of the region in frame pixels.
+            scale (float): Scale factor applied to the region.
+
+        Returns:
+            numpy.ndarray: The prepared image.
+        '''
+        x1, y1, x2, y2 = box
+        size = (max(1, int((x2 - x1) * scale)), max(1, int((y2 - y1) * scale)))
+        region = cv2.resize(img[y1:y2, x1:x2], size)
+        cv2.cvtColor(region, cv2.COLOR_BGR2RGB, dst=region)
+        return cv2.GaussianBlur(region, (15, 15), 1)
+
+    def display_frame(self, img, faces):
+        '''
+        Resize a BGR frame to the display size, convert it to RGB and draw the faces on it.
+
+        Args:
+            img (numpy.ndarray): The frame in BGR format. It is not modified.
+            faces (list): A (face_loc, name, accuracy) tuple for each face, in frame pixels.
+
+        Returns:
+            numpy.ndarray: The RGB display frame, a new array owned by the caller.
+        '''
+        if img.shape != self.frame_shape:
+            self._allocate(img.shape)
+        # The inference thread may prepare several frames while the UI still renders one it was handed:
+        # a fresh output array (the conversion writes it directly, so this costs no extra copy) is never shared
+        out = np.empty_like(self.display)
+        cv2.resize(img, self.display_size, dst=self.display)
+        cv2.cvtColor(self.display, cv2.COLOR_BGR2RGB, dst=out)
+        scale_x, scale_y = self.display_scale
+        for (y1, x2, y2, x1), name, acc in faces:
+            y1, x2, y2, x1 = int(y1 * scale_y), int(x2 * scale_x), int(y2 * scale_y), int(x1 * scale_x)
+            text = f"{name} {acc}%" if name != '' else 'Unknown'  # 'Unknown': face not found in the database
+            cv2.rectangle(out, (x1, y1), (x2, y2), (0, 255, 0), 1)
+            cv2.putText(out, text, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2, cv2.LINE_AA)
+        return out
@@ -0,0 +1,278 @@
+import os
+import csv
+import zipfile
+import hashlib
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from detectors import create_detector
+from config import IMPORT_WORKERS, IMPORT_MAX_SIDE, IMPORT_JPEG_QUALITY, IMPORT_DETECT_SIDE
+
+''' FUNCTION LIST '''
+# iter_directory
+# iter_zip
+# iter_manifest
+# iter_roster
+# normalise_image
+# count_faces
+# ingest_item
+# existing_images
+# write_report
+# import_roster
+# main
+
+# Bulk import of a roster into the Image Database. The photos come from a folder or a zip archive (the file name
+# is the person name) or from a CSV manifest of 'name,path' rows. Every photo is decoded, must show exactly one
+# face, is re-encoded as a JPEG of bounded resolution and is saved as 'img_db/<name>.jpg'. Photos whose content
+# is already in the Image Database, or appears twice in the roster, are skipped.
+# Usage: python roster_import.py roster.zip --report import_report.csv --enrol
+#        python roster_import.py photos/ --overwrite
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tif', '.tiff')
+
+# Worker threads keep their own detector: the OpenCV DNN network cannot be shared between threads
+_local = threading.local()
+
+def iter_directory(folder):
+    '''
+    Yield the images of a folder as (person name, source label, path).
+    '''
+    for img in sorted(os.listdir(folder)):
+        name, ext = os.path.splitext(img)
+        if ext.lower() in IMAGE_EXTENSIONS:
+            yield name, img, os.path.join(folder, img)
+
+def iter_zip(zip_path):
+    '''
+    Yield the images of a zip archive as (person name, source label, content bytes).
+
+    Members are read one at a time in the calling thread, so the archive is never held in memory at once.
+    '''
+    with zipfile.ZipFile(zip_path) as archive:
+        for member in archive.infolist():
+            name, ext = os.path.splitext(os.path.basename(member.filename))
+            if member.is_dir() or ext.lower() not in IMAGE_EXTENSIONS or name.startswith('.'):
+                continue
+            yield name, member.filename, archive.read(member)
+
+def iter_manifest(manifest_path):
+    '''
+    Yield the rows of a 'name,path' CSV manifest as (person name, source label, path).
+
+    Relative paths are resolved from the folder of the manifest. A 'name,path' header row is optional.
+    '''
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path, 'r', encoding='utf-8-sig', newline='') as f:
+        for line, row in enumerate(csv.reader(f), 1):
+            if len(row) == 0 or (line == 1 and [cell.strip().lower() for cell in row[:2]] == ['name', 'path']):
+                continue
+            if len(row) < 2:
+                yield '', f"line {line}", None
+                continue
+            name, path = row[0].strip(), row[1].strip()
+            yield name, path, os.path.join(base_dir, path)
+
+def iter_roster(source):
+    '''
+    Yield the roster entries of a folder, a zip archive or a CSV manifest.
+    '''
+    if os.path.isdir(source):
+        return iter_directory(source)
+    ext = os.path.splitext(source)[1].lower()
+    if ext == '.zip':
+        return iter_zip(source)
+    if ext == '.csv':
+        return iter_manifest(source)
+    raise ValueError(f"Unsupported roster source: {source} (expected a folder, a .zip or a .csv file)")
+
+def normalise_image(data, max_side=IMPORT_MAX_SIDE, quality=IMPORT_JPEG_QUALITY):
+    '''
+    Decode an image and re-encode it as a JPEG whose longest side is at most 'max_side'.
+
+    Args:
+        data (bytes): Content of an image file in any format OpenCV can read.
+        max_side (int): Longest side of the normalised image, in pixels.
+        quality (int): JPEG quality.
+
+    Returns:
+        image (numpy.ndarray): The normalised image in BGR format.
+        jpeg (bytes): Its JPEG encoding.
+
+    Raises:
+        ValueError: If the data is not a readable image.
+    '''
+    # IMREAD_COLOR also applies the EXIF orientation of phone photos
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("cannot read the image")
+    height, width = image.shape[:2]
+    scale = max_side / max(height, width)
+    if scale < 1:
+        image = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    success, jpeg = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not success:
+        raise ValueError("cannot encode the image")
+    return image, jpeg.tobytes()
+
+def count_faces(image, detect_side=IMPORT_DETECT_SIDE):
+    '''
+    Count the faces of a BGR image with the detector selected in 'config.py', on a copy downscaled to 'detect_side'.
+    '''
+    if not hasattr(_local, 'detector'):
+        _local.detector = create_detector()
+    height, width = image.shape[:2]
+    scale = detect_side / max(height, width)
+    if scale < 1:
+        image = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    return len(_local.detector.detect(cv2.cvtColor(image, cv2.COLOR_BGR2RGB)))
+
+def ingest_item(name, data):
+    '''
+    Validate and normalise one roster photo. Runs in a worker thread.
+
+    Args:
+        name (str): Person name.
+        data (bytes or str): Content of the photo, or its path.
+
+    Returns:
+        tuple: (status, detail, jpeg bytes, hashes) where status is 'ok' or 'rejected' and hashes holds the
+        SHA-256 of the original content and of the normalised JPEG.
+    '''
+    try:
+        if data is None:
+            raise ValueError("expected a 'name,path' row")
+        if not name or any(c in name for c in '\\/:*?"<>|'):
+            raise ValueError(f"invalid person name '{name}'")
+        if isinstance(data, str):
+            try:
+                with open(data, 'rb') as f:
+                    data = f.read()
+            except OSError as e:
+                raise ValueError(f"cannot open the file ({e.strerror})")
+        image, jpeg = normalise_image(data)
+        num_faces = count_faces(image)
+        if num_faces != 1:
+            raise ValueError("no face found" if num_faces == 0 else f"{num_faces} faces found")
+        return 'ok', f"{image.shape[1]}x{image.shape[0]}", jpeg, (hashlib.sha256(data).hexdigest(),
+                                                                hashlib.sha256(jpeg).hexdigest())
+    except Exception as e:
+        return 'rejected', str(e) or type(e).__name__, None, ()
+
+def existing_images(image_path):
+    '''
+    Index the Image Database.
+
+    Returns:
+        names (dict): {person name: file name}.
+        hashes (dict): {SHA-256 of the file content: person name}.
+    '''
+    names, hashes = {}, {}
+    for img in sorted(os.listdir(image_path)):
+        name = os.path.splitext(img)[0]
+        names[name] = img
+        with open(os.path.join(image_path, img), 'rb') as f:
+            hashes[hashlib.sha256(f.read()).hexdigest()] = name
+    return names, hashes
+
+def write_report(entries, report_file):
+    '''
+    Write the ingest report as a CSV file with the columns source, name, status and detail.
+    '''
+    with open(report_file, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['source', 'name', 'status', 'detail'])
+        writer.writeheader()
+        writer.writerows(entries)
+
+def import_roster(source, image_path='img_db', workers=IMPORT_WORKERS, overwrite=False):
+    '''
+    Import a roster into the Image Database.
+
+    The photos are streamed through a thread pool (decoding, face check and re-encoding release the GIL),
+    with a bounded number in flight so a large archive is never loaded at once. Results are written to the
+    Image Database by the calling thread, in roster order: of two photos of the same person, the first wins.
+    A photo is a duplicate when its original or normalised content matches a photo already imported.
+
+    Args:
+        source (str): A folder of photos, a zip archive or a 'name,path' CSV manifest.
+        image_path (str): The Image Database folder.
+        workers (int): Number of worker threads.
+        overwrite (bool): Replace the photo of a person who is already in the Image Database.
+
+    Returns:
+        dict: 'entries' (one dict per photo with the keys source, name, status and detail, where status is
+        'imported', 'replaced', 'duplicate', 'conflict' or 'rejected') and the count of each status.
+    '''
+    os.makedirs(image_path, exist_ok=True)
+    names, hashes = existing_images(image_path)
+    entries = []
+
+    def collect(future, name, label):
+        status, detail, jpeg, content_hashes = future.result()
+        duplicate_of = next((hashes[sha] for sha in content_hashes if sha in hashes), None)
+        if status == 'ok':
+            if duplicate_of is not None:
+                status, detail = 'duplicate', f"same photo as '{duplicate_of}'"
+            elif name in names and not overwrite:
+                status, detail = 'conflict', f"'{names[name]}' already exists"
+            else:
+                old_img = names.get(name)
+                temp_file = os.path.join(image_path, f".{name}.jpg.tmp")
+                with open(temp_file, 'wb') as f:
+                    f.write(jpeg)
+                os.replace(temp_file, os.path.join(image_path, name + ".jpg"))
+                if old_img is not None and old_img != name + ".jpg":
+                    os.remove(os.path.join(image_path, old_img))
+                status = 'replaced' if old_img is not None else 'imported'
+                names[name] = name + ".jpg"
+                for sha in content_hashes:
+                    hashes[sha] = name
+        entries.append({'source': label, 'name': name, 'status': status, 'detail': detail})
+
+    workers = max(1, workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Results are collected in roster order, with at most 2 photos per worker in flight
+        pending = deque()
+        for name, label, data in iter_roster(source):
+            pending.append((executor.submit(ingest_item, name, data), name, label))
+            if len(pending) >= 2 * workers:
+                collect(*pending.popleft())
+        while pending:
+            collect(*pending.popleft())
+
+    report = {'entries': entries}
+    for status in ('imported', 'replaced', 'duplicate', 'conflict', 'rejected'):
+        report[status] = sum(entry['status'] == status for entry in entries)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a roster of photos into the Image Database.")
+    parser.add_argument('source', help="folder of photos, zip archive or 'name,path' CSV manifest")
+    parser.add_argument('--images', default='img_db', help="Image Database folder")
+    parser.add_argument('--workers', type=int, default=IMPORT_WORKERS)
+    parser.add_argument('--overwrite', action='store_true', help="replace the photos of persons already enrolled")
+    parser.add_argument('--report', help="CSV file receiving one line per photo")
+    parser.add_argument('--enrol', action='store_true', help="encode the new photos into the Encode Database afterwards")
+    args = parser.parse_args()
+
+    report = import_roster(args.source, args.images, args.workers, args.overwrite)
+    for entry in report['entries']:
+        if entry['status'] not in ('imported', 'replaced'):
+            print(f"{entry['status']:>9}  {entry['source']}: {entry['detail']}")
+    print(f"Imported: {report['imported']}, replaced: {report['replaced']}, duplicates: {report['duplicate']}, "
+          f"conflicts: {report['conflict']}, rejected: {report['rejected']}")
+    if args.report:
+        write_report(report['entries'], args.report)
+
+    if args.enrol and report['imported'] + report['replaced'] != 0:
+        from enrolment import enrol_img_db
+        from encode_store import export_csv
+        enrolment = enrol_img_db(args.images)
+        export_csv("encode_db.csv")
+        print(f"Encoded - added: {len(enrolment['added'])}, updated: {len(enrolment['updated'])}, "
+              f"failed: {len(enrolment['failed'])}")
+
+if __name__ == '__main__':
+    main()
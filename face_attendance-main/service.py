@@ -0,0 +1,388 @@
+import json
+import time
+import base64
+import asyncio
+import hashlib
+import logging
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+import face_recognition
+from utils import encode_gallery, identify_faces, attendance_file_name
+from detectors import create_detector
+from preprocess import FramePreprocessor
+from attendance_store import get_attendance_store
+from auto_mark import AutoMarker
+from ws_protocol import WS_GUID, read_ws_message, ws_frame
+from config import (SERVICE_HOST, SERVICE_PORT, SERVICE_WORKERS, SERVICE_BATCH_WINDOW_MS, SERVICE_MAX_BATCH,
+                    SERVICE_MAX_BODY, LOG_FILE)
+
+''' CLASS LIST '''
+# SessionError
+# MatchBatcher
+# RecognitionService
+
+''' FUNCTION LIST '''
+# parse_time
+# main
+
+# Headless recognition service for thin-client kiosks, built on asyncio (standard library only).
+#   POST /recognize[?mark=1]  body: a JPEG frame -> {"faces": [{"name", "accuracy", "box"}], "marked", "ms"}
+#   POST /session             body: {"start": "07:00 AM", "end": "07:15 AM"} -> opens the attendance session
+#   POST /attendance          body: {"names": [...]} -> {"marked": [...], "already": [...]}
+#   GET  /attendance          -> names marked in the current session
+#   GET  /stats               -> request, batching and gallery counters
+#   GET  /ws[?auto_mark=1]    WebSocket: send JPEG frames as binary messages and JSON actions
+#                             ({"action": "session" | "mark", ...}) as text messages; replies are JSON text messages.
+#                             With auto_mark=1, persons confirmed over the last frames of the connection are marked.
+# Usage: python service.py --port 8080 --workers 4
+
+logger = logging.getLogger('service')
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 409: 'Conflict',
+           413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+class SessionError(Exception):
+    '''
+    Raised when attendance is marked without an open session or outside its time range (HTTP 409).
+    '''
+
+def parse_time(text):
+    '''
+    Parse a session time given as "07:00 AM" (as in the app) or "07:00".
+    '''
+    for time_format in ("%I:%M %p", "%H:%M"):
+        try:
+            return datetime.strptime(text.strip(), time_format).time()
+        except ValueError:
+            pass
+    raise ValueError(f"Invalid time: {text}")
+
+class MatchBatcher:
+    '''
+    Gathers the face encodings of concurrent requests and matches them against the gallery in one vectorized search.
+
+    A batch is closed 'window_ms' after its first request arrived, or as soon as it holds 'max_batch' requests.
+    '''
+    def __init__(self, executor, window_ms=SERVICE_BATCH_WINDOW_MS, max_batch=SERVICE_MAX_BATCH):
+        self.executor = executor
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.batched_requests = 0
+
+    async def match(self, encodings):
+        '''
+        Return the (name, accuracy) of each encoding once its batch has been matched.
+        '''
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((encodings, future))
+        return await future
+
+    def _match(self, encodings):
+        return identify_faces(encodings, encode_gallery.get())
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(items) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            encodings = [encoding for request_encodings, _ in items for encoding in request_encodings]
+            try:
+                results = await loop.run_in_executor(self.executor, self._match, encodings)
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.batched_requests += len(items)
+            start = 0
+            for request_encodings, future in items:
+                if not future.done():
+                    future.set_result(results[start:start + len(request_encodings)])
+                start += len(request_encodings)
+
+class RecognitionService:
+    '''
+    Serves face recognition and attendance marking over HTTP and WebSocket.
+
+    Decoding, detection and encoding (dlib) run in a thread pool, matching is batched across requests by a
+    MatchBatcher in its own thread, and attendance writes go through a single thread so the session's store
+    is never written concurrently. The event loop itself only parses requests and sends replies.
+    '''
+    def __init__(self, workers=SERVICE_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='recognize')
+        self.match_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='match')  # never queued behind dlib work
+        self.attendance_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='attendance')
+        self.local = threading.local()  # one FramePreprocessor and detector per worker thread (the DNN net is not thread-safe)
+        self.batcher = None
+        self.session = None  # (file name, start time, end time)
+        self.requests = 0
+        self.errors = 0
+
+    def _detect_and_encode(self, jpeg):
+        '''
+        Decode a JPEG frame, detect the faces and compute their encodings (runs in a worker thread).
+
+        Returns:
+            boxes (list): (top, right, bottom, left) of each face in frame pixels.
+            encodings (list): The 128-d encoding of each face.
+        '''
+        img = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError("The body is not a valid image")
+        if not hasattr(self.local, 'preprocessor'):
+            self.local.preprocessor = FramePreprocessor()
+            self.local.detector = create_detector()
+        preprocessor = self.local.preprocessor
+        imgS = preprocessor.detect_input(img)
+        face_locations = self.local.detector.detect(imgS)
+        encodings = face_recognition.face_encodings(imgS, face_locations, model="hog") if face_locations else []
+        boxes = [tuple(int(v / preprocessor.detect_scale) for v in face_loc) for face_loc in face_locations]
+        return boxes, encodings
+
+    async def recognize(self, jpeg):
+        '''
+        Recognize the faces of a JPEG frame.
+
+        Returns:
+            list: {'name', 'accuracy', 'box'} for each face. The name is empty if the face is not recognized.
+        '''
+        boxes, encodings = await asyncio.get_running_loop().run_in_executor(self.executor, self._detect_and_encode, jpeg)
+        results = await self.batcher.match(encodings) if len(encodings) != 0 else []
+        return [{'name': name, 'accuracy': acc, 'box': dict(zip(('top', 'right', 'bottom', 'left'), box))}
+                for box, (name, acc) in zip(boxes, results)]
+
+    def _open_session(self, start, end):
+        start_time, end_time = parse_time(start), parse_time(end)
+        now = datetime.now()
+        if not start_time <= now.time() <= end_time:
+            raise ValueError("Attendance outside the specified time range!")
+        self.session = (attendance_file_name(start_time, end_time, now), start_time, end_time)
+        logger.info('session opened: %s', self.session[0])
+        return self.session[0]
+
+    def _mark(self, names):
+        '''
+        Mark persons in the current session (runs in the attendance thread).
+        '''
+        if self.session is None:
+            raise SessionError("No attendance session is open")
+        file_name, start_time, end_time = self.session
+        now = datetime.now()
+        if not start_time <= now.time() <= end_time:
+            raise SessionError("Attendance outside the specified time range!")
+        store = get_attendance_store(file_name)
+        marked, already = [], []
+        for name in dict.fromkeys(names):
+            if store.mark(name, now.strftime('%H:%M:%S')):
+                marked.append(name)
+            else:
+                already.append(name)
+        return {'marked': marked, 'already': already}
+
+    def _auto_mark(self, marker, names):
+        if self.session is None:
+            return {'marked': [], 'already': []}
+        marked, already = marker.update(names, *self.session)
+        return {'marked': marked, 'already': already}
+
+    async def mark(self, names):
+        return await asyncio.get_running_loop().run_in_executor(self.attendance_executor, self._mark, names)
+
+    def stats(self):
+        return {'requests': self.requests, 'errors': self.errors, 'batches': self.batcher.batches,
+                'mean_batch_size': round(self.batcher.batched_requests / self.batcher.batches, 2) if self.batcher.batches else 0,
+                'gallery': encode_gallery.stats(), 'session': self.session[0] if self.session else None}
+
+    async def route(self, method, path, query, body):
+        '''
+        Handle an HTTP request.
+
+        Returns:
+            tuple: (status code, JSON-serializable reply).
+        '''
+        if path == '/recognize':
+            if method != 'POST':
+                return 405, {'error': "Use POST with a JPEG body"}
+            start = time.perf_counter()
+            faces = await self.recognize(body)
+            reply = {'faces': faces}
+            if query.get('mark') == '1' and self.session is not None:
+                reply.update(await self.mark([face['name'] for face in faces if face['name'] != '']))
+            reply['ms'] = round((time.perf_counter() - start) * 1000, 1)
+            return 200, reply
+        if path == '/session' and method == 'POST':
+            request = json.loads(body)
+            return 200, {'file_name': self._open_session(request['start'], request['end'])}
+        if path == '/attendance' and method == 'POST':
+            return 200, await self.mark(json.loads(body)['names'])
+        if path == '/attendance' and method == 'GET':
+            if self.session is None:
+                return 409, {'error': "No attendance session is open"}
+            store = get_attendance_store(self.session[0])
+            names = await asyncio.get_running_loop().run_in_executor(self.attendance_executor, lambda: sorted(store.marked))
+            return 200, {'file_name': self.session[0], 'names': names}
+        if path == '/stats':
+            return 200, self.stats()
+        return 404, {'error': f"Unknown path {path}"}
+
+    async def handle_connection(self, reader, writer):
+        '''
+        Serve the HTTP requests of a keep-alive connection, or switch it to WebSocket.
+        '''
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, value = line.decode('latin-1').split(':', 1)
+                    headers[key.strip().lower()] = value.strip()
+                path, _, query_string = target.partition('?')
+                query = dict(item.partition('=')[::2] for item in query_string.split('&') if item)
+
+                if path == '/ws' and headers.get('upgrade', '').lower() == 'websocket':
+                    await self.websocket(reader, writer, headers, query)
+                    break
+                length = int(headers.get('content-length', 0))
+                if length > SERVICE_MAX_BODY:
+                    await self.respond(writer, 413, {'error': "Request body too large"}, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                self.requests += 1
+                try:
+                    status, reply = await self.route(method, path, query, body)
+                except SessionError as e:
+                    status, reply = 409, {'error': str(e)}
+                except KeyError as e:
+                    status, reply = 400, {'error': f"Missing field {e}"}
+                except (ValueError, TypeError) as e:
+                    status, reply = 400, {'error': str(e)}
+                except Exception as e:
+                    logger.exception('request failed: %s %s', method, path)
+                    status, reply = 500, {'error': type(e).__name__}
+                if status >= 400:
+                    self.errors += 1
+                close = headers.get('connection', '').lower() == 'close'
+                await self.respond(writer, status, reply, close)
+                if close:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        except Exception:
+            logger.exception('connection failed')
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, reply, close=False):
+        body = json.dumps(reply).encode()
+        writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: {'close' if close else 'keep-alive'}\r\n\r\n".encode() + body)
+        await writer.drain()
+
+    async def websocket(self, reader, writer, headers, query):
+        '''
+        Serve a WebSocket connection: binary messages are JPEG frames, text messages are JSON actions.
+        '''
+        accept = base64.b64encode(hashlib.sha1((headers['sec-websocket-key'] + WS_GUID).encode()).digest()).decode()
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+        await writer.drain()
+        loop = asyncio.get_running_loop()
+        marker = AutoMarker() if query.get('auto_mark') == '1' else None
+        while True:
+            try:
+                opcode, payload = await read_ws_message(reader, SERVICE_MAX_BODY)
+            except ValueError:
+                # Message too big (1009), then the connection is closed by 'handle_connection()'
+                writer.write(ws_frame(8, (1009).to_bytes(2, 'big')))
+                await writer.drain()
+                return
+            if opcode == 8:  # close
+                writer.write(ws_frame(8, payload[:2]))
+                await writer.drain()
+                return
+            if opcode == 9:  # ping
+                writer.write(ws_frame(10, payload))
+                await writer.drain()
+                continue
+            if opcode not in (1, 2):
+                continue
+            self.requests += 1
+            start = time.perf_counter()
+            try:
+                if opcode == 2:
+                    faces = await self.recognize(payload)
+                    reply = {'faces': faces}
+                    if marker is not None:
+                        names = [face['name'] for face in faces if face['name'] != '']
+                        reply.update(await loop.run_in_executor(self.attendance_executor, self._auto_mark, marker, names))
+                else:
+                    request = json.loads(payload)
+                    if request.get('action') == 'session':
+                        reply = {'file_name': self._open_session(request['start'], request['end'])}
+                    elif request.get('action') == 'mark':
+                        reply = await self.mark(request['names'])
+                    else:
+                        raise ValueError(f"Unknown action {request.get('action')}")
+            except KeyError as e:
+                self.errors += 1
+                reply = {'error': f"Missing field {e}"}
+            except (SessionError, ValueError, TypeError) as e:
+                self.errors += 1
+                reply = {'error': str(e)}
+            except Exception as e:
+                logger.exception('websocket request failed')
+                self.errors += 1
+                reply = {'error': type(e).__name__}
+            reply['ms'] = round((time.perf_counter() - start) * 1000, 1)
+            writer.write(ws_frame(1, json.dumps(reply).encode()))
+            await writer.drain()
+
+    async def serve(self, host=SERVICE_HOST, port=SERVICE_PORT):
+        # Load the gallery before accepting requests
+        await asyncio.get_running_loop().run_in_executor(self.executor, encode_gallery.get)
+        self.batcher = MatchBatcher(self.match_executor)
+        batcher_task = asyncio.create_task(self.batcher.run())
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        logger.info('serving on %s:%d', host, port)
+        print(f"Recognition service on http://{host}:{port} ({len(encode_gallery.get().names)} persons)")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher_task.cancel()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve face recognition and attendance over HTTP/WebSocket.")
+    parser.add_argument('--host', default=SERVICE_HOST)
+    parser.add_argument('--port', type=int, default=SERVICE_PORT)
+    parser.add_argument('--workers', type=int, default=SERVICE_WORKERS, help="threads running detection and encoding")
+    args = parser.parse_args()
+    logging.basicConfig(filename=LOG_FILE, level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+    try:
+        asyncio.run(RecognitionService(args.workers).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
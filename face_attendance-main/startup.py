@@ -0,0 +1,85 @@
+import time
+import logging
+from contextlib import contextmanager
+from threading import Thread, Lock
+
+''' CLASS LIST '''
+# StartupTimer
+# BackgroundTask
+
+# Kept light on purpose (standard library only): it is imported before the intro window is shown
+
+PROCESS_START = time.perf_counter()
+
+logger = logging.getLogger('startup')
+
+class StartupTimer:
+    '''
+    Collects the duration of the startup stages and logs them as one breakdown line.
+    '''
+    def __init__(self, start=PROCESS_START):
+        self.start = start
+        self.lock = Lock()
+        self.entries = []  # (name, milliseconds)
+        self.logged = False
+
+    @contextmanager
+    def stage(self, name):
+        '''
+        Context manager recording how long a stage took.
+        '''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.entries.append((name, (time.perf_counter() - start) * 1000))
+
+    def mark(self, name):
+        '''
+        Record the time elapsed since the process started.
+        '''
+        with self.lock:
+            self.entries.append((name, (time.perf_counter() - self.start) * 1000))
+
+    def log(self):
+        '''
+        Write the breakdown to the log, once.
+        '''
+        with self.lock:
+            if self.logged:
+                return
+            self.logged = True
+            breakdown = ' '.join(f"{name.replace(' ', '_')}={ms:.0f}ms" for name, ms in self.entries)
+        logger.info('startup %s', breakdown)
+
+class BackgroundTask:
+    '''
+    Runs a function in a daemon thread and hands its result (or exception) over later.
+    '''
+    def __init__(self, func, *args):
+        self.value = None
+        self.error = None
+        self.thread = Thread(target=self._run, args=(func,) + args, daemon=True)
+        self.thread.start()
+
+    def _run(self, func, *args):
+        try:
+            self.value = func(*args)
+        except BaseException as e:
+            self.error = e
+
+    def done(self):
+        return not self.thread.is_alive()
+
+    def result(self):
+        '''
+        Wait for the function to finish and return its result, raising its exception if it failed.
+        '''
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+# Process-wide startup timings
+startup_timer = StartupTimer()
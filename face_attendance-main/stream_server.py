@@ -0,0 +1,82 @@
+import os
+import time
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import cv2
+
+''' FUNCTION LIST '''
+# iter_source_frames
+# make_handler
+# main
+
+# Local test server that plays a video file or an image folder as an MJPEG stream, so several "cameras" can be
+# fed to the app without the hardware. Add 'http://127.0.0.1:<port>/stream' to CAMERA_SOURCES in 'config.py'.
+# Usage: python stream_server.py --source lecture.mp4 --port 8090 --fps 15
+
+def iter_source_frames(source):
+    '''
+    Yield the BGR frames of a video file or of the images of a folder, looping forever.
+    '''
+    while True:
+        if os.path.isdir(source):
+            found = False
+            for img in sorted(os.listdir(source)):
+                frame = cv2.imread(os.path.join(source, img))
+                if frame is not None:
+                    found = True
+                    yield frame
+            if not found:
+                raise ValueError(f"No image in {source}")
+        else:
+            cap = cv2.VideoCapture(source)
+            success, frame = cap.read()
+            if not success:
+                raise ValueError(f"Cannot read {source}")
+            while success:
+                yield frame
+                success, frame = cap.read()
+            cap.release()
+
+def make_handler(source, fps, quality):
+    class StreamHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != '/stream':
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=frame')
+            self.end_headers()
+            next_time = time.perf_counter()
+            try:
+                # Every client gets its own playback from the start
+                for frame in iter_source_frames(source):
+                    _, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+                    self.wfile.write(b'--frame\r\nContent-Type: image/jpeg\r\n'
+                                     + f'Content-Length: {len(jpeg)}\r\n\r\n'.encode() + jpeg.tobytes() + b'\r\n')
+                    next_time += 1 / fps
+                    time.sleep(max(0, next_time - time.perf_counter()))
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, format, *args):
+            pass
+    return StreamHandler
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a video file or an image folder as a local MJPEG stream.")
+    parser.add_argument('--source', required=True, help="Video file or image folder")
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--fps', type=float, default=15)
+    parser.add_argument('--quality', type=int, default=80, help="JPEG quality")
+    args = parser.parse_args()
+
+    # Bound to the loopback interface: the stream is only reachable from this machine
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(args.source, args.fps, args.quality))
+    print(f"Streaming {args.source} on http://127.0.0.1:{args.port}/stream")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
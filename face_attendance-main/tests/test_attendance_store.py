@@ -0,0 +1,41 @@
+import attendance_store
+from attendance_store import (CSVAttendanceStore, get_attendance_store, flush_attendance_stores,
+                              close_attendance_stores)
+
+def read_rows(path):
+    with open(path) as f:
+        return f.read().splitlines()
+
+def test_buffered_rows_survive_close(tmp_path):
+    path = tmp_path / 'session.csv'
+    store = CSVAttendanceStore(str(path), fsync_every=10)
+    store.mark('An', '09:00:01')
+    store.mark('Binh', '09:00:02')
+    assert not path.exists()
+    store.close()
+    assert read_rows(path) == ['Name, Attendance Time', 'An, 09:00:01', 'Binh, 09:00:02']
+
+def test_close_attendance_stores_writes_buffered_rows(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'attendance_infor').mkdir()
+    monkeypatch.setattr(attendance_store, '_stores', {})
+    store = get_attendance_store('Mon_090000_100000.csv', backend='csv')
+    store.fsync_every = 10
+    store.mark('An', '09:00:01')
+    assert close_attendance_stores() == []
+    assert read_rows(tmp_path / 'attendance_infor' / 'Mon_090000_100000.csv')[1:] == ['An, 09:00:01']
+    assert attendance_store._stores == {}
+
+def test_failed_write_is_retried_by_flush(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(attendance_store, '_stores', {})
+    # The folder is missing, so the file cannot be opened (as when it is locked by Excel)
+    store = get_attendance_store('Mon_090000_100000.csv', backend='csv')
+    store.fsync_every = 10
+    store.mark('An', '09:00:01')
+    assert close_attendance_stores() == ['Mon_090000_100000.csv']
+    assert flush_attendance_stores() == ['Mon_090000_100000.csv']
+    (tmp_path / 'attendance_infor').mkdir()
+    assert flush_attendance_stores() == []
+    assert read_rows(tmp_path / 'attendance_infor' / 'Mon_090000_100000.csv')[1:] == ['An, 09:00:01']
+    assert close_attendance_stores() == []
@@ -0,0 +1,50 @@
+from datetime import time
+
+import numpy as np
+import pytest
+
+from attendance_store import close_attendance_stores
+from auto_mark import AutoMarker
+from tracker import FaceTracker
+
+FILE_NAME = 'Mon_090000_100000.csv'
+FACE = ((40, 120, 120, 40), 'An', 90)
+
+@pytest.fixture
+def marker(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'attendance_infor').mkdir()
+    yield AutoMarker(confirm_frames=5, window_frames=8, debounce_seconds=10)
+    close_attendance_stores()
+
+def feed(marker, names, fresh_names):
+    marked, _ = marker.update(names, FILE_NAME, time.min, time.max, fresh_names)
+    return marked
+
+def test_fresh_recognitions_confirm(marker):
+    marked = [feed(marker, ['An'], ['An']) for _ in range(5)]
+    assert marked == [[], [], [], [], ['An']]
+
+def test_tracked_frames_do_not_confirm():
+    # One detection, then frames where the tracker only moves the box of that recognition
+    img = np.random.default_rng(0).integers(0, 255, (240, 320, 3), dtype=np.uint8)
+    tracker = FaceTracker(lambda frame: ([FACE], [True]), detect_interval=10, tracker_type='flow')
+    fresh = [tracker.process(img)[1] for _ in range(8)]
+    assert fresh == [[True]] + [[False]] * 7
+    assert tracker.detected_frames == 1
+
+def test_carried_over_names_do_not_confirm(marker):
+    # A single recognition replayed by the motion gate, the tracker or the encoding cache
+    assert feed(marker, ['An'], ['An']) == []
+    for _ in range(20):
+        assert feed(marker, ['An'], []) == []
+    # Carried-over frames are not counted against the person either
+    assert [feed(marker, ['An'], ['An']) for _ in range(4)] == [[], [], [], ['An']]
+
+def test_absent_frames_count_against(marker):
+    for _ in range(4):
+        feed(marker, ['An'], ['An'])
+    for _ in range(4):
+        feed(marker, [], [])
+    # Only 4 of the last 8 frames that observed the person recognized them
+    assert feed(marker, ['An'], ['An']) == []
@@ -0,0 +1,18 @@
+import logging
+import pytest
+
+pytest.importorskip('face_recognition')
+from detectors import create_detector, HOGDetector
+
+@pytest.mark.parametrize('backend', ['lbp', 'dnn'])
+def test_missing_model_falls_back_to_hog(backend, tmp_path, monkeypatch, caplog):
+    monkeypatch.chdir(tmp_path)  # no 'models' folder here
+    with caplog.at_level(logging.WARNING, logger='detectors'):
+        detector = create_detector(backend)
+    assert isinstance(detector, HOGDetector)
+    assert f"'{backend}' face detector unavailable" in caplog.text
+
+def test_missing_model_raises_without_fallback(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(FileNotFoundError):
+        create_detector('dnn', fallback=False)
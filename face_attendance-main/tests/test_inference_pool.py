@@ -0,0 +1,50 @@
+import queue
+import numpy as np
+import pytest
+from inference_pool import ProcessPoolBackend
+
+class FakeWorker:
+    def __init__(self):
+        self.alive = True
+
+    def is_alive(self):
+        return self.alive
+
+@pytest.fixture
+def backend():
+    # Results are put by the test instead of worker processes
+    backend = ProcessPoolBackend(1, slots_per_worker=4, max_errors=3)
+    backend.workers = [FakeWorker()]
+    backend.task_queue = queue.Queue()
+    backend.result_queue = queue.Queue()
+    yield backend
+    backend.workers = []
+    backend.close()
+
+def submit_frames(backend, count):
+    for i in range(count):
+        assert backend.submit(np.full((4, 4, 3), i, np.uint8), tag=i)
+    return [backend.task_queue.get() for _ in range(count)]
+
+def test_failed_frame_is_dropped(backend):
+    tasks = submit_frames(backend, 3)
+    for seq, slot, *_ in tasks:
+        error = "ValueError: bad frame" if seq == 1 else None
+        backend.result_queue.put((seq, slot, None if error else ([], []), {}, error))
+    outputs = backend.collect(lambda frame, result, tag: int(frame[0, 0, 0]))
+    assert outputs == [(0, 0), (2, 2)]
+    assert backend.in_flight == 0
+    assert backend.dropped == 1
+
+def test_repeated_failures_stop_the_pool(backend):
+    tasks = submit_frames(backend, 3)
+    for seq, slot, *_ in tasks:
+        backend.result_queue.put((seq, slot, None, {}, "ValueError: bad frame"))
+    with pytest.raises(RuntimeError, match="3 frames in a row failed"):
+        backend.collect(lambda frame, result, tag: tag)
+
+def test_exited_worker_stops_the_pool(backend):
+    submit_frames(backend, 1)
+    backend.workers[0].alive = False
+    with pytest.raises(RuntimeError, match="worker exited"):
+        backend.collect(lambda frame, result, tag: tag)
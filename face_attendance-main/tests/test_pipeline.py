@@ -0,0 +1,51 @@
+import time
+import numpy as np
+from pipeline import VideoPipeline
+
+class FakeCapture:
+    '''
+    Camera returning the same frame on every read.
+    '''
+    def __init__(self):
+        self.frame = np.zeros((48, 64, 3), np.uint8)
+
+    def read(self):
+        time.sleep(0.005)
+        return True, self.frame
+
+    def get(self, prop):
+        return 0
+
+    def set(self, prop, value):
+        return True
+
+    def release(self):
+        pass
+
+def wait_for(condition, timeout=2):
+    end = time.perf_counter() + timeout
+    while not condition() and time.perf_counter() < end:
+        time.sleep(0.01)
+    return condition()
+
+def test_processed_frames_reach_the_render():
+    pipeline = VideoPipeline(FakeCapture(), lambda index, img: ('output', index))
+    pipeline.start()
+    try:
+        assert wait_for(lambda: pipeline.sources[0].processed > 0)
+        assert pipeline.poll_result(0) == ('output', 0)
+    finally:
+        pipeline.stop()
+
+def test_process_error_is_reported():
+    def process(index, img):
+        raise ValueError("bad frame")
+
+    pipeline = VideoPipeline(FakeCapture(), process)
+    pipeline.start()
+    try:
+        assert wait_for(lambda: pipeline.error is not None)
+        assert pipeline.error == "Recognition stopped: bad frame"
+        assert not pipeline.threads[-1].is_alive()
+    finally:
+        pipeline.stop()
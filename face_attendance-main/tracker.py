@@ -0,0 +1,174 @@
+import cv2
+import numpy as np
+from config import TRACK_DETECT_INTERVAL, TRACKER_TYPE, TRACK_SCALE
+
+''' CLASS LIST '''
+# FlowTracker
+# FaceTracker
+
+''' FUNCTION LIST '''
+# create_box_tracker
+# box_iou
+
+class FlowTracker:
+    '''
+    Box tracker based on Lucas-Kanade optical flow, with the same init/update interface as the OpenCV trackers.
+
+    Corner points found inside the box are followed from frame to frame and the box is moved by their median shift.
+    '''
+    def __init__(self, min_points=5):
+        self.min_points = min_points
+        self.gray = None
+        self.points = None
+        self.bbox = None
+
+    def init(self, frame, bbox):
+        x, y, w, h = bbox
+        self.gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        mask = np.zeros_like(self.gray)
+        mask[y:y + h, x:x + w] = 255
+        self.points = cv2.goodFeaturesToTrack(self.gray, maxCorners=50, qualityLevel=0.01, minDistance=3, mask=mask)
+        self.bbox = bbox
+
+    def update(self, frame):
+        if self.points is None or len(self.points) < self.min_points:
+            return False, self.bbox
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        new_points, status, _ = cv2.calcOpticalFlowPyrLK(self.gray, gray, self.points, None)
+        good = status.ravel() == 1
+        if good.sum() < self.min_points:
+            return False, self.bbox
+        dx, dy = np.median(new_points[good] - self.points[good], axis=0).ravel()
+        x, y, w, h = self.bbox
+        self.bbox = (int(round(x + dx)), int(round(y + dy)), w, h)
+        self.points = new_points[good].reshape(-1, 1, 2)
+        self.gray = gray
+        return True, self.bbox
+
+def create_box_tracker(tracker_type):
+    '''
+    Create a single-box tracker.
+
+    Args:
+        tracker_type (str): 'flow', 'kcf', 'csrt' or 'mosse'.
+
+    Returns:
+        object: A tracker with 'init(frame, bbox)' and 'update(frame)' methods.
+    '''
+    if tracker_type == 'flow':
+        return FlowTracker()
+    factory_name = f"Tracker{tracker_type.upper()}_create"
+    for module in (cv2, getattr(cv2, 'legacy', None)):
+        if module is not None and hasattr(module, factory_name):
+            return getattr(module, factory_name)()
+    # The OpenCV build has no such tracker (e.g. opencv-python without contrib)
+    return FlowTracker()
+
+def box_iou(box_a, box_b):
+    '''
+    Compute the intersection over union of two (top, right, bottom, left) boxes.
+    '''
+    top, right = max(box_a[0], box_b[0]), min(box_a[1], box_b[1])
+    bottom, left = min(box_a[2], box_b[2]), max(box_a[3], box_b[3])
+    inter = max(0, right - left) * max(0, bottom - top)
+    area_a = (box_a[1] - box_a[3]) * (box_a[2] - box_a[0])
+    area_b = (box_b[1] - box_b[3]) * (box_b[2] - box_b[0])
+    union = area_a + area_b - inter
+    return inter / union if union > 0 else 0
+
+class FaceTracker:
+    '''
+    Detect-once, track-between-detections pipeline for live video.
+
+    Detection and recognition run every 'detect_interval' frames, or as soon as a track is lost.
+    In between, each face box is moved by a cheap tracker and keeps the identity found at the last detection.
+
+    Attributes:
+        detected_frames (int): Number of frames that ran detection and recognition.
+        tracked_frames (int): Number of frames served by the trackers only.
+    '''
+    def __init__(self, recognize, detect_interval=TRACK_DETECT_INTERVAL, tracker_type=TRACKER_TYPE, scale=TRACK_SCALE):
+        '''
+        Args:
+            recognize (callable): Function returning the (face_loc, name, accuracy) tuples of a BGR image and
+                whether each face is fresh, as 'recognize_faces()' does.
+            detect_interval (int): Number of frames between two detections.
+            tracker_type (str): Type of box tracker, see 'create_box_tracker()'.
+            scale (float): Downscale factor of the frames given to the trackers.
+        '''
+        self.recognize = recognize
+        self.detect_interval = detect_interval
+        self.tracker_type = tracker_type
+        self.scale = scale
+        self.tracks = []  # dicts with keys: id, tracker, face_loc, name, acc
+        self.next_track_id = 1
+        self.frames_since_detection = 0
+        self.detected_frames = 0
+        self.tracked_frames = 0
+
+    def reset(self):
+        '''
+        Drop all tracks so the next frame runs detection.
+        '''
+        self.tracks = []
+        self.frames_since_detection = 0
+
+    def _small(self, img):
+        return cv2.resize(img, (0, 0), None, self.scale, self.scale)
+
+    def _detect(self, img):
+        faces, fresh = self.recognize(img)
+        small = self._small(img)
+        height, width = small.shape[:2]
+        tracks = []
+        for face_loc, name, acc in faces:
+            # Keep the ID of the previous track that covers the same face
+            previous = max(self.tracks, key=lambda track: box_iou(track['face_loc'], face_loc), default=None)
+            if previous is not None and box_iou(previous['face_loc'], face_loc) > 0.3:
+                track_id = previous['id']
+            else:
+                track_id = self.next_track_id
+                self.next_track_id += 1
+            top, right, bottom, left = (int(v * self.scale) for v in face_loc)
+            left, top = max(left, 0), max(top, 0)
+            right, bottom = min(right, width), min(bottom, height)
+            tracker = create_box_tracker(self.tracker_type)
+            tracker.init(small, (left, top, right - left, bottom - top))
+            tracks.append({'id': track_id, 'tracker': tracker, 'face_loc': face_loc, 'name': name, 'acc': acc})
+        self.tracks = tracks
+        self.frames_since_detection = 0
+        self.detected_frames += 1
+        return faces, fresh
+
+    def process(self, img):
+        '''
+        Return the faces of a frame, either from a new detection or from the trackers.
+
+        Args:
+            img (numpy.ndarray): The frame in BGR format.
+
+        Returns:
+            faces (list): A (face_loc, name, accuracy) tuple for each face.
+            fresh (list): For each face, whether it was detected and encoded on this frame.
+                Faces moved by the trackers keep the identity of the last detection and are never fresh.
+        '''
+        self.frames_since_detection += 1
+        if len(self.tracks) == 0 or self.frames_since_detection >= self.detect_interval:
+            return self._detect(img)
+
+        small = self._small(img)
+        for track in self.tracks:
+            success, (x, y, w, h) = track['tracker'].update(small)
+            if not success:
+                # A track is lost: detect again on this frame
+                return self._detect(img)
+            track['face_loc'] = tuple(int(v / self.scale) for v in (y, x + w, y + h, x))
+        self.tracked_frames += 1
+        return [(track['face_loc'], track['name'], track['acc']) for track in self.tracks], [False] * len(self.tracks)
+
+    def stats(self):
+        '''
+        Return the frame counters and the number of active tracks.
+        '''
+        return {'detected_frames': self.detected_frames, 'tracked_frames': self.tracked_frames,
+                'tracks': len(self.tracks)}
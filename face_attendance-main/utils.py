@@ -4,24 +4,38 @@ from tkinter import messagebox
 from tkinter.simpledialog import askstring
 from datetime import datetime
 import os
-import csv
+import time
 import face_recognition
-from tkinter.filedialog import askopenfilename
-import shutil
+from tkinter.filedialog import askopenfilename, askdirectory
+from attendance_store import get_attendance_store
+from detectors import create_detector
+from preprocess import FramePreprocessor
+from metrics import metrics
+from gallery import EncodeGallery
+from roster_import import import_roster, normalise_image, write_report
+from encode_store import INDEX_FILE, load_encode_store, load_face_index, remove_from_encode_store, export_csv
+from config import INDEX_BACKEND
 
 ''' FUNCTION LIST '''
 # crop_center_image
 # augment_data
-# str_to_list_arr
 # set_time_attendance
+# attendance_file_name
 # name_attendance_file
 # mark_attendance
 # convert_to_encode_db
 # add_img_db
+# import_roster_db
 # delete_from_encode_db
 # delete_from_img_db
+# export_encode_csv
 # read_encode_db
+# encode_gallery
+# face_detector
+# identify_faces
+# recognize_faces
 # cur_img_process
+# annotate_frame
 
 def crop_center_image(img):
     '''
@@ -54,21 +68,6 @@ def augment_data(img):
     aug_img = [cv2.convertScaleAbs(img, alpha=factor, beta=0) for factor in bright_factors]
     return aug_img
 
-def str_to_list_arr(row):
-    '''
-    Convert a row in a CSV file that contains encodes for a person
-    to a list that contains encoded arrays for each different brightness level.
-    
-    Args:
-        row (str): The row in the CSV file.
-    
-    Returns:
-        list: A list of encoded arrays.
-    '''
-    row = row[1:-2].replace('array', '').replace('(', '')
-    list_arr = [np.fromstring(arr[1:-1], sep=', ') for arr in list(row.split('), '))]
-    return list_arr
-
 def set_time_attendance():
     '''
     Set up the time interval for attendance.
@@ -91,6 +90,17 @@ def set_time_attendance():
             messagebox.showerror('Error', 'Please enter a valid time interval!')
     return start_time, end_time
 
+def attendance_file_name(start_time, end_time, date):
+    '''
+    Build the name of the attendance file of a session, e.g. 'attendance_09-20-00_to_09-25-00_date-2023-06-05.csv'.
+
+    Args:
+        start_time (datetime.time): The start time of the attendance.
+        end_time (datetime.time): The end time of the attendance.
+        date (datetime.date): The date of the session.
+    '''
+    return f"attendance_{start_time}_to_{end_time}_date-{date.strftime('%Y-%m-%d')}.csv".replace(':', '-')
+
 def name_attendance_file():
     '''
     Generate the name for the attendance file based on the specified time range.
@@ -99,7 +109,6 @@ def name_attendance_file():
         tuple: A tuple containing the file name, start time, and end time.
     '''
     now = datetime.now()
-    date_attendance = now.strftime('%Y-%m-%d')
     while True:
         try:
             start_time, end_time = set_time_attendance()
@@ -109,20 +118,20 @@ def name_attendance_file():
             break
         else:
             messagebox.showerror("Error", "Attendance outside the specified time range!")
-    file_name = f"attendance_{start_time}_to_{end_time}_date-{date_attendance}.csv".replace(':', '-')
+    file_name = attendance_file_name(start_time, end_time, now)
     return file_name, start_time, end_time
 
-def mark_attendance(name, file_name, start_time, end_time):
+def mark_attendance(names, file_name, start_time, end_time):
     '''
-    Fill the name of the person who participates in attendance and the attendance time to the CSV file.
+    Fill the names of the persons who participate in attendance and the attendance time to the CSV file.
 
     Args:
-        name (str): The name of the person.
+        names (list): The names of the persons recognized in the current frame.
         file_name (str): The name of the attendance file.
         start_time (datetime.time): The start time of the attendance.
         end_time (datetime.time): The end time of the attendance.
     '''
-    if name == '':
+    if len(names) == 0:
         messagebox.showerror('Error', "You don't have encoded data in the Encode Database!")
         return
     now = datetime.now()
@@ -130,91 +139,54 @@ def mark_attendance(name, file_name, start_time, end_time):
         messagebox.showerror("Error", "Attendance outside the specified time range!")
         return
     time_attendance = now.strftime('%H:%M:%S')
-    file_path = os.path.join('attendance_infor', file_name)
-    if os.path.isfile(file_path):          
-        while True:
-            try:
-                with open(f'{file_path}', 'r+') as f:
-                    data_table = f.readlines()
-                    name_list = [row.split(',')[0] for row in data_table]
-                    if name in name_list:
-                        messagebox.showwarning('Warning', 'You marked attendance!')
-                    else:
-                        answer = messagebox.askyesno('Confirm', f'Do you accept mark attendance with name "{name}"?')
-                        if answer:
-                            f.write(f'{name}, {time_attendance}\n')
-                            messagebox.showinfo('Done', f'{name}, you marked attendance successfully!')
-                    break
-            except:
-                messagebox.showerror("Error", f"Please close the file {file_name}!")
-    else:
-        with open(f'{file_path}', 'w') as f:
+    store = get_attendance_store(file_name)  # names already marked in this session are kept in memory
+    try:
+        for name in names:
+            if store.is_marked(name):
+                messagebox.showwarning('Warning', f'{name}, you marked attendance!')
+                continue
             answer = messagebox.askyesno('Confirm', f'Do you accept mark attendance with name "{name}"?')
             if answer:
-                f.write('Name, Attendance Time\n')
-                f.write(f'{name}, {time_attendance}\n')
-                messagebox.showinfo('Done', f'{name}, you marked attendance successfully!')
+                if store.mark(name, time_attendance):
+                    messagebox.showinfo('Done', f'{name}, you marked attendance successfully!')
+                else:
+                    messagebox.showwarning('Warning', f'{name}, you marked attendance!')
+    except OSError:
+        # The marks stay buffered and are written once the file can be opened again
+        messagebox.showerror("Error", f"Please close the file {file_name}!")
 
 def convert_to_encode_db():
     '''
     Convert images to face encodings and add them to the Encode Database.
 
-    The function reads the Encode Database to obtain existing person names. It then processes the images in the 'img_db' folder,
-    extracts face encodings using the HOG algorithm, and adds the new person names and encodes to the Encode Database.
-
-    Note: The existing Encode Database file should have the format: "name, encoding1, encoding2, ..."
+    The function encodes the images in the 'img_db' folder that are new or changed since they were last encoded
+    (see 'enrolment.enrol_img_db()'), spreading the work over several processes, and adds the new person names
+    and encodes to the binary Encode Database. A readable copy is exported to 'encode_db.csv' afterwards.
+    Images that cannot be encoded are listed at the end instead of aborting the whole batch.
 
     Returns:
-        None
+        dict: The enrolment report.
     '''
-    # Read Encode Database to take existing person names
-    csv_file = "encode_db.csv"
-    existing_person_names = []
-    with open(csv_file, mode='r') as file:
-        csv_reader = csv.reader(file)
-        next(csv_reader)
-        existing_person_names = [row[0] for row in csv_reader]
-        
-    # Identify new persons and process images to face encoding respectively
-    image_path = 'img_db'
-    new_person_names = []
-    new_encodes = []
-    for img in os.listdir(image_path):
-        name, ext = os.path.splitext(img)
-        if name in existing_person_names:
-            continue
-        new_person_names.append(name) 
-        img_path = os.path.join(image_path, img)
-        image = cv2.imread(img_path)  
-        image = crop_center_image(image)
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)  # convert BGR to RGB
-        image = cv2.GaussianBlur(image, (15, 15), 1)   # apply GaussianBlur filter to denoise the image
-        augmented_images = augment_data(image) 
-        encode = []
-        for aug_img in augmented_images:
-            # Extract face encodings by HOG algorithm
-            encode_per_img = face_recognition.face_encodings(aug_img, model="hog")[0]  
-            encode.append(encode_per_img)
-        new_encodes.append(encode)
-
-    # Add new person names and image encodes to Encode Database
-    while True:
-        try:
-            with open(csv_file, 'a', newline='') as file:
-                writer = csv.writer(file)
-                writer.writerows(zip(new_person_names, new_encodes))
-            break
-        except:
-            messagebox.showerror("Error", "Please close the file encode_db.csv!")
-    
-    messagebox.showinfo('Done', 'Successfully added to Encode Database!')
+    from enrolment import enrol_img_db  # imported here because enrolment depends on this module
+    report = enrol_img_db('img_db')
+    encode_gallery.invalidate()
+    export_encode_csv()
+
+    message = (f"Successfully added to Encode Database!\n"
+               f"Added: {len(report['added'])}, updated: {len(report['updated'])}, unchanged: {len(report['skipped'])}")
+    if len(report['failed']) != 0:
+        failures = '\n'.join(f'{img}: {reason}' for img, reason in report['failed'])
+        messagebox.showwarning('Done', f"{message}\nFailed: {len(report['failed'])}\n{failures}")
+    else:
+        messagebox.showinfo('Done', message)
+    return report
 
 def add_img_db():
     '''
     Add an image to the Image Database.
 
     The function prompts the user to select an image file and enter a new name for the image.
-    It then copies the selected image to the 'img_db' folder with the new name.
+    It then saves the selected image to the 'img_db' folder with the new name, as a JPEG of bounded resolution.
 
     Returns:
         None
@@ -236,22 +208,66 @@ def add_img_db():
             break
     new_name += ".jpg"
 
-    # Add image to Image Database
+    # Add image to Image Database, re-encoded as JPEG whatever its original format
+    try:
+        with open(old_path, 'rb') as f:
+            _, jpeg = normalise_image(f.read())
+    except (OSError, ValueError):
+        messagebox.showerror('Error', 'Cannot read the image!')
+        return
     new_path = "img_db/" + new_name
-    shutil.copyfile(old_path, new_path)
+    with open(new_path, 'wb') as f:
+        f.write(jpeg)
 
     messagebox.showinfo('Done', 'Successfully added to Image Database!')
 
+def import_roster_db(folder=False):
+    '''
+    Import a whole roster into the Image Database (see 'roster_import.import_roster()').
+
+    The function prompts the user to choose the roster, imports it, writes one line per photo to
+    'import_report.csv' and lists the photos that were not imported.
+
+    Args:
+        folder (bool): Choose a folder of photos instead of a zip archive or a 'name,path' CSV manifest.
+
+    Returns:
+        dict: The ingest report, or None if no roster was chosen.
+    '''
+    if folder:
+        source = askdirectory(title="Choose the folder of the roster photos")
+    else:
+        source = askopenfilename(title="Choose the roster", filetypes=[("Zip archive or name,path CSV", "*.zip *.csv")])
+    if not source:
+        return None
+    try:
+        report = import_roster(source, 'img_db')
+    except (OSError, ValueError) as e:
+        messagebox.showerror('Error', f'Cannot import the roster: {e}')
+        return None
+    try:
+        write_report(report['entries'], 'import_report.csv')
+    except OSError:
+        messagebox.showerror("Error", "Please close the file import_report.csv!")
+
+    message = (f"Imported: {report['imported']}, replaced: {report['replaced']}, duplicates: {report['duplicate']}, "
+               f"conflicts: {report['conflict']}, rejected: {report['rejected']}")
+    problems = [f"{entry['source']}: {entry['detail']}" for entry in report['entries']
+                if entry['status'] not in ('imported', 'replaced')]
+    if len(problems) != 0:
+        # The full list is in the report file
+        more = "\n... see import_report.csv" if len(problems) > 20 else ""
+        messagebox.showwarning('Done', message + "\n" + '\n'.join(problems[:20]) + more)
+    else:
+        messagebox.showinfo('Done', message)
+    return report
+
 def delete_from_encode_db():
     '''
     Delete a person's data from the Encode Database.
 
     The function prompts the user to choose a person's name to delete from the Encode Database.
-    It opens the 'encode_db.csv' file and a temporary file for writing.
-    It reads each row from the original file and writes all rows except the one with the target name to the temporary file.
-    If the target name is found and deleted, the 'check' flag is set to True.
-
-    After deleting the target name, it removes the original CSV file and renames the temporary file to the original filename.
+    It removes the person from the binary Encode Database and refreshes the 'encode_db.csv' export.
 
     If the target name was found and deleted, it shows a success message.
     Otherwise, it shows an error message indicating that the target name was not found in the Encode Database.
@@ -260,32 +276,12 @@ def delete_from_encode_db():
         None
     '''
     target_name = askstring('Delete', 'Choose the person name to delete from the Encode Database:')
-    csv_file = "encode_db.csv"
-    temp_file = "temp.csv"
-    check = False
-
-    # Open the CSV file for reading and a temporary file for writing
-    with open(csv_file, 'r') as file, open(temp_file, 'w', newline='') as temp:
-        reader = csv.reader(file)
-        writer = csv.writer(temp)
-        for row in reader:
-            if row[0] != target_name:
-                writer.writerow(row)
-            else:
-                check = True
-        file.close()
-
-    # Remove the original CSV file and rename the temporary file to the original filename
-    while True:
-        try:
-            os.remove(csv_file)
-            break
-        except:
-            messagebox.showerror("Error", "Please close the file encode_db.csv!")
-    os.rename(temp_file, csv_file)
+    check = remove_from_encode_store(target_name)
 
     # Show success message if the target name was found and deleted, otherwise show an error message
     if check == True:
+        encode_gallery.invalidate()
+        export_encode_csv()
         messagebox.showinfo('Done', f'Successfully deleted "{target_name}" in Encode Database!')
         return
     messagebox.showerror('Error', f'"{target_name}" was not found in the Encode Database')
@@ -315,88 +311,194 @@ def delete_from_img_db():
             return
     messagebox.showerror('Error', f'"{target_name}" was not found in the Image Database')
 
+def export_encode_csv():
+    '''
+    Export the Encode Database to 'encode_db.csv' so it can be opened from the "View" menu.
+    '''
+    while True:
+        try:
+            export_csv("encode_db.csv")
+            break
+        except:
+            messagebox.showerror("Error", "Please close the file encode_db.csv!")
+
 def read_encode_db():
     '''
     Read the Encode Database and retrieve person names, full encodings, and main encodings.
 
-    The function reads the 'encode_db.csv' file and extracts the person names, full encodings,
-    and main encodings for each person in the database. It uses the helper function 'str_to_list_arr()'
-    to convert the string representation of encodings into lists of encoding arrays.
+    The function memory-maps the binary Encode Database (migrating a legacy 'encode_db.csv' on first use)
+    and extracts the person names, full encodings, and main encodings for each person in the database.
 
     Returns:
         person_names_known (list): List of person names in the database.
-        encodes_known (list): List of full encodings for each person in the database.
-        main_encodes_known (list): List of main encodings for each person in the database.
-    '''
-    csv_file = "encode_db.csv"
-    person_names_known = []  # names in the database
-    encodes_known = []       # full encodings in the database
-    main_encodes_known = []  # main encodings in the database
-    with open(csv_file, mode='r') as file:
-        csv_reader = csv.reader(file)
-        next(csv_reader)  # skip header row
-        for row in csv_reader:
-            person_names_known.append(row[0])
-            encode = str_to_list_arr(row[1])
-            encodes_known.append(encode)
-            main_encodes_known.append(encode[3])  # assuming the main encoding is at index 3
+        encodes_known (numpy.ndarray): Full encodings of shape (N, 8, 128).
+        main_encodes_known (numpy.ndarray): Main encodings of shape (N, 128).
+    '''
+    person_names_known, _, encodes_known = load_encode_store()
+    main_encodes_known = encodes_known[:, 3]  # assuming the main encoding is at index 3
     return person_names_known, encodes_known, main_encodes_known
 
-def cur_img_process(img):
+# Process-wide cache of the Encode Database, reloaded only when the store index changes
+encode_gallery = EncodeGallery(INDEX_FILE, read_encode_db, load_face_index, compact=INDEX_BACKEND == 'quantized')
+
+# Face detector selected in 'config.py'
+face_detector = create_detector()
+
+def identify_faces(encode_faces, gallery):
+    '''
+    Identify faces by matching their encodings against the Encode Database in one batched search.
+
+    Args:
+        encode_faces (list): The 128-d encodings of the faces.
+        gallery (GalleryData): The cached Encode Database.
+
+    Returns:
+        list: A (name, accuracy) tuple for each face. The name is empty if the face is not recognized.
     '''
-    Detect and recognize the current face of the person in attendance.
+    if len(encode_faces) == 0 or len(gallery.names) == 0:
+        return [('', 0) for _ in encode_faces]
+    top_index, top_dis = gallery.index.search(np.asarray(encode_faces))
+    results = []
+    for true_index, err in zip(top_index[:, 0], top_dis[:, 0]):
+        acc = round(100 * (1 - err)) if true_index >= 0 else 0
+        if acc > 50:  # face found in the database
+            results.append((gallery.names[true_index], acc))
+        else:
+            results.append(('', acc))
+    return results
+
+def recognize_faces(img, gate=None, preprocessor=None, region=None, cache=None, source=None):
+    '''
+    Detect and recognize every face in an image.
+
+    Arguments:
+        img (numpy.ndarray): The input image in BGR format.
+        gate (MotionGate): Optional motion gate. When it finds the scene static, detection is skipped
+            and the faces of the last detection are returned.
+        preprocessor (FramePreprocessor): Preprocessor whose buffers are reused. A new one is used if not given.
+        region (AdaptiveRegion): Optional adaptive region. When given, only the region it chooses is processed,
+            at the scale it chooses, instead of the whole frame downscaled by 0.25.
+        cache (EncodingCache): Optional cache. Faces similar to a recently encoded one in the same place reuse
+            its match result instead of being encoded again.
+        source (int): Index of the video source of the image. Its 'detect_scale' and 'encode_cache_hit_rate'
+            gauges are published as 'source{index}_*', or without a prefix if not given (batch, benchmarks).
+
+    Returns:
+        faces (list): A (face_loc, name, accuracy) tuple for each face, face_loc being (top, right, bottom, left) in image pixels.
+        fresh (list): For each face, True if it was detected and encoded on this frame, False if its identity
+            was reused (faces replayed by the motion gate, match results of the encoding cache).
+    '''
+    if gate is not None and not gate.check(img):
+        return gate.last_faces, [False] * len(gate.last_faces)
+    start = time.perf_counter()
+    with metrics.timer('gallery'):
+        gallery = encode_gallery.get()
+    metrics.set_gauge('gallery_persons', len(gallery.names))
+    if preprocessor is None:
+        preprocessor = FramePreprocessor()
+    with metrics.timer('preprocess'):
+        if region is None:
+            box, scale = (0, 0, img.shape[1], img.shape[0]), preprocessor.detect_scale
+            imgS = preprocessor.detect_input(img)  # downscaled by 0.25, RGB, denoised
+        else:
+            box, scale = region.plan(img.shape)      # region of interest and its tuned scale
+            imgS = preprocessor.detect_region(img, box, scale)
+    x1, y1 = box[:2]
+
+    # Face detection and recognition
+    with metrics.timer('detect'):
+        face_locations = face_detector.detect(imgS)
+    # Back to frame pixels
+    frame_locations = [(int(top / scale) + y1, int(right / scale) + x1, int(bottom / scale) + y1, int(left / scale) + x1)
+                       for top, right, bottom, left in face_locations]
+    results = [('', 0)] * len(face_locations)
+    missing = []
+    if len(face_locations) != 0 and len(gallery.names) != 0:
+        keys, missing = None, range(len(face_locations))
+        if cache is not None:
+            with metrics.timer('cache'):
+                lookups = [cache.lookup(imgS, face_loc, frame_loc, gallery)
+                           for face_loc, frame_loc in zip(face_locations, frame_locations)]
+            keys = [key for key, _ in lookups]
+            results = [result for _, result in lookups]
+            missing = [i for i, result in enumerate(results) if result is None]
+        if len(missing) != 0:
+            # Extract face encodings for all detected faces using the HOG algorithm, reusing the detected locations
+            with metrics.timer('encode'):
+                encode_faces = face_recognition.face_encodings(imgS, [face_locations[i] for i in missing], model="hog")
+            with metrics.timer('match'):
+                for i, encoding, result in zip(missing, encode_faces, identify_faces(encode_faces, gallery)):
+                    results[i] = result
+                    if cache is not None:
+                        cache.put(keys[i], encoding, result, gallery)
+    faces = [(frame_loc, name, acc) for frame_loc, (name, acc) in zip(frame_locations, results)]
+    fresh = [i in missing for i in range(len(faces))]
+    if region is not None:
+        region.update(faces, img.shape, (time.perf_counter() - start) * 1000)
+    if gate is not None:
+        gate.last_faces = faces
+    if metrics.enabled:
+        prefix = '' if source is None else f'source{source}_'
+        metrics.set_gauge(f'{prefix}detect_scale', scale)
+        if cache is not None:
+            metrics.set_gauge(f'{prefix}encode_cache_hit_rate', round(cache.stats()['hit_rate'], 3))
+    return faces, fresh
+
+def cur_img_process(img, tracker=None, gate=None, preprocessor=None, region=None, cache=None, source=None):
+    '''
+    Detect and recognize the faces of the persons in attendance.
     
     The function takes an input image and performs face detection and recognition on the image.
-    It uses the 'read_encode_db()' function to retrieve the person names, full encodings, and
-    main encodings from the Encode Database. The function then processes the input image to
-    detect the face, extract face encodings, calculate face distances, and identify the name
-    of the person in attendance and the recognition accuracy.
+    It uses the cached 'encode_gallery' to retrieve the person names and encodings from the
+    Encode Database without re-reading the file on every frame. The function then detects every face in the image,
+    extracts their encodings in one call that reuses the detected locations, matches all of them against all
+    brightness levels of all persons in one batched search, and identifies the name and recognition accuracy of each face.
+    When a tracker is given, detection and recognition only run on the frames it chooses and the boxes
+    are tracked in between.
     
     Arguments:
         img (numpy.ndarray): The input image in BGR format.
+        tracker (FaceTracker): Optional tracker for live video.
+        gate (MotionGate): Optional motion gate that skips detection while the scene is static (without a tracker).
+        preprocessor (FramePreprocessor): Optional preprocessor whose buffers are reused from frame to frame.
+        region (AdaptiveRegion): Optional adaptive region of interest and resolution (without a tracker).
+        cache (EncodingCache): Optional cache of recent face encodings and match results (without a tracker).
+        source (int): Optional index of the video source, naming its gauges (see 'recognize_faces()').
         
     Returns:
-        name (str): The name of the person in attendance. If the face is not recognized, the name is empty.
-        img (numpy.ndarray): The input image with rectangles and text displaying the person's name and accuracy.
+        names (list): The names of the recognized persons in attendance. Faces that are not recognized are left out.
+        img (numpy.ndarray): The display-sized RGB image with rectangles and text displaying each person's name and accuracy.
+        fresh_names (list): The names recognized by a detection and encoding on this frame (see 'annotate_frame()').
     '''
-    name = '' # name not in encode database
-    text = 'Unknown' # face not found in the database
-    person_names_known, encodes_known, main_encodes_known = read_encode_db()
-    imgS = crop_center_image(img) 
-    imgS = cv2.resize(img, (0,0), None, 0.25, 0.25)  # resize the image for faster processing
-    imgS = cv2.cvtColor(imgS, cv2.COLOR_BGR2RGB)     # convert BGR to RGB
-    imgS = cv2.GaussianBlur(imgS, (15, 15), 1)       # apply GaussianBlur filter to denoise the image
+    if preprocessor is None:
+        preprocessor = FramePreprocessor()
+    faces, fresh = (recognize_faces(img, gate, preprocessor, region, cache, source) if tracker is None
+                    else tracker.process(img))
+    return annotate_frame(img, faces, preprocessor, fresh)
 
-    # Face detection and recognition
-    face_locations = face_recognition.face_locations(imgS)
-    if len(face_locations) != 0:
-        # Identify the position of the current face
-        face_loc = face_locations[0]  
-        
-        if len(person_names_known) != 0:
-            # Extract face encodings for the current face using the HOG algorithm
-            encode_face = face_recognition.face_encodings(imgS, model="hog")[0] 
-            
-            # Calculate face distance between current face and faces in the database
-            face_dis = face_recognition.face_distance(main_encodes_known, encode_face)  
-            
-            # Identify the index of the face in the database that is most similar to the current face
-            true_index = np.argmin(face_dis)  
-            
-            # Calculate face distance between current face and faces in 8 brightness levels
-            face_dis = face_recognition.face_distance(encodes_known[true_index], encode_face)
-
-            # Identify the name of person in attendance and the accuracy
-            err = np.min(face_dis)
-            acc = round(100 * (1 - err))    
-            if acc > 50:  # face found in the database
-                name = person_names_known[true_index]
-                text = f"{name} {acc}%"  
-            
-        # Display the participant's name and accuracy above the rectangle that covers the face
-        y1, x2, y2, x1 = face_loc
-        y1, x2, y2, x1 = y1 * 4, x2 * 4, y2 * 4, x1 * 4         
-        cv2.rectangle(img, (x1, y1), (x2, y2), (0, 255, 0), 2)
-        cv2.putText(img, text, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 0, 0), 3, cv2.LINE_AA)
-    img = cv2.resize(img, (0,0), None, 1/2, 2/3) # take fit dimension for displaying image in UI
-    return name, img
+def annotate_frame(img, faces, preprocessor=None, fresh=None):
+    '''
+    Resize a frame for display and draw the recognized faces on it.
+
+    Arguments:
+        img (numpy.ndarray): The frame in BGR format.
+        faces (list): A (face_loc, name, accuracy) tuple for each face.
+        preprocessor (FramePreprocessor): Preprocessor whose buffers are reused. A new one is used if not given.
+        fresh (list): For each face, whether it was detected and encoded on this frame. Defaults to all of them.
+
+    Returns:
+        names (list): The names of the recognized persons, without duplicates.
+        img (numpy.ndarray): The annotated RGB frame at display size.
+        fresh_names (list): The names among 'names' that were recognized on this frame, rather than carried
+            over by the tracker, the motion gate or the encoding cache. Only these confirm an automatic mark.
+    '''
+    if preprocessor is None:
+        preprocessor = FramePreprocessor()
+    # Display each participant's name and accuracy above the rectangle that covers the face
+    with metrics.timer('draw'):
+        img = preprocessor.display_frame(img, faces)
+    names = list(dict.fromkeys(name for _, name, _ in faces if name != ''))
+    if fresh is None:
+        return names, img, names
+    fresh_names = list(dict.fromkeys(name for (_, name, _), is_fresh in zip(faces, fresh) if is_fresh and name != ''))
+    return names, img, fresh_names
@@ -0,0 +1,66 @@
+import struct
+import numpy as np
+
+''' FUNCTION LIST '''
+# read_ws_message
+# ws_frame
+
+# Minimal WebSocket (RFC 6455) framing over asyncio streams, shared by the recognition service and its load-test client
+
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+MAX_MESSAGE = 8 * 1024 * 1024  # bytes
+
+async def read_ws_message(reader, max_size=MAX_MESSAGE):
+    '''
+    Read a complete WebSocket message, joining fragments and unmasking the payload.
+
+    Returns:
+        tuple: (opcode, payload bytes).
+
+    Raises:
+        ValueError: If the message (all its fragments together) is larger than 'max_size'.
+    '''
+    opcode, chunks, size = None, [], 0
+    while True:
+        first, second = await reader.readexactly(2)
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack('>H', await reader.readexactly(2))[0]
+        elif length == 127:
+            length = struct.unpack('>Q', await reader.readexactly(8))[0]
+        if size + length > max_size:
+            raise ValueError("WebSocket message too large")
+        mask = await reader.readexactly(4) if second & 0x80 else None
+        payload = await reader.readexactly(length)
+        if mask is not None and length != 0:
+            data = np.frombuffer(payload, np.uint8)
+            payload = (data ^ np.resize(np.frombuffer(mask, np.uint8), length)).tobytes()
+        frame_opcode = first & 0x0F
+        if frame_opcode >= 8:
+            # Control frames may come between the fragments of a message
+            return frame_opcode, payload
+        if opcode is None:
+            opcode = frame_opcode
+        chunks.append(payload)
+        size += length
+        if first & 0x80:  # FIN
+            return opcode, b''.join(chunks)
+
+def ws_frame(opcode, payload, mask=False):
+    '''
+    Build a single-frame WebSocket message. Clients have to mask their frames, servers must not.
+    '''
+    length = len(payload)
+    header = bytes([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    if length < 126:
+        header += bytes([mask_bit | length])
+    elif length < 1 << 16:
+        header += bytes([mask_bit | 126]) + struct.pack('>H', length)
+    else:
+        header += bytes([mask_bit | 127]) + struct.pack('>Q', length)
+    if not mask:
+        return header + payload
+    key = np.random.bytes(4)
+    data = np.frombuffer(payload, np.uint8) ^ np.resize(np.frombuffer(key, np.uint8), length)
+    return header + key + data.tobytes()